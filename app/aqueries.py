@@ -0,0 +1,177 @@
+"""
+Versões async (psycopg AsyncConnection) das funções de queries.py.
+Mesmos nomes, mesmos argumentos e o mesmo SQL; só muda a execução.
+"""
+import time
+from typing import Any, AsyncIterator
+import psycopg
+from . import profiling
+from . import queries as Q
+from .utils import only_digits
+
+async def _fetchone(conn: psycopg.AsyncConnection, sql: str, params: Any = None, prepare: bool | None = None) -> dict | None:
+    async with conn.cursor() as cur:
+        await cur.execute(sql, params, prepare=prepare)
+        return await cur.fetchone()
+
+async def _fetchone_each(conn: psycopg.AsyncConnection, statements: list[tuple[str, Any]], *,
+                         prepare: bool | None = None, pipeline: bool = Q.PIPELINE_SUPPORTED) -> list[dict | None]:
+    if not pipeline or len(statements) < 2:
+        return [await _fetchone(conn, sql, params, prepare) for sql, params in statements]
+    cursors = []
+    t0 = time.perf_counter()
+    try:
+        async with conn.pipeline():
+            for sql, params in statements:
+                cur = conn.cursor()
+                cursors.append(cur)
+                await cur.execute(sql, params, prepare=prepare)
+        rows = [await cur.fetchone() for cur in cursors]
+        profiling.record_pipeline(conn, statements, (time.perf_counter() - t0) * 1000.0)
+        return rows
+    finally:
+        for cur in cursors:
+            await cur.close()
+
+async def _fetchall(conn: psycopg.AsyncConnection, sql: str, params: Any = None) -> list[dict]:
+    async with conn.cursor() as cur:
+        await cur.execute(sql, params)
+        return await cur.fetchall()
+
+# — Pessoas ——————————————————————————————————————————————————————
+async def person_by_document(conn: psycopg.AsyncConnection, doc: str) -> dict | None:
+    d = only_digits(doc)
+    row = await _fetchone(conn, Q._person_by_doc_sql(), (d,), Q.HOT)
+    if row is None and Q._doc_index_ready():
+        row = await _fetchone(conn, Q._person_by_doc_sql(indexed=False), (d,), Q.HOT)
+    return row
+
+async def person_by_id(conn: psycopg.AsyncConnection, person_id: int) -> dict | None:
+    return await _fetchone(conn, Q.SQL_PERSON_BY_ID, (person_id,), Q.HOT)
+
+async def persons_list(conn: psycopg.AsyncConnection, *, q: str | None, limit: int, offset: int, after: tuple | None = None,
+                       by_relevance: bool = False) -> list[dict]:
+    return await _fetchall(conn, *Q._persons_list_sql(q=q, limit=limit, offset=offset, after=after, by_relevance=by_relevance))
+
+# — Organizações ——————————————————————————————————————————————————
+async def organization_by_document(conn: psycopg.AsyncConnection, doc: str) -> dict | None:
+    sql = Q._org_by_doc_sql()
+    if sql is None:
+        return None
+    d = only_digits(doc)
+    row = await _fetchone(conn, sql, (d,), Q.HOT)
+    if row is None and Q._doc_index_ready():
+        row = await _fetchone(conn, Q._org_by_doc_sql(indexed=False), (d,), Q.HOT)
+    return row
+
+async def organization_by_id(conn: psycopg.AsyncConnection, org_id: int) -> dict | None:
+    return await _fetchone(conn, Q._org_by_id_sql(), (org_id,), Q.HOT)
+
+# — Entities (PF/PJ) ————————————————————————————————————————————————
+async def entities_by_document(
+    conn: psycopg.AsyncConnection, variants: dict[str, list[str]], *, persons: bool, orgs: bool
+) -> tuple[dict | None, dict | None]:
+    lookups = Q._entity_lookups(variants, persons=persons, orgs=orgs)
+    rows = await _fetchone_each(conn, [(sql, params) for _, sql, params in lookups], prepare=Q.HOT)
+    person_row, org_row = Q._first_matches(lookups, rows)
+    retry = Q._fallback_lookups(variants, person_row, org_row, persons=persons, orgs=orgs)
+    if retry:
+        rows = await _fetchone_each(conn, [(sql, params) for _, sql, params in retry], prepare=Q.HOT)
+        p, o = Q._first_matches(retry, rows)
+        person_row, org_row = person_row or p, org_row or o
+    return person_row, org_row
+
+async def entities_by_documents(
+    conn: psycopg.AsyncConnection, variants_list: list[dict[str, list[str]]], *, persons: bool, orgs: bool
+) -> list[tuple[dict | None, dict | None]]:
+    persons_idx: dict[str, dict] = {}
+    orgs_idx: dict[str, dict] = {}
+    pf = Q._collect_variants(variants_list, "pf")
+    pj = Q._collect_variants(variants_list, "pj")
+    if persons and pf:
+        persons_idx = Q._index_by_doc(await _fetchall(conn, Q._persons_by_docs_sql(), (pf,)))
+        if missing := Q._missing_docs(pf, persons_idx):
+            persons_idx.update(Q._index_by_doc(await _fetchall(conn, Q._persons_by_docs_sql(indexed=False), (missing,))))
+    org_sql = Q._orgs_by_docs_sql()
+    if orgs and pj and org_sql:
+        orgs_idx = Q._index_by_doc(await _fetchall(conn, org_sql, (pj,)))
+        if missing := Q._missing_docs(pj, orgs_idx):
+            orgs_idx.update(Q._index_by_doc(await _fetchall(conn, Q._orgs_by_docs_sql(indexed=False), (missing,))))
+    return Q._pick_entities(variants_list, persons_idx, orgs_idx)
+
+# — Usuários ——————————————————————————————————————————————————————
+async def users_list(conn: psycopg.AsyncConnection, *, active_only: bool, limit: int, offset: int, after: tuple | None = None) -> list[dict]:
+    return await _fetchall(conn, *Q._users_list_sql(active_only=active_only, limit=limit, offset=offset, after=after))
+
+async def user_by_id(conn: psycopg.AsyncConnection, user_id: int) -> dict | None:
+    return await _fetchone(conn, Q.SQL_USER_BY_ID, (user_id,), Q.HOT)
+
+async def users_search(conn: psycopg.AsyncConnection, *, q: str, limit: int, offset: int, after: tuple | None = None,
+                       by_relevance: bool = False) -> list[dict]:
+    return await _fetchall(conn, *Q._users_search_sql(q=q, limit=limit, offset=offset, after=after, by_relevance=by_relevance))
+
+# — Pipelines / Stages ————————————————————————————————————————————
+async def pipelines_like_base_nova(conn: psycopg.AsyncConnection) -> list[dict]:
+    return await _fetchall(conn, Q.SQL_PIPELINES_BASE_NOVA)
+
+async def pipelines_list(conn: psycopg.AsyncConnection) -> list[dict]:
+    return await _fetchall(conn, Q.SQL_PIPELINES_LIST)
+
+async def pipeline_by_id(conn: psycopg.AsyncConnection, pipeline_id: int) -> dict | None:
+    return await _fetchone(conn, Q.SQL_PIPELINE_BY_ID, (pipeline_id,))
+
+async def stages_by_pipeline(conn: psycopg.AsyncConnection, pipeline_id: int) -> list[dict]:
+    return await _fetchall(conn, Q.SQL_STAGES_BY_PIPELINE, (pipeline_id,))
+
+# — Deals ————————————————————————————————————————————————————————
+async def deals_base_nova(conn: psycopg.AsyncConnection, *, doc: str | None, limit: int, offset: int, after: tuple | None = None,
+                          pipeline_ids: list[int] | None = None, doc_exact: bool = False) -> list[dict]:
+    return await _fetchall(conn, *Q._deals_base_nova_stmt(doc=doc, limit=limit, offset=offset, after=after,
+                                                          pipeline_ids=pipeline_ids, doc_exact=doc_exact))
+
+async def deal_by_id(conn: psycopg.AsyncConnection, deal_id: int) -> dict | None:
+    return await _fetchone(conn, Q.SQL_DEAL_BY_ID, (deal_id,), Q.HOT)
+
+async def deals_by_entity(conn: psycopg.AsyncConnection, *, person_id: int | None, org_id: int | None, limit: int, offset: int,
+                          after: tuple | None = None) -> list[dict]:
+    if person_id is None and org_id is None:
+        return []
+    return await _fetchall(conn, *Q._deals_by_entity_sql(person_id=person_id, org_id=org_id, limit=limit, offset=offset, after=after))
+
+async def search_deals_by_title(conn: psycopg.AsyncConnection, *, q: str, limit: int, offset: int, after: tuple | None = None,
+                                by_relevance: bool = False) -> list[dict]:
+    return await _fetchall(conn, *Q._search_deals_by_title_sql(q=q, limit=limit, offset=offset, after=after,
+                                                               by_relevance=by_relevance))
+
+async def search_deals_advanced(conn: psycopg.AsyncConnection, **filters: Any) -> list[dict]:
+    return await _fetchall(conn, *Q._search_deals_advanced_sql(**filters))
+
+async def deal_stats(conn: psycopg.AsyncConnection, **filters: Any) -> list[dict]:
+    return await _fetchall(conn, *Q._deal_stats_sql(**filters))
+
+# — Relacionados dos deals (include=) ——————————————————————————————————
+async def related_by_ids(conn: psycopg.AsyncConnection, ids: dict[str, list[int]]) -> dict[str, dict[int, dict]]:
+    out: dict[str, dict[int, dict]] = {}
+    for rel, keys in ids.items():
+        sql = Q._related_sql(rel)
+        out[rel] = {r["id"]: r for r in await _fetchall(conn, sql, (keys,))} if keys and sql else {}
+    return out
+
+# — Lote por ids ————————————————————————————————————————————————————
+async def rows_by_ids(conn: psycopg.AsyncConnection, entity: str, ids: list[int]) -> list[dict | None]:
+    return Q.in_input_order(ids, await _fetchall(conn, Q._by_ids_sql(entity), (sorted(set(ids)),)))
+
+# — Feed de alterações ————————————————————————————————————————————
+async def changes_since(conn: psycopg.AsyncConnection, entity: str, *, since: Any, since_id: int,
+                        limit: int) -> list[dict]:
+    return await _fetchall(conn, Q._changes_sql(entity), {"since": since, "since_id": since_id, "limit": limit})
+
+# — Export (cursor nomeado no servidor) ——————————————————————————————
+async def iter_deals_export(conn: psycopg.AsyncConnection, *, itersize: int, **filters: Any) -> AsyncIterator[dict]:
+    sql, params = Q._deals_export_sql(**filters)
+    async with conn.transaction():
+        async with conn.cursor(name="export_deals") as cur:
+            cur.itersize = itersize
+            await cur.execute(sql, params)
+            async for row in cur:
+                yield row
@@ -10,16 +10,78 @@ BEGIN
   END IF;
 END$$;
 
--- View (opcional) para pipelines "Base Nova"
+-- (Opcional; DB_BASE_NOVA_TRIGGER=1 faz o mesmo no startup) ids dos pipelines "Base Nova"
+-- mantidos por trigger em pipelines + view sobre eles. pipelines é replicada: um trigger
+-- que falha no subscriber para o apply inteiro; rode numa transação (o ALTER exige ser dono)
+CREATE TABLE IF NOT EXISTS base_nova_pipelines (pipeline_id bigint PRIMARY KEY);
+
+CREATE OR REPLACE FUNCTION refresh_base_nova_pipelines()
+RETURNS trigger LANGUAGE plpgsql SECURITY DEFINER SET search_path FROM CURRENT
+AS $$
+BEGIN
+  DELETE FROM base_nova_pipelines;
+  INSERT INTO base_nova_pipelines (pipeline_id)
+  SELECT id FROM pipelines
+  WHERE lower(name) LIKE 'base nova%'
+     OR lower(name) LIKE 'base-nova%'
+     OR lower(name) LIKE 'basenova%';
+  RETURN NULL;
+END $$;
+
+DROP TRIGGER IF EXISTS trg_base_nova_pipelines ON pipelines;
+CREATE TRIGGER trg_base_nova_pipelines
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON pipelines
+FOR EACH STATEMENT EXECUTE FUNCTION refresh_base_nova_pipelines();
+-- pipelines chega por replicação lógica: o apply do subscriber só dispara trigger ALWAYS
+ALTER TABLE pipelines ENABLE ALWAYS TRIGGER trg_base_nova_pipelines;
+
+-- carga inicial
+DELETE FROM base_nova_pipelines;
+INSERT INTO base_nova_pipelines (pipeline_id)
+SELECT id FROM pipelines
+WHERE lower(name) LIKE 'base nova%'
+   OR lower(name) LIKE 'base-nova%'
+   OR lower(name) LIKE 'basenova%';
+
 CREATE OR REPLACE VIEW v_deals_base_nova AS
 SELECT
     d.id, d.title, d.status, d.value, d.currency,
     d.add_time, d.update_time,
     d.user_id, d.pipeline_id, d.stage_id, d.person_id, d.org_id
 FROM negocios d
-WHERE d.pipeline_id IN (
-    SELECT p.id FROM pipelines p
-    WHERE lower(p.name) LIKE 'base nova%'
-       OR lower(p.name) LIKE 'base-nova%'
-       OR lower(p.name) LIKE 'basenova%'
-);
+WHERE d.pipeline_id IN (SELECT pipeline_id FROM base_nova_pipelines);
+
+-- (Opcional; DB_PIPELINE_INDEXES=1 faz o mesmo no startup) deals/base-nova: top-N por pipeline
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_negocios_pipeline_recent
+  ON negocios (pipeline_id, update_time DESC NULLS LAST, id DESC);
+
+-- (Opcional; DB_TRGM_INDEXES=1 faz o mesmo no startup) busca textual indexada:
+-- ILIKE '%q%' em títulos/nomes/emails e dígitos de documento em qualquer posição
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_negocios_title_trgm
+  ON negocios USING gin (title gin_trgm_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_negocios_title_digits_trgm
+  ON negocios USING gin ((only_digits(coalesce(title,''))) gin_trgm_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_pessoas_name_trgm
+  ON pessoas USING gin (name gin_trgm_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_pessoas_cpf_digits_trgm
+  ON pessoas USING gin ((only_digits(coalesce(cpf_text,''))) gin_trgm_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_usuarios_name_trgm
+  ON usuarios USING gin (name gin_trgm_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_usuarios_email_trgm
+  ON usuarios USING gin (email gin_trgm_ops);
+
+-- (Opcional; requer superusuário) avisa a API sobre DDL para recarregar
+-- o registro de capacidades (tabelas/colunas) sem esperar o intervalo
+CREATE OR REPLACE FUNCTION pipeboard_notify_ddl()
+RETURNS event_trigger LANGUAGE plpgsql
+AS $$ BEGIN PERFORM pg_notify('pipeboard_ddl', tg_tag); END $$;
+
+DROP EVENT TRIGGER IF EXISTS pipeboard_notify_ddl;
+CREATE EVENT TRIGGER pipeboard_notify_ddl ON ddl_command_end
+EXECUTE FUNCTION pipeboard_notify_ddl();
+
+-- (Opcional; DB_CHANGES_INDEXES=1 faz o mesmo no startup) feed /v1/changes por (update_time, id)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_negocios_changes ON negocios (update_time, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_pessoas_changes ON pessoas (update_time, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_organizacoes_changes ON organizacoes (update_time, id);
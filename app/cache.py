@@ -0,0 +1,98 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable
+
+CACHE_ENABLED = os.getenv("CACHE_ENABLED", "1").lower() in ("1", "true", "yes")
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+# limite em linhas somadas (listas contam len(); registro único conta 1)
+CACHE_MAX_ROWS = int(os.getenv("CACHE_MAX_ROWS", "200000"))
+
+MISS = object()
+
+def _weight(value: Any) -> int:
+    return len(value) if isinstance(value, (list, tuple)) else 1
+
+def freeze(value: Any) -> Hashable:
+    """
+    Converte argumentos (dict/list aninhados) em chave hashable estável.
+    """
+    if isinstance(value, dict):
+        return tuple(sorted((k, freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple, set, frozenset)):
+        items = [freeze(v) for v in value]
+        return tuple(sorted(items, key=repr)) if isinstance(value, (set, frozenset)) else tuple(items)
+    return value
+
+class TTLCache:
+    """
+    Cache em processo com expiração por entrada (TTL) e despejo LRU,
+    limitado por número de entradas e por total de linhas.
+    """
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES, max_rows: int = CACHE_MAX_ROWS):
+        self.max_entries = max_entries
+        self.max_rows = max_rows
+        self._data: OrderedDict[Hashable, tuple[float, int, Any]] = OrderedDict()
+        self._rows = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable) -> Any:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return MISS
+            expires_at, weight, value = entry
+            if expires_at <= now:
+                del self._data[key]
+                self._rows -= weight
+                self.expirations += 1
+                self.misses += 1
+                return MISS
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: float) -> None:
+        weight = _weight(value)
+        if ttl <= 0 or weight > self.max_rows:
+            return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._rows -= old[1]
+            self._data[key] = (time.monotonic() + ttl, weight, value)
+            self._rows += weight
+            while self._data and (len(self._data) > self.max_entries or self._rows > self.max_rows):
+                _, (_, w, _) = self._data.popitem(last=False)
+                self._rows -= w
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._rows = 0
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "enabled": CACHE_ENABLED,
+            "entries": len(self._data),
+            "rows": self._rows,
+            "max_entries": self.max_entries,
+            "max_rows": self.max_rows,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+        }
+
+response_cache = TTLCache()
@@ -0,0 +1,234 @@
+import gzip
+import hashlib
+import os
+import threading
+import zlib
+from collections import OrderedDict
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+from .responses import weak_etag
+
+try:
+    import zstandard
+except ImportError:  # opcional: sem o pacote só gzip/br
+    zstandard = None
+try:
+    import brotli
+except ImportError:  # opcional
+    brotli = None
+
+COMPRESS_ENABLED = os.getenv("COMPRESS_ENABLED", "1").lower() in ("1", "true", "yes")
+# corpos menores que isso saem sem compressão (o ganho não paga o custo)
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("COMPRESS_GZIP_LEVEL", "6"))
+ZSTD_LEVEL = int(os.getenv("COMPRESS_ZSTD_LEVEL", "3"))
+BROTLI_LEVEL = int(os.getenv("COMPRESS_BROTLI_LEVEL", "4"))
+# bytes já comprimidos guardados por (encoding, hash do corpo); 0 desliga
+COMPRESS_CACHE_MAX_BYTES = int(os.getenv("COMPRESS_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+# acima disso a compressão roda numa thread (não segura o event loop)
+COMPRESS_THREAD_MIN_BYTES = 256 * 1024
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/csv", "text/plain")
+
+# ordem de preferência quando o cliente aceita mais de um
+ENCODINGS = tuple(
+    e for e, ok in (("zstd", zstandard is not None), ("br", brotli is not None), ("gzip", True)) if ok
+)
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(body)
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_LEVEL)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+class _StreamCompressor:
+    """
+    Compressão incremental (export): cada chunk sai com flush para o
+    cliente receber as linhas à medida que o cursor avança.
+    """
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "zstd":
+            self._c = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+        elif encoding == "br":
+            self._c = brotli.Compressor(quality=BROTLI_LEVEL)
+        else:
+            self._c = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def chunk(self, data: bytes) -> bytes:
+        if self.encoding == "zstd":
+            return self._c.compress(data) + self._c.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+        if self.encoding == "br":
+            return self._c.process(data) + self._c.flush()
+        return self._c.compress(data) + self._c.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        if self.encoding == "br":
+            return self._c.finish()
+        return self._c.flush()
+
+def negotiate(accept_encoding: str | None) -> str | None:
+    """
+    Primeiro encoding de ENCODINGS aceito pelo cliente (q > 0).
+    """
+    if not accept_encoding:
+        return None
+    accepted = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip()] = q
+    for enc in ENCODINGS:
+        if accepted.get(enc, accepted.get("*", 0.0)) > 0:
+            return enc
+    return None
+
+class CompressedCache:
+    """
+    LRU de corpos comprimidos limitado em bytes. Chave: encoding + hash do
+    corpo sem compressão, então páginas repetidas (servidas do cache de
+    respostas) não são comprimidas de novo.
+    """
+
+    def __init__(self, max_bytes: int = COMPRESS_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._data: OrderedDict[tuple, bytes] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_compress(self, body: bytes, encoding: str) -> bytes:
+        if self.max_bytes <= 0:
+            return compress(body, encoding)
+        key = (encoding, hashlib.blake2b(body, digest_size=16).digest())
+        with self._lock:
+            out = self._data.get(key)
+            if out is not None:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return out
+            self.misses += 1
+        out = compress(body, encoding)
+        if len(out) > self.max_bytes // 4:
+            return out
+        with self._lock:
+            if key not in self._data:
+                self._data[key] = out
+                self._bytes += len(out)
+            while self._bytes > self.max_bytes:
+                _, old = self._data.popitem(last=False)
+                self._bytes -= len(old)
+        return out
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "enabled": COMPRESS_ENABLED,
+            "encodings": list(ENCODINGS),
+            "entries": len(self._data),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+        }
+
+compressed_cache = CompressedCache()
+
+class CompressionMiddleware:
+    """
+    Middleware ASGI: negocia Content-Encoding pelo Accept-Encoding para
+    respostas JSON/NDJSON/CSV. Corpo único acima de COMPRESS_MIN_BYTES é
+    comprimido inteiro (com cache); respostas em streaming (export), por chunk.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not COMPRESS_ENABLED or scope["method"] == "HEAD":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        def _mark_negotiated(headers: MutableHeaders) -> None:
+            # bytes diferentes por encoding: o ETag forte passa a fraco. Vale para
+            # toda resposta deste cliente (inclusive 304 e corpos pequenos, que
+            # saem sem compressão), para o validador ser o mesmo em todas.
+            headers.append("vary", "Accept-Encoding")
+            etag = headers.get("etag")
+            if etag:
+                headers["etag"] = weak_etag(etag)
+
+        def _mark_encoded(headers: MutableHeaders) -> None:
+            headers["content-encoding"] = encoding
+            _mark_negotiated(headers)
+
+        start = None
+        streamer: _StreamCompressor | None = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start, streamer, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                ctype = headers.get("content-type", "")
+                if (message["status"] < 200 or message["status"] in (204, 304)
+                        or "content-encoding" in headers or not ctype.startswith(COMPRESSIBLE_TYPES)):
+                    passthrough = True
+                    if message["status"] == 304:
+                        # o 304 repete o ETag que o 200 comprimido levaria
+                        _mark_negotiated(MutableHeaders(raw=message["headers"]))
+                    await send(message)
+                    return
+                start = message
+                return
+            body = message.get("body", b"")
+            more = message.get("more_body", False)
+            if streamer is None and not more:
+                # corpo inteiro numa mensagem
+                await _send_whole(start, body)
+                return
+            if streamer is None:
+                streamer = _StreamCompressor(encoding)
+                headers = MutableHeaders(raw=start["headers"])
+                del headers["content-length"]
+                _mark_encoded(headers)
+                await send(start)
+            out = streamer.chunk(body) if body else b""
+            if not more:
+                out += streamer.finish()
+            if out or not more:
+                await send({"type": "http.response.body", "body": out, "more_body": more})
+
+        async def _send_whole(start_msg, body: bytes):
+            headers = MutableHeaders(raw=start_msg["headers"])
+            if len(body) < COMPRESS_MIN_BYTES:
+                _mark_negotiated(headers)
+                await send(start_msg)
+                await send({"type": "http.response.body", "body": body})
+                return
+            if len(body) >= COMPRESS_THREAD_MIN_BYTES:
+                out = await run_in_threadpool(compressed_cache.get_or_compress, body, encoding)
+            else:
+                out = compressed_cache.get_or_compress(body, encoding)
+            headers["content-length"] = str(len(out))
+            _mark_encoded(headers)
+            await send(start_msg)
+            await send({"type": "http.response.body", "body": out})
+
+        await self.app(scope, receive, send_wrapper)
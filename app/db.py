@@ -1,25 +1,198 @@
+import hashlib
+import logging
 import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import partial
 import psycopg
 from psycopg.rows import dict_row
-from psycopg_pool import ConnectionPool
+from psycopg.types.numeric import Int8Dumper
+from psycopg_pool import ConnectionPool, AsyncConnectionPool, PoolTimeout
+from . import doc_index, profiling, refdata, replicas, schema
+from . import queries as Q
+
+log = logging.getLogger(__name__)
 
 DB_DSN = os.getenv("DB_DSN", "postgresql://localhost/postgres")
 POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
 POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
 DB_TIMEOUT = int(os.getenv("DB_TIMEOUT", "10"))
+# espera máxima por uma conexão livre e tamanho da fila de espera (0 = sem limite)
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "2"))
+DB_POOL_MAX_WAITING = int(os.getenv("DB_POOL_MAX_WAITING", "50"))
+# statement_timeout padrão das leituras (ms); as rotas podem pedir outro (0 = sem limite)
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "5000"))
+# 1 = handlers usam AsyncConnectionPool (sem ocupar threads do Starlette)
+DB_ASYNC = os.getenv("DB_ASYNC", "0").lower() in ("1", "true", "yes")
+# 1 = bootstrap cria pg_trgm e os índices GIN das buscas textuais
+DB_TRGM_INDEXES = os.getenv("DB_TRGM_INDEXES", "0").lower() in ("1", "true", "yes")
+# 1 = bootstrap cria os índices (update_time, id) do feed /v1/changes
+DB_CHANGES_INDEXES = os.getenv("DB_CHANGES_INDEXES", "0").lower() in ("1", "true", "yes")
+# 1 = bootstrap cria o índice (pipeline_id, update_time, id) das listagens Base Nova
+DB_PIPELINE_INDEXES = os.getenv("DB_PIPELINE_INDEXES", "0").lower() in ("1", "true", "yes")
+# 1 = bootstrap cria base_nova_pipelines com trigger ALWAYS em pipelines (tabela replicada:
+# um trigger que falha no subscriber para o apply inteiro, então só por opção)
+DB_BASE_NOVA_TRIGGER = os.getenv("DB_BASE_NOVA_TRIGGER", "0").lower() in ("1", "true", "yes")
+# 0 = bootstrap não aplica DDL (função, view, índices): só carrega registro e snapshots
+DB_BOOTSTRAP_DDL = os.getenv("DB_BOOTSTRAP_DDL", "1").lower() in ("1", "true", "yes")
+# um worker por vez aplica o DDL do bootstrap (os demais esperam e encontram tudo pronto)
+BOOTSTRAP_LOCK_KEY = 0x7064646C
+BOOTSTRAP_LOCK_POLL_SECONDS = 0.5
 
-pool: ConnectionPool | None = None
+# preparo automático (psycopg) das demais consultas após N execuções; vazio desliga
+_threshold = os.getenv("DB_PREPARE_THRESHOLD", "5")
+DB_PREPARE_THRESHOLD = int(_threshold) if _threshold.strip() else None
+DB_PREPARED_MAX = int(os.getenv("DB_PREPARED_MAX", "100"))
 
-def get_pool() -> ConnectionPool:
-    global pool
-    if pool is None:
-        pool = ConnectionPool(
-            conninfo=DB_DSN,
+def set_statement_timeout(conn: psycopg.Connection, timeout_ms: int | None) -> None:
+    """
+    Ajusta o statement_timeout da conexão do pool só quando muda (a conexão
+    guarda o último valor; nasce com DB_STATEMENT_TIMEOUT_MS).
+    """
+    ms = DB_STATEMENT_TIMEOUT_MS if timeout_ms is None else timeout_ms
+    if getattr(conn, "_statement_timeout_ms", DB_STATEMENT_TIMEOUT_MS) != ms:
+        conn.execute(f"SET statement_timeout = {int(ms)}")
+        conn._statement_timeout_ms = ms
+
+async def aset_statement_timeout(conn: psycopg.AsyncConnection, timeout_ms: int | None) -> None:
+    ms = DB_STATEMENT_TIMEOUT_MS if timeout_ms is None else timeout_ms
+    if getattr(conn, "_statement_timeout_ms", DB_STATEMENT_TIMEOUT_MS) != ms:
+        await conn.execute(f"SET statement_timeout = {int(ms)}")
+        conn._statement_timeout_ms = ms
+
+CONN_KWARGS = {
+    "autocommit": True, "row_factory": dict_row, "connect_timeout": DB_TIMEOUT,
+    "options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}",
+}
+
+def _configure_prepare(conn) -> None:
+    # int sempre como int8: um único statement preparado por SQL, qualquer que seja o valor
+    conn.adapters.register_dumper(int, Int8Dumper)
+    conn.prepare_threshold = DB_PREPARE_THRESHOLD if Q.PREPARE_HOT else None
+    conn.prepared_max = DB_PREPARED_MAX
+
+def _configure(conn: psycopg.Connection, dsn: str | None = None) -> None:
+    """
+    Hook do pool: prepara no backend novo as leituras quentes
+    (queries.hot_statements), executando-as uma vez com parâmetros de
+    exemplo; a primeira chamada real já usa o statement preparado.
+    `dsn` é o do nó do pool (o EXPLAIN das lentas roda nele).
+    """
+    _configure_prepare(conn)
+    conn._node_dsn = dsn
+    if Q.PREPARE_HOT:
+        for sql, params in Q.hot_statements():
+            try:
+                conn.execute(sql, params, prepare=True)
+            except psycopg.Error as e:
+                log.warning("preparo de conexão falhou: %s", e)
+    # depois do preparo: as execuções de exemplo não entram no profiling
+    if profiling.PROFILING_ENABLED:
+        conn.cursor_factory = profiling.ProfilingCursor
+
+async def _aconfigure(conn: psycopg.AsyncConnection, dsn: str | None = None) -> None:
+    _configure_prepare(conn)
+    conn._node_dsn = dsn
+    if Q.PREPARE_HOT:
+        for sql, params in Q.hot_statements():
+            try:
+                await conn.execute(sql, params, prepare=True)
+            except psycopg.Error as e:
+                log.warning("preparo de conexão falhou: %s", e)
+    if profiling.PROFILING_ENABLED:
+        conn.cursor_factory = profiling.AsyncProfilingCursor
+
+# primário (DB_DSN) + réplicas de leitura; cada nó tem o próprio pool
+nodes = replicas.NodeSet(DB_DSN, replicas.DB_REPLICA_DSNS)
+_pools_lock = threading.Lock()
+
+def node_pool(node: replicas.Node) -> ConnectionPool:
+    if node.pool is None:
+        with _pools_lock:
+            if node.pool is None:
+                node.pool = ConnectionPool(
+                    conninfo=node.dsn,
+                    min_size=POOL_MIN,
+                    max_size=POOL_MAX,
+                    kwargs=CONN_KWARGS,
+                    configure=partial(_configure, dsn=node.dsn),
+                    timeout=DB_POOL_TIMEOUT,
+                    max_waiting=DB_POOL_MAX_WAITING,
+                )
+    return node.pool
+
+def node_async_pool(node: replicas.Node) -> AsyncConnectionPool:
+    if node.apool is None:
+        # aberto explicitamente em open_async_pool() (precisa de event loop)
+        node.apool = AsyncConnectionPool(
+            conninfo=node.dsn,
             min_size=POOL_MIN,
             max_size=POOL_MAX,
-            kwargs={"autocommit": True, "row_factory": dict_row, "connect_timeout": DB_TIMEOUT},
+            kwargs=CONN_KWARGS,
+            configure=partial(_aconfigure, dsn=node.dsn),
+            timeout=DB_POOL_TIMEOUT,
+            max_waiting=DB_POOL_MAX_WAITING,
+            open=False,
         )
-    return pool
+    return node.apool
+
+def get_pool() -> ConnectionPool:
+    return node_pool(nodes.primary)
+
+def get_async_pool() -> AsyncConnectionPool:
+    return node_async_pool(nodes.primary)
+
+async def open_async_pool(wait: bool = False) -> AsyncConnectionPool:
+    for node in nodes.nodes:
+        try:
+            # wait=True: só retorna com DB_POOL_MIN conexões abertas (e já configuradas)
+            await node_async_pool(node).open(wait=wait, timeout=DB_TIMEOUT)
+        except PoolTimeout:
+            if node.primary:
+                raise
+            node.record_failure()
+    return get_async_pool()
+
+def prewarm_pools() -> None:
+    """
+    Abre DB_POOL_MIN conexões por nó antes do primeiro request; o hook
+    _configure já deixa as leituras quentes preparadas em cada uma.
+    Réplica que não responde a tempo conta falha e não segura o boot.
+    """
+    for node in nodes.nodes:
+        try:
+            node_pool(node).wait(timeout=DB_TIMEOUT)
+        except PoolTimeout:
+            if node.primary:
+                raise
+            node.record_failure()
+
+# leituras recusadas/abortadas (contadas no runner; viram 503 nas rotas)
+pool_events = {"statement_timeouts": 0, "pool_timeouts": 0, "pool_rejected": 0, "pool_closed": 0}
+
+def pool_stats() -> dict:
+    """
+    Contadores dos pools por nó (psycopg_pool.get_stats: espera, timeouts,
+    fila) mais conexões ativas/ociosas no momento.
+    """
+    out = {}
+    for node in nodes.nodes:
+        p = node.apool if DB_ASYNC else node.pool
+        if p is None:
+            continue
+        st = p.get_stats()
+        st["connections_idle"] = st.get("pool_available", 0)
+        st["connections_active"] = st.get("pool_size", 0) - st.get("pool_available", 0)
+        out[node.name] = st
+    return {"nodes": out, **pool_events}
+
+async def close_pools() -> None:
+    for node in nodes.nodes:
+        if node.apool is not None:
+            await node.apool.close()
+        if node.pool is not None:
+            node.pool.close()
 
 def table_exists(conn: psycopg.Connection, relname: str) -> bool:
     with conn.cursor() as cur:
@@ -52,33 +225,230 @@ def ensure_only_digits(conn) -> None:
             $$;
         """)
 
-def try_create_view_v_deals_base_nova(conn: psycopg.Connection):
-    with conn.cursor() as cur:
-        # cria/atualiza sem checar existência (idempotente)
-        cur.execute("""
-        CREATE OR REPLACE VIEW v_deals_base_nova AS
-        SELECT
-            d.id, d.title, d.status, d.value, d.currency,
-            d.add_time, d.update_time,
-            d.user_id, d.pipeline_id, d.stage_id, d.person_id, d.org_id
-        FROM negocios d
-        WHERE d.pipeline_id IN (
-            SELECT p.id
-            FROM pipelines p
-            WHERE lower(p.name) LIKE 'base nova%%'
-               OR lower(p.name) LIKE 'base-nova%%'
-               OR lower(p.name) LIKE 'basenova%%'
-        );
-        """)
+_BASE_NOVA_PIPELINES_FILL = """
+DELETE FROM base_nova_pipelines;
+INSERT INTO base_nova_pipelines (pipeline_id)
+SELECT id FROM pipelines
+WHERE lower(name) LIKE 'base nova%'
+   OR lower(name) LIKE 'base-nova%'
+   OR lower(name) LIKE 'basenova%';
+"""
 
-def bootstrap():
-    p = get_pool()
-    with p.connection() as conn:
+# ids Base Nova mantidos numa tabela (trigger de statement em pipelines, que muda
+# raramente): leituras e a view deixam de avaliar os LIKE a cada chamada
+SQL_BASE_NOVA_DDL = f"""
+CREATE TABLE IF NOT EXISTS base_nova_pipelines (pipeline_id bigint PRIMARY KEY);
+
+CREATE OR REPLACE FUNCTION refresh_base_nova_pipelines()
+RETURNS trigger LANGUAGE plpgsql SECURITY DEFINER SET search_path FROM CURRENT
+AS $$
+BEGIN
+{_BASE_NOVA_PIPELINES_FILL}
+  RETURN NULL;
+END $$;
+
+DROP TRIGGER IF EXISTS trg_base_nova_pipelines ON pipelines;
+CREATE TRIGGER trg_base_nova_pipelines
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON pipelines
+FOR EACH STATEMENT EXECUTE FUNCTION refresh_base_nova_pipelines();
+
+{_BASE_NOVA_PIPELINES_FILL}
+
+CREATE OR REPLACE VIEW v_deals_base_nova AS
+SELECT
+    d.id, d.title, d.status, d.value, d.currency,
+    d.add_time, d.update_time,
+    d.user_id, d.pipeline_id, d.stage_id, d.person_id, d.org_id
+FROM negocios d
+WHERE d.pipeline_id IN (SELECT pipeline_id FROM base_nova_pipelines);
+"""
+
+def _definition_tag(definition: str) -> str:
+    return "pipeboard:" + hashlib.md5(definition.encode()).hexdigest()
+
+# pipelines chega por replicação lógica: o apply do subscriber só dispara trigger ALWAYS/REPLICA
+SQL_BASE_NOVA_TRIGGER_ALWAYS = "ALTER TABLE pipelines ENABLE ALWAYS TRIGGER trg_base_nova_pipelines"
+
+def ensure_base_nova(conn: psycopg.Connection) -> bool:
+    """
+    Tabela base_nova_pipelines + trigger + view, numa transação e só quando a
+    definição mudou (hash da aplicada no COMMENT da view). Sem privilégio de
+    trigger em pipelines ou sem poder marcá-lo ENABLE ALWAYS (o apply da
+    replicação não o dispararia e a tabela ficaria velha), tudo é desfeito e as
+    leituras seguem no LIKE. Retorna True se executou o DDL.
+    """
+    tag = _definition_tag(SQL_BASE_NOVA_DDL + SQL_BASE_NOVA_TRIGGER_ALWAYS)
+    row = conn.execute("SELECT obj_description(to_regclass('v_deals_base_nova'), 'pg_class') AS tag").fetchone()
+    if row["tag"] == tag:
+        return False
+    try:
+        with conn.transaction():
+            conn.execute(SQL_BASE_NOVA_DDL)
+            # exige ser dono de pipelines; se falhar, o erro desfaz também a tabela e o trigger
+            conn.execute(SQL_BASE_NOVA_TRIGGER_ALWAYS)
+            conn.execute(f"COMMENT ON VIEW v_deals_base_nova IS '{tag}'")
+    except psycopg.Error as e:
+        log.warning("base_nova_pipelines não criada; deals/base-nova segue no LIKE: %s", e)
+        return False
+    return True
+
+# (tabela, índice, elemento) — mesmas expressões usadas nas buscas de queries.py
+TRGM_INDEXES = (
+    ("negocios", "idx_negocios_title_trgm", "title gin_trgm_ops"),
+    ("negocios", "idx_negocios_title_digits_trgm", "(only_digits(coalesce(title,''))) gin_trgm_ops"),
+    ("pessoas", "idx_pessoas_name_trgm", "name gin_trgm_ops"),
+    ("pessoas", "idx_pessoas_cpf_digits_trgm", "(only_digits(coalesce(cpf_text,''))) gin_trgm_ops"),
+    ("usuarios", "idx_usuarios_name_trgm", "name gin_trgm_ops"),
+    ("usuarios", "idx_usuarios_email_trgm", "email gin_trgm_ops"),
+)
+
+def ensure_trgm_indexes(conn: psycopg.Connection) -> None:
+    """
+    Cria a extensão pg_trgm e os índices GIN das buscas (ILIKE '%q%').
+    CONCURRENTLY não bloqueia a replicação; sem privilégio, segue sem índices.
+    """
+    try:
+        conn.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    except psycopg.Error:
+        return
+    for table, name, element in TRGM_INDEXES:
+        _create_index_concurrently(conn, table, name, f"USING gin ({element})")
+
+# listagens por pipeline em ordem de update_time (Base Nova): mesma ordem de DEALS_ORDER
+PIPELINE_INDEXES = (
+    ("negocios", "idx_negocios_pipeline_recent", "(pipeline_id, update_time DESC NULLS LAST, id DESC)"),
+)
+
+def ensure_pipeline_indexes(conn: psycopg.Connection) -> None:
+    for table, name, definition in PIPELINE_INDEXES:
+        _create_index_concurrently(conn, table, name, definition)
+
+CHANGES_INDEXES = (
+    ("negocios", "idx_negocios_changes", "(update_time, id)"),
+    ("pessoas", "idx_pessoas_changes", "(update_time, id)"),
+    ("organizacoes", "idx_organizacoes_changes", "(update_time, id)"),
+)
+
+def ensure_changes_indexes(conn: psycopg.Connection) -> None:
+    for table, name, definition in CHANGES_INDEXES:
+        _create_index_concurrently(conn, table, name, definition)
+
+def _create_index_concurrently(conn: psycopg.Connection, table: str, name: str, definition: str) -> None:
+    if not table_exists(conn, table):
+        return
+    try:
+        conn.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} {definition}")
+    except psycopg.Error:
+        # build interrompido deixa o índice INVALID: remove para recriar no próximo boot
+        try:
+            conn.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+        except psycopg.Error:
+            pass
+
+def start_schema_watcher():
+    return schema.start_watcher(
+        DB_DSN, {"row_factory": dict_row, "connect_timeout": DB_TIMEOUT}
+    )
+
+def start_doc_index_refresher():
+    return doc_index.start_refresher(
+        DB_DSN, {"row_factory": dict_row, "connect_timeout": DB_TIMEOUT}
+    )
+
+def start_refdata_refresher():
+    return refdata.start_refresher(
+        DB_DSN, {"row_factory": dict_row, "connect_timeout": DB_TIMEOUT}
+    )
+
+def start_slow_query_explainer():
+    return profiling.start_explainer(
+        DB_DSN, {"row_factory": dict_row, "connect_timeout": DB_TIMEOUT}
+    )
+
+def start_replica_health_checks():
+    return replicas.start_health_checks(
+        nodes, {"row_factory": dict_row, "connect_timeout": DB_TIMEOUT}
+    )
+
+def _bootstrap_connection():
+    # conexão avulsa sem statement_timeout: DDL e índices CONCURRENTLY podem demorar
+    return psycopg.connect(DB_DSN, **{**CONN_KWARGS, "options": "-c statement_timeout=0"})
+
+# duração das fases do boot (ms) e prontidão, expostas em /ready e /metrics
+startup = {"ready": False, "phases_ms": {}, "total_ms": None, "ddl_applied": [], "error": None}
+
+@contextmanager
+def startup_phase(name: str):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        startup["phases_ms"][name] = round((time.perf_counter() - t0) * 1000.0, 1)
+
+@contextmanager
+def _bootstrap_lock(conn: psycopg.Connection):
+    """
+    Advisory lock de sessão por polling em autocommit: quem espera não fica
+    num SELECT pg_advisory_lock bloqueado (com snapshot aberto), pelo qual o
+    CREATE INDEX CONCURRENTLY do dono do lock esperaria para sempre.
+    """
+    while not conn.execute("SELECT pg_try_advisory_lock(%s) AS ok", (BOOTSTRAP_LOCK_KEY,)).fetchone()["ok"]:
+        time.sleep(BOOTSTRAP_LOCK_POLL_SECONDS)
+    try:
+        yield
+    finally:
+        conn.execute("SELECT pg_advisory_unlock(%s)", (BOOTSTRAP_LOCK_KEY,))
+
+def apply_ddl(conn: psycopg.Connection) -> list[str]:
+    """
+    DDL do bootstrap sob advisory lock de sessão (os índices CONCURRENTLY não
+    rodam em transação): com vários workers subindo juntos, só um aplica.
+    Retorna o que foi de fato (re)criado.
+    """
+    applied = []
+    with _bootstrap_lock(conn):
         ensure_only_digits(conn)
-        try_create_view_v_deals_base_nova(conn)
+        if DB_BASE_NOVA_TRIGGER and ensure_base_nova(conn):
+            applied.append("base_nova_pipelines")
+        if doc_index.DOC_INDEX_ENABLED:
+            # usa o registro (coluna de documento de organizacoes)
+            with startup_phase("doc_index"):
+                schema.refresh(conn)
+                if doc_index.ensure(conn):
+                    applied.append("doc_index")
+        if DB_TRGM_INDEXES:
+            ensure_trgm_indexes(conn)
+        if DB_CHANGES_INDEXES:
+            ensure_changes_indexes(conn)
+        if DB_PIPELINE_INDEXES:
+            ensure_pipeline_indexes(conn)
+    return applied
+
+def bootstrap():
+    with _bootstrap_connection() as conn:
+        if DB_BOOTSTRAP_DDL:
+            with startup_phase("ddl"):
+                startup["ddl_applied"] = apply_ddl(conn)
+        # capacidades carregadas após o DDL (inclui a view e o doc_index recém-criados)
+        with startup_phase("schema"):
+            schema.refresh(conn)
+        if refdata.REFDATA_ENABLED:
+            with startup_phase("refdata"):
+                refdata.refresh(conn, force=True)
+
+def _with_nodes(out: dict) -> dict:
+    # com réplicas, o health do primário informa também quais nós estão na seleção
+    if len(nodes.nodes) > 1:
+        out["nodes"] = {n.name: n.available for n in nodes.nodes}
+    return out
 
 def health_check() -> dict:
     p = get_pool()
     with p.connection() as conn, conn.cursor() as cur:
         cur.execute("select 1 as ok")
-        return {"ok": cur.fetchone()["ok"] == 1}
+        return _with_nodes({"ok": cur.fetchone()["ok"] == 1})
+
+async def ahealth_check() -> dict:
+    async with get_async_pool().connection() as conn, conn.cursor() as cur:
+        await cur.execute("select 1 as ok")
+        return _with_nodes({"ok": (await cur.fetchone())["ok"] == 1})
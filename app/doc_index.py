@@ -0,0 +1,157 @@
+import os
+import threading
+import time
+import psycopg
+from . import schema
+from .queries import DOC_INDEX_ENABLED, org_doc_column
+
+DOC_INDEX_REFRESH_SECONDS = int(os.getenv("DOC_INDEX_REFRESH_SECONDS", "60"))
+# releitura para trás do watermark: a replicação pode gravar linhas com update_time antigo
+DOC_INDEX_OVERLAP_SECONDS = int(os.getenv("DOC_INDEX_OVERLAP_SECONDS", "300"))
+# de quanto em quanto tempo remover entradas de linhas apagadas na origem
+DOC_INDEX_PRUNE_SECONDS = int(os.getenv("DOC_INDEX_PRUNE_SECONDS", "3600"))
+
+# uma instância por vez mantém a tabela (as demais só leem)
+DOC_INDEX_LOCK_KEY = 0x70646F63
+
+# CPF/CNPJ com ou sem máscara, sem dígitos colados antes/depois (CNPJ primeiro: é o mais longo)
+TITLE_DOC_PATTERN = (
+    r"(?<![0-9])([0-9]{2}\.?[0-9]{3}\.?[0-9]{3}/?[0-9]{4}-?[0-9]{2}"
+    r"|[0-9]{3}\.?[0-9]{3}\.?[0-9]{3}-?[0-9]{2})(?![0-9])"
+)
+
+SQL_DOC_INDEX_DDL = """
+CREATE TABLE IF NOT EXISTS doc_index (
+    doc_digits  text        NOT NULL,
+    entity_type text        NOT NULL,
+    entity_id   bigint      NOT NULL,
+    update_time timestamptz,
+    PRIMARY KEY (entity_type, entity_id, doc_digits)
+);
+CREATE INDEX IF NOT EXISTS idx_doc_index_lookup ON doc_index (doc_digits, entity_type);
+CREATE TABLE IF NOT EXISTS doc_index_watermarks (
+    entity_type  text PRIMARY KEY,
+    watermark    timestamptz,
+    refreshed_at timestamptz NOT NULL DEFAULT now()
+);
+"""
+
+SQL_DOC_INDEX_DELETE_STALE = """
+DELETE FROM doc_index di
+USING {table} t
+WHERE di.entity_type = %(etype)s
+  AND di.entity_id = t.id
+  AND {since}
+  AND NOT (di.doc_digits = ANY({docs}))
+"""
+
+SQL_DOC_INDEX_UPSERT = """
+INSERT INTO doc_index (doc_digits, entity_type, entity_id, update_time)
+SELECT DISTINCT doc, %(etype)s, t.id, t.update_time
+FROM {table} t
+CROSS JOIN LATERAL unnest({docs}) AS doc
+WHERE {since} AND doc <> ''
+ON CONFLICT (entity_type, entity_id, doc_digits) DO UPDATE SET update_time = EXCLUDED.update_time
+"""
+
+SQL_DOC_INDEX_PRUNE = """
+DELETE FROM doc_index di
+WHERE di.entity_type = %(etype)s
+  AND NOT EXISTS (SELECT 1 FROM {table} t WHERE t.id = di.entity_id)
+"""
+
+SQL_DOC_INDEX_SAVE_WATERMARK = """
+INSERT INTO doc_index_watermarks (entity_type, watermark, refreshed_at)
+VALUES (%(etype)s, %(watermark)s, now())
+ON CONFLICT (entity_type) DO UPDATE
+SET watermark = coalesce(EXCLUDED.watermark, doc_index_watermarks.watermark), refreshed_at = now()
+"""
+
+def _sources() -> list[tuple[str, str, str]]:
+    """
+    (entity_type, tabela, array de dígitos de documento da linha `t`).
+    """
+    out = []
+    if schema.has_table("pessoas"):
+        out.append(("person", "pessoas", "ARRAY[only_digits(coalesce(t.cpf_text,''))]"))
+    col = org_doc_column()
+    if col:
+        out.append(("org", "organizacoes", f"ARRAY[only_digits(coalesce(t.{col},''))]"))
+    if schema.has_table("negocios"):
+        out.append((
+            "deal", "negocios",
+            "ARRAY(SELECT only_digits(m.tok[1]) FROM regexp_matches(coalesce(t.title,''), %(pattern)s, 'g') AS m(tok))",
+        ))
+    return out
+
+def _refresh_source(cur: psycopg.Cursor, etype: str, table: str, docs: str, prune: bool) -> None:
+    cur.execute("SELECT watermark FROM doc_index_watermarks WHERE entity_type = %s", (etype,))
+    row = cur.fetchone()
+    params = {"etype": etype, "pattern": TITLE_DOC_PATTERN}
+    if row and row["watermark"] is not None:
+        since = "t.update_time > %(since)s - make_interval(secs => %(overlap)s)"
+        params.update({"since": row["watermark"], "overlap": DOC_INDEX_OVERLAP_SECONDS})
+    else:
+        since = "TRUE"
+    # watermark novo lido antes: o que chegar durante o refresh entra de novo no próximo
+    cur.execute(f"SELECT max(t.update_time) AS hi FROM {table} t WHERE {since}", params)
+    hi = cur.fetchone()["hi"]
+    cur.execute(SQL_DOC_INDEX_DELETE_STALE.format(table=table, since=since, docs=docs), params)
+    cur.execute(SQL_DOC_INDEX_UPSERT.format(table=table, since=since, docs=docs), params)
+    if prune:
+        cur.execute(SQL_DOC_INDEX_PRUNE.format(table=table), params)
+    cur.execute(SQL_DOC_INDEX_SAVE_WATERMARK, {"etype": etype, "watermark": hi})
+
+def refresh(conn: psycopg.Connection, *, prune: bool = False) -> bool:
+    """
+    Atualiza o doc_index a partir do watermark de update_time de cada origem
+    (primeira carga: tudo). Devolve False se outra instância está atualizando.
+    """
+    with conn.transaction(), conn.cursor() as cur:
+        cur.execute("SELECT pg_try_advisory_xact_lock(%s) AS ok", (DOC_INDEX_LOCK_KEY,))
+        if not cur.fetchone()["ok"]:
+            return False
+        for etype, table, docs in _sources():
+            _refresh_source(cur, etype, table, docs, prune)
+    return True
+
+def ensure(conn: psycopg.Connection) -> bool:
+    """
+    Cria as tabelas e faz a carga inicial na mesma transação: a tabela só
+    aparece no registro de capacidades (e passa a servir leituras) já populada.
+    Com a tabela já carregada (boot de outro worker, restart) não recarrega:
+    o resto fica com o refresh em background. Devolve True se carregou.
+    """
+    with conn.transaction(), conn.cursor() as cur:
+        cur.execute("SELECT pg_advisory_xact_lock(%s)", (DOC_INDEX_LOCK_KEY,))
+        cur.execute(SQL_DOC_INDEX_DDL)
+        cur.execute("SELECT EXISTS (SELECT 1 FROM doc_index) AS loaded")
+        if cur.fetchone()["loaded"]:
+            return False
+        for etype, table, docs in _sources():
+            _refresh_source(cur, etype, table, docs, prune=True)
+    return True
+
+# — Refresh em background ——————————————————————————————————————————
+def _loop(dsn: str, connect_kwargs: dict) -> None:
+    last_prune = time.monotonic()
+    while True:
+        try:
+            with psycopg.connect(dsn, autocommit=True, **connect_kwargs) as conn:
+                while True:
+                    time.sleep(DOC_INDEX_REFRESH_SECONDS)
+                    prune = time.monotonic() - last_prune >= DOC_INDEX_PRUNE_SECONDS
+                    if refresh(conn, prune=prune) and prune:
+                        last_prune = time.monotonic()
+        except Exception:
+            # conexão caiu ou origem indisponível: tenta de novo sem derrubar a API
+            time.sleep(5)
+
+def start_refresher(dsn: str, connect_kwargs: dict | None = None) -> threading.Thread | None:
+    if not DOC_INDEX_ENABLED or DOC_INDEX_REFRESH_SECONDS <= 0:
+        return None
+    t = threading.Thread(
+        target=_loop, args=(dsn, connect_kwargs or {}), name="doc-index-refresher", daemon=True
+    )
+    t.start()
+    return t
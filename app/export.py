@@ -0,0 +1,77 @@
+import csv
+import io
+from datetime import date, datetime
+from typing import Any, AsyncIterator, Iterable, Iterator
+from .responses import dumps
+
+# linhas por chunk HTTP (o cursor do servidor busca em lotes de itersize)
+CHUNK_ROWS = 500
+
+def _csv_value(v: Any) -> Any:
+    if v is None:
+        return ""
+    if isinstance(v, (datetime, date)):
+        return v.isoformat()
+    return v
+
+class _Encoder:
+    def __init__(self, fmt: str, columns: Iterable[str]):
+        self.fmt = fmt
+        self.columns = tuple(columns)
+        self._buf = io.StringIO()
+        self._csv = csv.writer(self._buf, lineterminator="\n")
+
+    def header(self) -> bytes:
+        if self.fmt != "csv":
+            return b""
+        self._csv.writerow(self.columns)
+        return self._take()
+
+    def rows(self, rows: list[dict]) -> bytes:
+        if self.fmt == "csv":
+            self._csv.writerows([_csv_value(r.get(c)) for c in self.columns] for r in rows)
+            return self._take()
+        return b"".join(dumps(r) + b"\n" for r in rows)
+
+    def _take(self) -> bytes:
+        out = self._buf.getvalue()
+        self._buf.seek(0)
+        self._buf.truncate()
+        return out.encode("utf-8")
+
+def _chunks(rows: Iterator[dict], enc: _Encoder) -> Iterator[bytes]:
+    head = enc.header()
+    if head:
+        yield head
+    batch: list[dict] = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= CHUNK_ROWS:
+            yield enc.rows(batch)
+            batch = []
+    if batch:
+        yield enc.rows(batch)
+
+async def _achunks(rows: AsyncIterator[dict], enc: _Encoder) -> AsyncIterator[bytes]:
+    head = enc.header()
+    if head:
+        yield head
+    batch: list[dict] = []
+    async for row in rows:
+        batch.append(row)
+        if len(batch) >= CHUNK_ROWS:
+            yield enc.rows(batch)
+            batch = []
+    if batch:
+        yield enc.rows(batch)
+
+def encode_stream(rows: Iterator[dict] | AsyncIterator[dict], fmt: str, columns: Iterable[str]):
+    """
+    Converte um iterador de linhas (sync ou async) em chunks NDJSON/CSV.
+    """
+    enc = _Encoder(fmt, columns)
+    if hasattr(rows, "__aiter__"):
+        return _achunks(rows, enc)
+    return _chunks(rows, enc)
+
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv; charset=utf-8"}
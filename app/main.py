@@ -1,80 +1,330 @@
+import asyncio
 import os
-from fastapi import FastAPI, Depends, Query, Response, HTTPException, Path
-from fastapi.responses import JSONResponse
+import time
+from datetime import datetime, timedelta, timezone
+import psycopg
+from fastapi import FastAPI, Depends, Query, Request, Response, HTTPException, Path
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from psycopg_pool import PoolClosed, PoolTimeout, TooManyRequests
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
 from .auth import require_bearer
-from .db import get_pool, bootstrap, health_check, table_exists
-from .models import Deal, Person, User, Pipeline, Stage, Organization, EntitiesByDocResponse
-from .utils import with_cache_headers, pagin_params, only_digits, normalize_document_by_type, build_pf_pj_variants
+from .db import (
+    DB_ASYNC, bootstrap, health_check, ahealth_check, open_async_pool, close_pools, start_schema_watcher,
+    start_doc_index_refresher, start_refdata_refresher, start_replica_health_checks, nodes,
+    pool_stats, start_slow_query_explainer, prewarm_pools, startup, startup_phase,
+)
+from .models import (
+    Deal, DealExpanded, Person, User, Pipeline, Stage, Organization, EntitiesByDocResponse, EntitiesByDocBatchRequest,
+    IdsBatchRequest, DealStats,
+)
+from .utils import (
+    with_cache_headers, pagin_params, only_digits, normalize_document_by_type, build_pf_pj_variants,
+    decide_entity_match, encode_cursor, decode_cursor,
+)
 from . import queries as Q
+from . import metrics, profiling, refdata, schema
+from .replicas import DB_MAX_LAG_SECONDS
+from .runner import run, stream
+from .export import encode_stream, MEDIA_TYPES
+from .responses import TimedJSONResponse, not_modified, reply, rows_etag, etag_of
+from .cache import response_cache
+from .compression import CompressionMiddleware, compressed_cache
+from .singleflight import query_flights
 
 API_PREFIX = os.getenv("API_PREFIX", "/api")
+BATCH_MAX_DOCS = int(os.getenv("BATCH_MAX_DOCS", "10000"))
+BATCH_MAX_IDS = int(os.getenv("BATCH_MAX_IDS", "5000"))
+CHANGES_MAX_LIMIT = int(os.getenv("CHANGES_MAX_LIMIT", "10000"))
+# janela de atraso (s): consumidor em dia relê só o trecho do watermark que cai nela
+CHANGES_OVERLAP_SECONDS = int(os.getenv("CHANGES_OVERLAP_SECONDS", "300"))
+STATS_MAX_GROUPS = int(os.getenv("STATS_MAX_GROUPS", "10000"))
+STATS_CACHE_TTL = int(os.getenv("STATS_CACHE_TTL", "30"))
+EXPORT_ITERSIZE = int(os.getenv("EXPORT_ITERSIZE", "2000"))
+# rotas com TTL curto (dados recém-alterados) só leem de réplicas dentro deste atraso
+FRESH_MAX_LAG = DB_MAX_LAG_SECONDS or None
+# statement_timeout por rota (ms): buscas por chave curtas, buscas com filtros livres longas
+LOOKUP_TIMEOUT_MS = int(os.getenv("DB_LOOKUP_TIMEOUT_MS", "1000"))
+SEARCH_TIMEOUT_MS = int(os.getenv("DB_SEARCH_TIMEOUT_MS", "15000"))
+# export: vale para cada FETCH de `itersize` linhas do cursor no servidor
+EXPORT_TIMEOUT_MS = int(os.getenv("DB_EXPORT_TIMEOUT_MS", "60000"))
+# sugestão de nova tentativa no 503 de sobrecarga (s)
+RETRY_AFTER_SECONDS = int(os.getenv("RETRY_AFTER_SECONDS", "1"))
+# 1 = o boot (bootstrap + pré-aquecimento) roda em background; /ready responde 503 até terminar
+STARTUP_BACKGROUND = os.getenv("STARTUP_BACKGROUND", "0").lower() in ("1", "true", "yes")
+
+app = FastAPI(title="Pipeboard Read API", version="1.2.0", default_response_class=TimedJSONResponse)
+# a última adicionada é a mais externa: métricas medem também a compressão
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(metrics.MetricsMiddleware)
 
-app = FastAPI(title="Pipeboard Read API", version="1.2.0")
+async def _warm_start():
+    t0 = time.perf_counter()
+    await run_in_threadpool(bootstrap)
+    start_schema_watcher()
+    start_doc_index_refresher()
+    start_refdata_refresher()
+    start_replica_health_checks()
+    start_slow_query_explainer()
+    # pré-aquecimento depois do registro: as leituras quentes dependem das capacidades
+    with startup_phase("prewarm"):
+        if DB_ASYNC:
+            await open_async_pool(wait=True)
+        else:
+            await run_in_threadpool(prewarm_pools)
+    startup["total_ms"] = round((time.perf_counter() - t0) * 1000.0, 1)
+    startup["ready"] = True
+
+async def _background_start():
+    try:
+        await _warm_start()
+    except Exception as e:
+        # worker segue vivo (/health) e fora do balanceamento (/ready)
+        startup["error"] = f"{type(e).__name__}: {e}"
 
 @app.on_event("startup")
-def _startup():
-    bootstrap()
+async def _startup():
+    if STARTUP_BACKGROUND:
+        app.state.startup_task = asyncio.create_task(_background_start())
+    else:
+        await _warm_start()
+
+@app.on_event("shutdown")
+async def _shutdown():
+    await close_pools()
+
+@app.exception_handler(PoolTimeout)
+@app.exception_handler(TooManyRequests)
+@app.exception_handler(PoolClosed)
+@app.exception_handler(psycopg.errors.QueryCanceled)
+async def _overloaded(request: Request, exc: Exception):
+    """
+    Pool sem conexão livre a tempo, fila de espera cheia e statement_timeout
+    estourado viram 503 imediato com Retry-After, em vez de segurar o
+    cliente até o timeout dele. Pool ainda fechado (STARTUP_BACKGROUND=1 com
+    DB_ASYNC=1, antes do /ready) também.
+    """
+    if isinstance(exc, psycopg.errors.QueryCanceled):
+        detail = "query timeout"
+    elif isinstance(exc, PoolClosed):
+        detail = "starting" if not startup["ready"] else "database unavailable"
+    else:
+        detail = "database busy"
+    return JSONResponse(status_code=503, content={"detail": detail},
+                        headers={"Retry-After": str(RETRY_AFTER_SECONDS)})
+
+def _require_table(relname: str) -> None:
+    """
+    Checa a capacidade em memória (sem ida ao pg_catalog por request).
+    """
+    if not schema.has_table(relname):
+        raise HTTPException(status_code=501, detail=f"{relname} not available")
+
+def _decode_after(cursor: str | None, key: Q.OrderKey) -> tuple | None:
+    if not cursor:
+        return None
+    try:
+        return decode_cursor(cursor, key.token)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+SORT_QUERY = Query("recent", regex="^(recent|relevance)$",
+                   description="recent (padrão) ou relevance (pg_trgm; paginação só por offset)")
+
+def _by_relevance(sort: str, cursor: str | None) -> bool:
+    if sort != "relevance":
+        return False
+    if cursor:
+        raise HTTPException(status_code=400, detail="cursor não se aplica a sort=relevance; use offset")
+    if not schema.has_extension("pg_trgm"):
+        raise HTTPException(status_code=501, detail="sort=relevance requer a extensão pg_trgm")
+    return True
+
+INCLUDE_QUERY = Query(None, description="relacionados a embutir: person,organization,stage,owner")
+
+def _parse_include(include: str | None) -> tuple[str, ...]:
+    if not include:
+        return ()
+    asked = {p.strip().lower() for p in include.split(",") if p.strip()}
+    unknown = asked - set(Q.DEAL_RELATIONS)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"include inválido: {', '.join(sorted(unknown))}")
+    return tuple(rel for rel in Q.DEAL_RELATIONS if rel in asked)
+
+async def _with_related(rows: list[dict], include: tuple[str, ...]) -> list[dict]:
+    """
+    Embute os relacionados pedidos: etapa/dono saem do snapshot em memória
+    quando disponível; o resto vem numa consulta por relação (id = ANY).
+    """
+    if not include or not rows:
+        return rows
+    ids = Q.related_ids(rows, include)
+    related: dict[str, dict[int, dict]] = {}
+    if "stage" in ids and refdata.ready("etapas_funil"):
+        related["stage"] = refdata.stages_by_ids(ids.pop("stage"))
+    if "owner" in ids and refdata.ready("usuarios"):
+        related["owner"] = refdata.users_by_ids(ids.pop("owner"))
+    if ids:
+        related.update(await run(Q.related_by_ids, ids, cache_ttl=10))
+    return Q.embed_related(rows, {rel: related[rel] for rel in include})
+
+def _set_next_cursor(response: Response | None, rows: list[dict], key: Q.OrderKey, limit: int,
+                     after: tuple | None) -> None:
+    nxt = Q.cursor_after(rows, key, limit, after)
+    if response is not None and nxt is not None:
+        response.headers["X-Next-Cursor"] = encode_cursor(key.token, nxt)
 
 @app.get(f"{API_PREFIX}/health")
-def health():
-    return health_check()
+async def health():
+    if DB_ASYNC:
+        return await ahealth_check()
+    return await run_in_threadpool(health_check)
+
+@app.get(f"{API_PREFIX}/ready")
+async def ready():
+    """
+    Prontidão (balanceador/rollout): 200 só depois do bootstrap e do
+    pré-aquecimento dos pools; /health segue como liveness.
+    """
+    return JSONResponse(status_code=200 if startup["ready"] else 503, content=startup)
+
+# gauges/contadores lidos na coleta (os stats já mantidos por cache, single-flight e pools)
+POOL_GAUGES = (
+    ("db_pool_size", "Conexões abertas no pool.", "pool_size", "gauge"),
+    ("db_pool_connections_active", "Conexões em uso.", "connections_active", "gauge"),
+    ("db_pool_connections_idle", "Conexões livres.", "connections_idle", "gauge"),
+    ("db_pool_requests_waiting", "Requests na fila do pool.", "requests_waiting", "gauge"),
+    ("db_pool_requests_total", "Conexões pedidas ao pool.", "requests_num", "counter"),
+    ("db_pool_requests_errors_total", "Pedidos ao pool que falharam (timeout/fila cheia).", "requests_errors", "counter"),
+)
+
+def _collect_stats():
+    cache = response_cache.stats()
+    yield from metrics.gauges("cache_hits_total", "Acertos do cache de respostas.", {None: cache["hits"]}, kind="counter")
+    yield from metrics.gauges("cache_misses_total", "Faltas do cache de respostas.", {None: cache["misses"]}, kind="counter")
+    yield from metrics.gauges("cache_hit_ratio", "Acertos / consultas ao cache.", {None: cache["hit_ratio"]})
+    yield from metrics.gauges("cache_entries", "Entradas no cache.", {None: cache["entries"]})
+    packed = compressed_cache.stats()
+    yield from metrics.gauges("compression_cache_hits_total", "Corpos comprimidos reaproveitados do cache.",
+                              {None: packed["hits"]}, kind="counter")
+    yield from metrics.gauges("compression_cache_misses_total", "Corpos comprimidos na hora.",
+                              {None: packed["misses"]}, kind="counter")
+    flights = query_flights.stats()
+    yield from metrics.gauges("singleflight_collapsed_total", "Consultas agrupadas numa já em andamento.",
+                              {None: flights["collapsed"]}, kind="counter")
+    pools = pool_stats()
+    for name, doc, key, kind in POOL_GAUGES:
+        yield from metrics.gauges(name, doc, {n: st.get(key) for n, st in pools["nodes"].items()}, "node", kind)
+    for event in ("statement_timeouts", "pool_timeouts", "pool_rejected", "pool_closed"):
+        yield from metrics.gauges(f"db_{event}_total", f"Leituras com {event} (503).", {None: pools[event]},
+                                  kind="counter")
+    node_stats = nodes.stats()["nodes"]
+    yield from metrics.gauges("db_node_available", "1 se o nó está na seleção.",
+                              {n["name"]: int(n["available"]) for n in node_stats}, "node")
+    yield from metrics.gauges("db_node_replication_lag_seconds", "Atraso de replay do nó.",
+                              {n["name"]: n["lag_s"] for n in node_stats}, "node")
+    yield from metrics.gauges("startup_phase_seconds", "Duração das fases do boot do worker.",
+                              {k: v / 1000.0 for k, v in {**startup["phases_ms"], "total": startup["total_ms"]}.items()
+                               if v is not None}, "phase")
+    yield from metrics.gauges("startup_ready", "1 depois do bootstrap e do pré-aquecimento.",
+                              {None: int(startup["ready"])})
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics_route():
+    if not metrics.METRICS_ENABLED:
+        raise HTTPException(status_code=404)
+    return PlainTextResponse(metrics.render(_collect_stats), media_type="text/plain; version=0.0.4")
+
+@app.get(f"{API_PREFIX}/v1/admin/cache", dependencies=[Depends(require_bearer)])
+async def cache_stats():
+    return response_cache.stats()
+
+@app.get(f"{API_PREFIX}/v1/admin/compression", dependencies=[Depends(require_bearer)])
+async def compression_stats():
+    return compressed_cache.stats()
+
+@app.get(f"{API_PREFIX}/v1/admin/singleflight", dependencies=[Depends(require_bearer)])
+async def singleflight_stats():
+    return query_flights.stats()
+
+@app.get(f"{API_PREFIX}/v1/admin/refdata", dependencies=[Depends(require_bearer)])
+async def refdata_stats():
+    return refdata.snapshot()
+
+@app.get(f"{API_PREFIX}/v1/admin/pool", dependencies=[Depends(require_bearer)])
+async def pool_stats_route():
+    return pool_stats()
+
+@app.get(f"{API_PREFIX}/v1/admin/slow-queries", dependencies=[Depends(require_bearer)])
+async def slow_queries(limit: int = Query(50, ge=1, le=500)):
+    """
+    Consultas acima de SLOW_QUERY_MS: as mais recentes e as formas de SQL
+    (filtros combinados) com maior tempo somado, com o plano quando amostrado.
+    """
+    return profiling.snapshot(limit)
+
+@app.delete(f"{API_PREFIX}/v1/admin/slow-queries", dependencies=[Depends(require_bearer)], status_code=204)
+async def slow_queries_reset():
+    profiling.reset()
+
+@app.get(f"{API_PREFIX}/v1/admin/nodes", dependencies=[Depends(require_bearer)])
+async def nodes_stats():
+    return nodes.stats()
 
 # — Pessoas ——————————————————————————————————————————————————————
 @app.get(f"{API_PREFIX}/v1/persons/by-doc", response_model=Person | None, dependencies=[Depends(require_bearer)])
-def person_by_doc(doc: str = Query(..., description="CPF (com/sem máscara)"), response: Response = None):
-    pool = get_pool()
+async def person_by_doc(doc: str = Query(..., description="CPF (com/sem máscara)"), response: Response = None):
     d = only_digits(doc)
-    with pool.connection() as conn:
-        if not table_exists(conn, "pessoas"):
-            raise HTTPException(status_code=501, detail="pessoas not available")
-        row = Q.person_by_document(conn, d)
+    _require_table("pessoas")
+    row = await run(Q.person_by_document, d, cache_ttl=20, timeout_ms=LOOKUP_TIMEOUT_MS)
     if response is not None:
         response.headers["X-Normalized-Doc"] = ",".join(normalize_document_by_type(doc, "PF"))
     with_cache_headers(response, 20)
-    return row or JSONResponse(status_code=404, content=None)
+    return reply(row, response) if row else JSONResponse(status_code=404, content=None)
 
 @app.get(f"{API_PREFIX}/v1/persons", response_model=list[Person], dependencies=[Depends(require_bearer)])
-def persons(q: str | None = Query(None, description="Busca por nome ou CPF"),
-            limit: int | None = 100, offset: int | None = 0, response: Response = None):
+async def persons(q: str | None = Query(None, description="Busca por nome ou CPF"),
+                  limit: int | None = 100, offset: int | None = 0,
+                  cursor: str | None = Query(None, description="cursor opaco (header X-Next-Cursor)"),
+                  sort: str = SORT_QUERY,
+                  response: Response = None):
     lim, off = pagin_params(limit, offset)
-    with get_pool().connection() as conn:
-        if not table_exists(conn, "pessoas"):
-            raise HTTPException(status_code=501, detail="pessoas not available")
-        rows = Q.persons_list(conn, q=q, limit=lim, offset=off)
+    by_relevance = bool(q) and _by_relevance(sort, cursor)
+    after = _decode_after(cursor, Q.PERSONS_ORDER)
+    _require_table("pessoas")
+    rows = await run(Q.persons_list, q=q, limit=lim, offset=0 if after else off, after=after,
+                     by_relevance=by_relevance, cache_ttl=20)
+    if not by_relevance:
+        _set_next_cursor(response, rows, Q.PERSONS_ORDER, lim, after)
     with_cache_headers(response, 20)
-    return rows
+    return reply(rows, response)
 
 @app.get(f"{API_PREFIX}/v1/persons/{{person_id}}", response_model=Person | None, dependencies=[Depends(require_bearer)])
-def person_by_id(person_id: int = Path(...), response: Response = None):
-    with get_pool().connection() as conn:
-        if not table_exists(conn, "pessoas"):
-            raise HTTPException(status_code=501, detail="pessoas not available")
-        row = Q.person_by_id(conn, person_id)
+async def person_by_id(person_id: int = Path(...), response: Response = None):
+    _require_table("pessoas")
+    row = await run(Q.person_by_id, person_id, cache_ttl=60, timeout_ms=LOOKUP_TIMEOUT_MS)
     with_cache_headers(response, 60)
-    return row or JSONResponse(status_code=404, content=None)
+    return reply(row, response) if row else JSONResponse(status_code=404, content=None)
 
 # — Organizações (NOVO) ————————————————————————————————————————————
 @app.get(f"{API_PREFIX}/v1/organizations/by-doc", response_model=Organization | None, dependencies=[Depends(require_bearer)])
-def organization_by_doc(doc: str = Query(..., description="CNPJ (com/sem máscara)"), response: Response = None):
+async def organization_by_doc(doc: str = Query(..., description="CNPJ (com/sem máscara)"), response: Response = None):
     d = only_digits(doc)
-    with get_pool().connection() as conn:
-        if not table_exists(conn, "organizacoes"):
-            # mantém sem erro 500; informa capacidade
-            raise HTTPException(status_code=501, detail="organizacoes not available")
-        row = Q.organization_by_document(conn, d)
+    _require_table("organizacoes")
+    if Q.org_doc_column() is None:
+        raise HTTPException(status_code=501, detail="organizacoes document column not available")
+    row = await run(Q.organization_by_document, d, cache_ttl=20, timeout_ms=LOOKUP_TIMEOUT_MS)
     if response is not None:
         response.headers["X-Normalized-Doc"] = ",".join(normalize_document_by_type(doc, "PJ"))
     with_cache_headers(response, 20)
-    return row or JSONResponse(status_code=404, content=None)
+    return reply(row, response) if row else JSONResponse(status_code=404, content=None)
 
 @app.get(f"{API_PREFIX}/v1/organizations/{{org_id}}", response_model=Organization | None, dependencies=[Depends(require_bearer)])
-def organization_by_id(org_id: int = Path(...), response: Response = None):
-    with get_pool().connection() as conn:
-        if not table_exists(conn, "organizacoes"):
-            raise HTTPException(status_code=501, detail="organizacoes not available")
-        row = Q.organization_by_id(conn, org_id)
+async def organization_by_id(org_id: int = Path(...), response: Response = None):
+    _require_table("organizacoes")
+    row = await run(Q.organization_by_id, org_id, cache_ttl=60, timeout_ms=LOOKUP_TIMEOUT_MS)
     with_cache_headers(response, 60)
-    return row or JSONResponse(status_code=404, content=None)
+    return reply(row, response) if row else JSONResponse(status_code=404, content=None)
 
 # — Entities (PF/PJ unificado) (NOVO) ———————————————————————————————
 @app.get(
@@ -82,7 +332,7 @@ def organization_by_id(org_id: int = Path(...), response: Response = None):
     response_model=EntitiesByDocResponse,
     dependencies=[Depends(require_bearer)],
 )
-def entities_by_doc(
+async def entities_by_doc(
     doc: str = Query(..., description="CPF/CNPJ (com/sem máscara)"),
     hint: str | None = Query(None, regex="^(PF|PJ)$", description="Opcional: PF ou PJ para priorizar busca"),
     response: Response = None,
@@ -94,47 +344,16 @@ def entities_by_doc(
       - Retorna match explícito + variantes normalizadas
     """
     variants = build_pf_pj_variants(doc)
-    person_row = None
-    org_row = None
-
-    with get_pool().connection() as conn:
-        # pessoas é obrigatório para PF
-        if table_exists(conn, "pessoas"):
-            # tenta PF (todas variantes) — usa igualdade exata via only_digits
-            for v in variants["pf"]:
-                person_row = Q.person_by_document(conn, v)
-                if person_row:
-                    break
-
-        # organizaçoes é opcional (implementação condicional)
-        orgs_available = table_exists(conn, "organizacoes")
-        if orgs_available:
-            for v in variants["pj"]:
-                org_row = Q.organization_by_document(conn, v)
-                if org_row:
-                    break
-
-    # decisão de match
-    match: str = "none"
-    if hint == "PF":
-        if person_row:
-            match = "person"
-        elif org_row:
-            match = "organization"
-    elif hint == "PJ":
-        if org_row:
-            match = "organization"
-        elif person_row:
-            match = "person"
-    else:
-        # sem hint: dá preferência a PF se CPF de 11 dígitos; senão PJ
-        doc_digits = only_digits(doc)
-        if len(doc_digits) <= 11 and person_row:
-            match = "person"
-        elif org_row:
-            match = "organization"
-        elif person_row:
-            match = "person"
+    person_row, org_row = await run(
+        Q.entities_by_document,
+        variants,
+        # pessoas é obrigatório para PF; organizações é opcional (condicional)
+        persons=schema.has_table("pessoas"),
+        orgs=schema.has_table("organizacoes") and Q.org_doc_column() is not None,
+        cache_ttl=20,
+    )
+
+    match = decide_entity_match(doc, hint, person_row, org_row)
 
     if response is not None:
         # devolve variantes por header para debug/observabilidade rápida
@@ -149,125 +368,248 @@ def entities_by_doc(
         organization=org_row,
     )
 
+@app.post(
+    f"{API_PREFIX}/v1/entities/by-doc/batch",
+    response_model=list[EntitiesByDocResponse],
+    dependencies=[Depends(require_bearer)],
+)
+async def entities_by_doc_batch(body: EntitiesByDocBatchRequest):
+    """
+    Versão em lote do /entities/by-doc: todas as variantes PF/PJ são
+    resolvidas com uma consulta set-based por tabela. A resposta segue a
+    ordem de `docs` (mesmo formato e mesmas regras de hint/prioridade).
+    """
+    if len(body.docs) > BATCH_MAX_DOCS:
+        raise HTTPException(status_code=413, detail=f"max {BATCH_MAX_DOCS} docs per batch")
+    variants_list = [build_pf_pj_variants(d) for d in body.docs]
+    pairs = await run(
+        Q.entities_by_documents,
+        variants_list,
+        persons=schema.has_table("pessoas"),
+        orgs=schema.has_table("organizacoes") and Q.org_doc_column() is not None,
+    )
+    return [
+        EntitiesByDocResponse(
+            match=decide_entity_match(doc, body.hint, person_row, org_row),
+            normalized=variants,
+            person=person_row,
+            organization=org_row,
+        )
+        for doc, variants, (person_row, org_row) in zip(body.docs, variants_list, pairs)
+    ]
+
+# — Lote por ids ————————————————————————————————————————————————————
+async def _rows_by_ids(entity: str, body: IdsBatchRequest, response: Response):
+    """
+    Até BATCH_MAX_IDS ids numa consulta (id = ANY); a resposta segue a
+    ordem de `ids`, com null para id inexistente.
+    """
+    if len(body.ids) > BATCH_MAX_IDS:
+        raise HTTPException(status_code=413, detail=f"max {BATCH_MAX_IDS} ids per batch")
+    _require_table(Q.BATCH_ENTITIES[entity])
+    if not body.ids:
+        return []
+    if entity == "users" and refdata.ready("usuarios"):
+        return reply(refdata.users_in_order(body.ids), response)
+    return reply(await run(Q.rows_by_ids, entity, body.ids), response)
+
+@app.post(f"{API_PREFIX}/v1/deals/batch", response_model=list[Deal | None], dependencies=[Depends(require_bearer)])
+async def deals_batch(body: IdsBatchRequest, response: Response):
+    return await _rows_by_ids("deals", body, response)
+
+@app.post(f"{API_PREFIX}/v1/persons/batch", response_model=list[Person | None], dependencies=[Depends(require_bearer)])
+async def persons_batch(body: IdsBatchRequest, response: Response):
+    return await _rows_by_ids("persons", body, response)
+
+@app.post(f"{API_PREFIX}/v1/organizations/batch", response_model=list[Organization | None],
+          dependencies=[Depends(require_bearer)])
+async def organizations_batch(body: IdsBatchRequest, response: Response):
+    return await _rows_by_ids("organizations", body, response)
+
+@app.post(f"{API_PREFIX}/v1/users/batch", response_model=list[User | None], dependencies=[Depends(require_bearer)])
+async def users_batch(body: IdsBatchRequest, response: Response):
+    return await _rows_by_ids("users", body, response)
+
 # — Users ————————————————————————————————————————————————————————
 @app.get(f"{API_PREFIX}/v1/users", response_model=list[User], dependencies=[Depends(require_bearer)])
-def users(active_only: bool = Query(True), limit: int | None = 100, offset: int | None = 0, response: Response = None):
+async def users(active_only: bool = Query(True), limit: int | None = 100, offset: int | None = 0,
+                cursor: str | None = Query(None, description="cursor opaco (header X-Next-Cursor)"),
+                response: Response = None):
     lim, off = pagin_params(limit, offset)
-    with get_pool().connection() as conn:
-        if not table_exists(conn, "usuarios"):
-            raise HTTPException(status_code=501, detail="usuarios not available")
-        rows = Q.users_list(conn, active_only=active_only, limit=lim, offset=off)
+    after = _decode_after(cursor, Q.USERS_ORDER)
+    _require_table("usuarios")
+    rows = None
+    if refdata.ready("usuarios"):
+        rows = refdata.users_list(active_only=active_only, limit=lim, offset=0 if after else off, after=after)
+    if rows is None:
+        rows = await run(Q.users_list, active_only=active_only, limit=lim, offset=0 if after else off, after=after, cache_ttl=20)
+    _set_next_cursor(response, rows, Q.USERS_ORDER, lim, after)
     with_cache_headers(response, 20)
-    return rows
+    return reply(rows, response)
 
 @app.get(f"{API_PREFIX}/v1/users/search", response_model=list[User], dependencies=[Depends(require_bearer)])
-def users_search(q: str = Query(..., description="Nome ou email"),
-                 limit: int | None = 100, offset: int | None = 0, response: Response = None):
+async def users_search(q: str = Query(..., description="Nome ou email"),
+                       limit: int | None = 100, offset: int | None = 0,
+                       cursor: str | None = Query(None, description="cursor opaco (header X-Next-Cursor)"),
+                       sort: str = SORT_QUERY,
+                       response: Response = None):
     lim, off = pagin_params(limit, offset)
     if not q:
         return []
-    with get_pool().connection() as conn:
-        if not table_exists(conn, "usuarios"):
-            raise HTTPException(status_code=501, detail="usuarios not available")
-        rows = Q.users_search(conn, q=q, limit=lim, offset=off)
+    by_relevance = _by_relevance(sort, cursor)
+    after = _decode_after(cursor, Q.USERS_ORDER)
+    _require_table("usuarios")
+    rows = await run(Q.users_search, q=q, limit=lim, offset=0 if after else off, after=after,
+                     by_relevance=by_relevance, cache_ttl=20)
+    if not by_relevance:
+        _set_next_cursor(response, rows, Q.USERS_ORDER, lim, after)
     with_cache_headers(response, 20)
-    return rows
+    return reply(rows, response)
 
 @app.get(f"{API_PREFIX}/v1/users/{{user_id}}", response_model=User | None, dependencies=[Depends(require_bearer)])
-def user_by_id(user_id: int, response: Response = None):
-    with get_pool().connection() as conn:
-        if not table_exists(conn, "usuarios"):
-            raise HTTPException(status_code=501, detail="usuarios not available")
-        row = Q.user_by_id(conn, user_id)
+async def user_by_id(user_id: int, response: Response = None):
+    _require_table("usuarios")
+    if refdata.ready("usuarios"):
+        row = refdata.user_by_id(user_id)
+    else:
+        row = await run(Q.user_by_id, user_id, cache_ttl=60, timeout_ms=LOOKUP_TIMEOUT_MS)
     with_cache_headers(response, 60)
-    return row or JSONResponse(status_code=404, content=None)
+    return reply(row, response) if row else JSONResponse(status_code=404, content=None)
 
 # — Pipelines / Stages ————————————————————————————————————————————
 @app.get(f"{API_PREFIX}/v1/pipelines/base-nova", response_model=list[Pipeline], dependencies=[Depends(require_bearer)])
-def pipelines_base_nova(response: Response):
-    with get_pool().connection() as conn:
-        if not table_exists(conn, "pipelines"):
-            raise HTTPException(status_code=501, detail="pipelines not available")
-        rows = Q.pipelines_like_base_nova(conn)
+async def pipelines_base_nova(response: Response):
+    _require_table("pipelines")
+    if refdata.ready("pipelines"):
+        rows = refdata.pipelines_like_base_nova()
+    else:
+        rows = await run(Q.pipelines_like_base_nova, cache_ttl=60)
     with_cache_headers(response, 60)
-    return rows
+    return reply(rows, response)
 
 @app.get(f"{API_PREFIX}/v1/pipelines", response_model=list[Pipeline], dependencies=[Depends(require_bearer)])
-def pipelines(response: Response):
-    with get_pool().connection() as conn:
-        if not table_exists(conn, "pipelines"):
-            raise HTTPException(status_code=501, detail="pipelines not available")
-        rows = Q.pipelines_list(conn)
+async def pipelines(request: Request, response: Response):
+    _require_table("pipelines")
     with_cache_headers(response, 120)
-    return rows
+    if refdata.ready("pipelines"):
+        # ETag do fingerprint do snapshot: 304 sem montar a lista
+        if (r304 := not_modified(request, response, etag_of("pipelines", refdata.version("pipelines")))):
+            return r304
+        rows = refdata.pipelines_list()
+    else:
+        rows = await run(Q.pipelines_list, cache_ttl=120)
+        if (r304 := not_modified(request, response, rows_etag("pipelines", rows=rows))):
+            return r304
+    return reply(rows, response)
 
 @app.get(f"{API_PREFIX}/v1/pipelines/{{pipeline_id}}", response_model=Pipeline | None, dependencies=[Depends(require_bearer)])
-def pipeline(pipeline_id: int, response: Response):
-    with get_pool().connection() as conn:
-        if not table_exists(conn, "pipelines"):
-            raise HTTPException(status_code=501, detail="pipelines not available")
-        row = Q.pipeline_by_id(conn, pipeline_id)
+async def pipeline(pipeline_id: int, response: Response):
+    _require_table("pipelines")
+    if refdata.ready("pipelines"):
+        row = refdata.pipeline_by_id(pipeline_id)
+    else:
+        row = await run(Q.pipeline_by_id, pipeline_id, cache_ttl=60, timeout_ms=LOOKUP_TIMEOUT_MS)
     with_cache_headers(response, 60)
-    return row or JSONResponse(status_code=404, content=None)
+    return reply(row, response) if row else JSONResponse(status_code=404, content=None)
 
 @app.get(f"{API_PREFIX}/v1/stages", response_model=list[Stage], dependencies=[Depends(require_bearer)])
-def stages(pipeline_id: int, response: Response):
-    with get_pool().connection() as conn:
-        if not table_exists(conn, "etapas_funil"):
-            raise HTTPException(status_code=501, detail="etapas_funil not available")
-        rows = Q.stages_by_pipeline(conn, pipeline_id)
+async def stages(pipeline_id: int, request: Request, response: Response):
+    _require_table("etapas_funil")
     with_cache_headers(response, 60)
-    return rows
+    if refdata.ready("etapas_funil"):
+        if (r304 := not_modified(request, response,
+                                 etag_of("stages", pipeline_id, refdata.version("etapas_funil")))):
+            return r304
+        rows = refdata.stages_by_pipeline(pipeline_id)
+    else:
+        rows = await run(Q.stages_by_pipeline, pipeline_id, cache_ttl=60)
+        if (r304 := not_modified(request, response, rows_etag("stages", pipeline_id, rows=rows))):
+            return r304
+    return reply(rows, response)
 
 # — Deals ————————————————————————————————————————————————————————
-@app.get(f"{API_PREFIX}/v1/deals/{{deal_id}}", response_model=Deal | None, dependencies=[Depends(require_bearer)])
-def deal_by_id(deal_id: int, response: Response = None):
-    with get_pool().connection() as conn:
-        if not table_exists(conn, "negocios"):
-            raise HTTPException(status_code=501, detail="negocios not available")
-        row = Q.deal_by_id(conn, deal_id)
-    with_cache_headers(response, 30)
-    return row or JSONResponse(status_code=404, content=None)
-
-@app.get(f"{API_PREFIX}/v1/deals/base-nova", response_model=list[Deal], dependencies=[Depends(require_bearer)])
-def deals_base_nova(doc: str | None = Query(None, description="CPF/CNPJ normalizado; opcional"),
-                    limit: int | None = 200, offset: int | None = 0,
-                    response: Response = None):
+@app.get(f"{API_PREFIX}/v1/deals/base-nova", response_model=list[DealExpanded], response_model_exclude_unset=True,
+         dependencies=[Depends(require_bearer)])
+async def deals_base_nova(doc: str | None = Query(None, description="CPF/CNPJ normalizado; opcional"),
+                          doc_exact: bool = Query(False, description="doc completo via doc_index (só deals já indexados)"),
+                          limit: int | None = 200, offset: int | None = 0,
+                          cursor: str | None = Query(None, description="cursor opaco (header X-Next-Cursor)"),
+                          include: str | None = INCLUDE_QUERY,
+                          response: Response = None):
     lim, off = pagin_params(limit, offset, default=200, max_limit=500)
+    inc = _parse_include(include)
+    after = _decode_after(cursor, Q.DEALS_ORDER)
     d = only_digits(doc) if doc else None
-    with get_pool().connection() as conn:
-        rows = Q.deals_base_nova(conn, doc=d, limit=lim, offset=off)
+    rows = await run(Q.deals_base_nova, doc=d, doc_exact=doc_exact, limit=lim, offset=0 if after else off, after=after,
+                     pipeline_ids=refdata.base_nova_ids(), cache_ttl=10, max_lag=FRESH_MAX_LAG)
+    _set_next_cursor(response, rows, Q.DEALS_ORDER, lim, after)
     with_cache_headers(response, 10)
-    return rows
+    return reply(await _with_related(rows, inc), response)
 
-@app.get(f"{API_PREFIX}/v1/deals/by-entity", response_model=list[Deal], dependencies=[Depends(require_bearer)])
-def deals_by_entity(person_id: int | None = None, org_id: int | None = None,
-                    limit: int | None = 200, offset: int | None = 0,
-                    response: Response = None):
+@app.get(f"{API_PREFIX}/v1/deals/by-entity", response_model=list[DealExpanded], response_model_exclude_unset=True,
+         dependencies=[Depends(require_bearer)])
+async def deals_by_entity(person_id: int | None = None, org_id: int | None = None,
+                          limit: int | None = 200, offset: int | None = 0,
+                          cursor: str | None = Query(None, description="cursor opaco (header X-Next-Cursor)"),
+                          include: str | None = INCLUDE_QUERY,
+                          request: Request = None,
+                          response: Response = None):
     if person_id is None and org_id is None:
         raise HTTPException(status_code=400, detail="person_id or org_id is required")
     lim, off = pagin_params(limit, offset, default=200, max_limit=500)
-    with get_pool().connection() as conn:
-        if not table_exists(conn, "negocios"):
-            raise HTTPException(status_code=501, detail="negocios not available")
-        rows = Q.deals_by_entity(conn, person_id=person_id, org_id=org_id, limit=lim, offset=off)
+    inc = _parse_include(include)
+    after = _decode_after(cursor, Q.DEALS_ORDER)
+    _require_table("negocios")
+    rows = await run(Q.deals_by_entity, person_id=person_id, org_id=org_id, limit=lim, offset=0 if after else off,
+                     after=after, cache_ttl=10, max_lag=FRESH_MAX_LAG)
+    _set_next_cursor(response, rows, Q.DEALS_ORDER, lim, after)
     with_cache_headers(response, 10)
-    return rows
+    rows = await _with_related(rows, inc)
+    # ids + update_time da página (e dos relacionados): 304 sem validar/serializar
+    if (r304 := not_modified(request, response, rows_etag("deals_by_entity", inc, rows=rows))):
+        return r304
+    return reply(rows, response)
+
+# depois das rotas fixas (base-nova, by-entity): senão "{deal_id}" as captura (422)
+@app.get(f"{API_PREFIX}/v1/deals/{{deal_id}}", response_model=DealExpanded | None, response_model_exclude_unset=True,
+         dependencies=[Depends(require_bearer)])
+async def deal_by_id(deal_id: int, include: str | None = INCLUDE_QUERY, request: Request = None,
+                     response: Response = None):
+    inc = _parse_include(include)
+    _require_table("negocios")
+    row = await run(Q.deal_by_id, deal_id, cache_ttl=30, timeout_ms=LOOKUP_TIMEOUT_MS)
+    with_cache_headers(response, 30)
+    if not row:
+        return JSONResponse(status_code=404, content=None)
+    row = (await _with_related([row], inc))[0]
+    if (r304 := not_modified(request, response, rows_etag("deal", inc, rows=row))):
+        return r304
+    return reply(row, response)
 
-@app.get(f"{API_PREFIX}/v1/search/deals", response_model=list[Deal], dependencies=[Depends(require_bearer)])
-def search_deals(q: str, limit: int | None = 100, offset: int | None = 0, response: Response = None):
+@app.get(f"{API_PREFIX}/v1/search/deals", response_model=list[DealExpanded], response_model_exclude_unset=True,
+         dependencies=[Depends(require_bearer)])
+async def search_deals(q: str, limit: int | None = 100, offset: int | None = 0,
+                       cursor: str | None = Query(None, description="cursor opaco (header X-Next-Cursor)"),
+                       sort: str = SORT_QUERY,
+                       include: str | None = INCLUDE_QUERY,
+                       response: Response = None):
     if not q:
         return []
     lim, off = pagin_params(limit, offset)
-    with get_pool().connection() as conn:
-        if not table_exists(conn, "negocios"):
-            raise HTTPException(status_code=501, detail="negocios not available")
-        rows = Q.search_deals_by_title(conn, q=q, limit=lim, offset=off)
+    inc = _parse_include(include)
+    by_relevance = _by_relevance(sort, cursor)
+    after = _decode_after(cursor, Q.DEALS_ORDER)
+    _require_table("negocios")
+    rows = await run(Q.search_deals_by_title, q=q, limit=lim, offset=0 if after else off, after=after,
+                     by_relevance=by_relevance, cache_ttl=10, timeout_ms=SEARCH_TIMEOUT_MS)
+    if not by_relevance:
+        _set_next_cursor(response, rows, Q.DEALS_ORDER, lim, after)
     with_cache_headers(response, 10)
-    return rows
+    return reply(await _with_related(rows, inc), response)
 
-@app.get(f"{API_PREFIX}/v1/search/deals/advanced", response_model=list[Deal], dependencies=[Depends(require_bearer)])
-def search_deals_advanced(
+@app.get(f"{API_PREFIX}/v1/search/deals/advanced", response_model=list[DealExpanded], response_model_exclude_unset=True,
+         dependencies=[Depends(require_bearer)])
+async def search_deals_advanced(
     pipeline_id: int | None = None,
     stage_id: int | None = None,
     status: str | None = Query(None, regex="^(open|won|lost)$"),
@@ -279,33 +621,216 @@ def search_deals_advanced(
     added_from: str | None = Query(None, description="YYYY-MM-DD ou YYYY-MM-DDTHH:MM:SS"),
     added_to: str | None = Query(None, description="YYYY-MM-DD ou YYYY-MM-DDTHH:MM:SS"),
     doc_like: str | None = Query(None, description="dígitos a procurar no título (CPF/CNPJ)"),
+    doc_exact: bool = Query(False, description="doc_like é CPF/CNPJ completo: igualdade via doc_index (só deals já indexados)"),
     q: str | None = Query(None, description="texto livre no título"),
     order_by: str | None = Query(None, description="update_time|add_time|id|value (opcional ' desc')"),
     limit: int | None = 100,
     offset: int | None = 0,
+    cursor: str | None = Query(None, description="cursor opaco (header X-Next-Cursor)"),
+    include: str | None = INCLUDE_QUERY,
     response: Response = None
 ):
     lim, off = pagin_params(limit, offset)
-    with get_pool().connection() as conn:
-        if not table_exists(conn, "negocios"):
-            raise HTTPException(status_code=501, detail="negocios not available")
-        rows = Q.search_deals_advanced(
-            conn,
-            pipeline_id=pipeline_id,
-            stage_id=stage_id,
-            status=status,
-            owner_id=owner_id,
-            person_id=person_id,
-            org_id=org_id,
-            updated_from=updated_from,
-            updated_to=updated_to,
-            added_from=added_from,
-            added_to=added_to,
-            doc_like=doc_like,
-            q=q,
-            order_by=order_by,
-            limit=lim,
-            offset=off,
-        )
+    inc = _parse_include(include)
+    key = Q.deals_order_key(order_by)
+    after = _decode_after(cursor, key)
+    _require_table("negocios")
+    rows = await run(
+        Q.search_deals_advanced,
+        pipeline_id=pipeline_id,
+        stage_id=stage_id,
+        status=status,
+        owner_id=owner_id,
+        person_id=person_id,
+        org_id=org_id,
+        updated_from=updated_from,
+        updated_to=updated_to,
+        added_from=added_from,
+        added_to=added_to,
+        doc_like=doc_like,
+        doc_exact=doc_exact,
+        q=q,
+        order_by=order_by,
+        limit=lim,
+        offset=0 if after else off,
+        after=after,
+        cache_ttl=15,
+        timeout_ms=SEARCH_TIMEOUT_MS,
+    )
+    _set_next_cursor(response, rows, key, lim, after)
     with_cache_headers(response, 15)
-    return rows
+    return reply(await _with_related(rows, inc), response)
+
+# — Agregados ————————————————————————————————————————————————————
+def _parse_group_by(group_by: str | None) -> tuple[str, ...]:
+    if not group_by:
+        return ()
+    asked = {p.strip().lower() for p in group_by.split(",") if p.strip()}
+    unknown = asked - set(Q.DEAL_STATS_GROUPS)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"group_by inválido: {', '.join(sorted(unknown))}")
+    # ordem canônica: mesma entrada de cache para qualquer ordem pedida
+    return tuple(g for g in Q.DEAL_STATS_GROUPS if g in asked)
+
+@app.get(f"{API_PREFIX}/v1/stats/deals", response_model=list[DealStats], response_model_exclude_unset=True,
+         dependencies=[Depends(require_bearer)])
+async def deal_stats(
+    group_by: str | None = Query(None, description="pipeline_id,stage_id,status,user_id,currency (combináveis)"),
+    bucket: str | None = Query(None, regex="^(day|week|month|quarter|year)$",
+                               description="agrupa também por período de bucket_field"),
+    bucket_field: str = Query("update_time", regex="^(update_time|add_time)$"),
+    pipeline_id: int | None = None,
+    stage_id: int | None = None,
+    status: str | None = Query(None, regex="^(open|won|lost)$"),
+    owner_id: int | None = None,
+    person_id: int | None = None,
+    org_id: int | None = None,
+    updated_from: str | None = Query(None, description="YYYY-MM-DD ou YYYY-MM-DDTHH:MM:SS"),
+    updated_to: str | None = Query(None, description="YYYY-MM-DD ou YYYY-MM-DDTHH:MM:SS"),
+    added_from: str | None = Query(None, description="YYYY-MM-DD ou YYYY-MM-DDTHH:MM:SS"),
+    added_to: str | None = Query(None, description="YYYY-MM-DD ou YYYY-MM-DDTHH:MM:SS"),
+    doc_like: str | None = Query(None, description="dígitos a procurar no título (CPF/CNPJ)"),
+    doc_exact: bool = Query(False, description="doc_like é CPF/CNPJ completo: igualdade via doc_index (só deals já indexados)"),
+    q: str | None = Query(None, description="texto livre no título"),
+    limit: int = Query(1000, ge=1, le=STATS_MAX_GROUPS, description="máximo de grupos"),
+    response: Response = None
+):
+    """
+    Contagem e soma/média de value dos deals com os filtros do
+    search/deals/advanced, agregados no Postgres por group_by e/ou período.
+    Mais grupos que `limit`: a lista vem cortada e X-Truncated: true.
+    """
+    _require_table("negocios")
+    rows = await run(
+        Q.deal_stats,
+        group_by=_parse_group_by(group_by),
+        bucket=bucket,
+        bucket_field=bucket_field,
+        pipeline_id=pipeline_id,
+        stage_id=stage_id,
+        status=status,
+        owner_id=owner_id,
+        person_id=person_id,
+        org_id=org_id,
+        updated_from=updated_from,
+        updated_to=updated_to,
+        added_from=added_from,
+        added_to=added_to,
+        doc_like=doc_like,
+        doc_exact=doc_exact,
+        q=q,
+        limit=limit + 1,
+        cache_ttl=STATS_CACHE_TTL,
+        timeout_ms=SEARCH_TIMEOUT_MS,
+    )
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers["X-Truncated"] = "true"
+    with_cache_headers(response, STATS_CACHE_TTL)
+    return reply(rows, response)
+
+# — Export ————————————————————————————————————————————————————————
+@app.get(f"{API_PREFIX}/v1/export/deals", dependencies=[Depends(require_bearer)])
+async def export_deals(
+    format: str = Query("ndjson", regex="^(ndjson|csv)$"),
+    itersize: int = Query(EXPORT_ITERSIZE, ge=100, le=50000, description="linhas por FETCH do cursor no servidor"),
+    pipeline_id: int | None = None,
+    stage_id: int | None = None,
+    status: str | None = Query(None, regex="^(open|won|lost)$"),
+    owner_id: int | None = None,
+    person_id: int | None = None,
+    org_id: int | None = None,
+    updated_from: str | None = Query(None, description="YYYY-MM-DD ou YYYY-MM-DDTHH:MM:SS"),
+    updated_to: str | None = Query(None, description="YYYY-MM-DD ou YYYY-MM-DDTHH:MM:SS"),
+    added_from: str | None = Query(None, description="YYYY-MM-DD ou YYYY-MM-DDTHH:MM:SS"),
+    added_to: str | None = Query(None, description="YYYY-MM-DD ou YYYY-MM-DDTHH:MM:SS"),
+    doc_like: str | None = Query(None, description="dígitos a procurar no título (CPF/CNPJ)"),
+    doc_exact: bool = Query(False, description="doc_like é CPF/CNPJ completo: igualdade via doc_index (só deals já indexados)"),
+    q: str | None = Query(None, description="texto livre no título"),
+    order_by: str | None = Query(None, description="update_time|add_time|id|value (opcional ' desc')"),
+):
+    """
+    Exporta todos os deals dos mesmos filtros do search/deals/advanced em
+    NDJSON ou CSV, direto de um cursor no servidor (sem paginação). O
+    primeiro lote sai antes dos headers: pool cheio ou timeout dão 503.
+    """
+    _require_table("negocios")
+    rows = await stream(
+        Q.iter_deals_export,
+        itersize=itersize,
+        timeout_ms=EXPORT_TIMEOUT_MS,
+        pipeline_id=pipeline_id,
+        stage_id=stage_id,
+        status=status,
+        owner_id=owner_id,
+        person_id=person_id,
+        org_id=org_id,
+        updated_from=updated_from,
+        updated_to=updated_to,
+        added_from=added_from,
+        added_to=added_to,
+        doc_like=doc_like,
+        doc_exact=doc_exact,
+        q=q,
+        order_by=order_by,
+    )
+    headers = {}
+    if format == "csv":
+        headers["Content-Disposition"] = 'attachment; filename="deals.csv"'
+    return StreamingResponse(
+        encode_stream(rows, format, Q.DEAL_EXPORT_COLUMNS),
+        media_type=MEDIA_TYPES[format],
+        headers=headers,
+        # devolve a conexão mesmo se o cliente desconectar no meio
+        background=BackgroundTask(rows.close),
+    )
+
+# — Feed de alterações ————————————————————————————————————————————
+SINCE_QUERY = Query(..., description="watermark do X-Next-Since anterior ou data inicial YYYY-MM-DD[THH:MM:SS]")
+
+def _decode_since(since: str) -> tuple[datetime, int]:
+    """
+    Watermark opaco (update_time, id) devolvido pelo feed ou, na primeira
+    sincronização, uma data/hora ISO (tudo a partir dela).
+    """
+    invalid = HTTPException(status_code=400, detail="since inválido: use o X-Next-Since ou YYYY-MM-DD[THH:MM:SS]")
+    try:
+        value, last_id = decode_cursor(since, Q.CHANGES_TOKEN)
+    except ValueError:
+        value, last_id = since, 0
+    try:
+        return datetime.fromisoformat(value), last_id or 0
+    except (TypeError, ValueError):
+        raise invalid
+
+async def _changes(entity: str, since: str, limit: int, response: Response):
+    """
+    Linhas alteradas depois do watermark, em ordem de (update_time, id), e o
+    próximo watermark em X-Next-Since (igual ao recebido se nada mudou).
+    Menos de `limit` linhas: o consumidor está em dia; se a página terminou
+    nos últimos CHANGES_OVERLAP_SECONDS, o watermark volta ao início dessa
+    janela e a chamada seguinte a relê (linhas repetidas: dedupe por id).
+    """
+    _require_table(Q.CHANGES_ENTITIES[entity])
+    ts, since_id = _decode_since(since)
+    settled = datetime.now(timezone.utc) - timedelta(seconds=CHANGES_OVERLAP_SECONDS)
+    rows = await run(Q.changes_since, entity, since=ts.isoformat(), since_id=since_id, limit=limit,
+                     max_lag=FRESH_MAX_LAG)
+    response.headers["X-Next-Since"] = encode_cursor(
+        Q.CHANGES_TOKEN, Q.next_watermark(rows, ts, since_id, limit, settled))
+    return reply(rows, response)
+
+CHANGES_LIMIT = Query(1000, ge=1, le=CHANGES_MAX_LIMIT)
+
+@app.get(f"{API_PREFIX}/v1/changes/deals", response_model=list[Deal], dependencies=[Depends(require_bearer)])
+async def changes_deals(since: str = SINCE_QUERY, limit: int = CHANGES_LIMIT, response: Response = None):
+    return await _changes("deals", since, limit, response)
+
+@app.get(f"{API_PREFIX}/v1/changes/persons", response_model=list[Person], dependencies=[Depends(require_bearer)])
+async def changes_persons(since: str = SINCE_QUERY, limit: int = CHANGES_LIMIT, response: Response = None):
+    return await _changes("persons", since, limit, response)
+
+@app.get(f"{API_PREFIX}/v1/changes/organizations", response_model=list[Organization],
+         dependencies=[Depends(require_bearer)])
+async def changes_organizations(since: str = SINCE_QUERY, limit: int = CHANGES_LIMIT, response: Response = None):
+    return await _changes("organizations", since, limit, response)
@@ -0,0 +1,155 @@
+import bisect
+import os
+import threading
+import time
+from typing import Callable, Iterable
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1").lower() in ("1", "true", "yes")
+
+# limites em segundos (mesma escala para HTTP, DB e espera do pool)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _labels(names: tuple[str, ...], values: tuple) -> str:
+    if not names:
+        return ""
+    inner = ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values))
+    return "{" + inner + "}"
+
+def _escape(v) -> str:
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+class Histogram:
+    """
+    Histograma no formato de exposição do Prometheus. observe() só faz
+    bisect + somas sob um lock sem disputa (threads do pool sync).
+    """
+
+    def __init__(self, name: str, doc: str, labelnames: tuple[str, ...] = (),
+                 buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.doc = doc
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self._series: dict[tuple, list] = {}  # labels -> [contagens por bucket..., +Inf, soma]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels) -> None:
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            s = self._series.get(labels)
+            if s is None:
+                s = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            s[i] += 1
+            s[-1] += value
+
+    def expose(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.doc}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            series = [(k, list(v)) for k, v in self._series.items()]
+        for labels, s in series:
+            base = _labels(self.labelnames, labels)
+            cumulative = 0
+            for le, n in zip(self.buckets + (float("inf"),), s[:-1]):
+                cumulative += n
+                le_s = "+Inf" if le == float("inf") else repr(le)
+                lbl = base[:-1] + f',le="{le_s}"}}' if base else f'{{le="{le_s}"}}'
+                yield f"{self.name}_bucket{lbl} {cumulative}"
+            yield f"{self.name}_sum{base} {s[-1]}"
+            yield f"{self.name}_count{base} {cumulative}"
+
+class Counter:
+    def __init__(self, name: str, doc: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.doc = doc
+        self.labelnames = labelnames
+        self._series: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, *labels) -> None:
+        with self._lock:
+            self._series[labels] = self._series.get(labels, 0) + amount
+
+    def expose(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.doc}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            series = list(self._series.items())
+        for labels, v in series:
+            yield f"{self.name}{_labels(self.labelnames, labels)} {v}"
+
+http_latency = Histogram("http_request_duration_seconds", "Latência dos requests por rota.",
+                         ("route", "method", "status"))
+db_latency = Histogram("db_query_duration_seconds", "Tempo no banco por função de queries.py.", ("query",))
+pool_wait = Histogram("db_pool_wait_seconds", "Espera para obter conexão do pool.", ("node",))
+serialization = Histogram("serialization_duration_seconds", "Tempo de serialização JSON das respostas.",
+                          ("mode",))
+db_rows = Counter("db_rows_returned_total", "Linhas devolvidas por função de queries.py.", ("query",))
+
+METRICS = (http_latency, db_latency, pool_wait, serialization, db_rows)
+
+def count_rows(result) -> int:
+    if result is None:
+        return 0
+    if isinstance(result, list):
+        return len(result)
+    if isinstance(result, tuple):
+        return sum(count_rows(r) for r in result)
+    if isinstance(result, dict):
+        # linha única ou mapa de resultados (ex.: relation -> {id: linha}); mapa vazio = 0
+        if not result:
+            return 0
+        is_map = (not all(isinstance(k, str) for k in result)
+                  or all(isinstance(v, (dict, list)) for v in result.values()))
+        return sum(count_rows(v) for v in result.values()) if is_map else 1
+    return 1
+
+def gauges(name: str, doc: str, values: dict, labelname: str | None = None, kind: str = "gauge") -> Iterable[str]:
+    """
+    Série calculada na hora da coleta (stats dos caches/pools); `values` é
+    {label: valor} ou {None: valor} sem label.
+    """
+    yield f"# HELP {name} {doc}"
+    yield f"# TYPE {name} {kind}"
+    for label, v in values.items():
+        if v is None:
+            continue
+        lbl = f'{{{labelname}="{_escape(label)}"}}' if labelname else ""
+        yield f"{name}{lbl} {float(v)}"
+
+def render(*collectors: Callable[[], Iterable[str]]) -> str:
+    lines: list[str] = []
+    for m in METRICS:
+        lines.extend(m.expose())
+    for collect in collectors:
+        lines.extend(collect())
+    return "\n".join(lines) + "\n"
+
+class MetricsMiddleware:
+    """
+    Middleware ASGI puro (sem BaseHTTPMiddleware): mede do recebimento ao
+    último byte e rotula pelo template da rota (`/v1/persons/{person_id}`).
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        t0 = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            http_latency.observe(time.perf_counter() - t0, path, scope["method"], status)
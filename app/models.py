@@ -41,6 +41,18 @@ class Deal(BaseModel):
     add_time: datetime | None = None
     user_id: Optional[int] = None
 
+class DealStats(BaseModel):
+    # dimensões só presentes quando pedidas em group_by/bucket (a rota omite as demais)
+    bucket: datetime | None = None
+    pipeline_id: Optional[int] = None
+    stage_id: Optional[int] = None
+    status: Optional[str] = None
+    user_id: Optional[int] = None
+    currency: Optional[str] = None
+    count: int
+    value_sum: Optional[float] = None
+    value_avg: Optional[float] = None
+
 class Pipeline(BaseModel):
     id: int
     name: str
@@ -52,8 +64,22 @@ class Stage(BaseModel):
     pipeline_id: int
     order_nr: int
 
+class DealExpanded(Deal):
+    # preenchidos só quando pedidos em include= (a rota omite os não pedidos)
+    person: Optional[Person] = None
+    organization: Optional[Organization] = None
+    stage: Optional[Stage] = None
+    owner: Optional[User] = None
+
 class EntitiesByDocResponse(BaseModel):
     match: Literal["person", "organization", "none"]
     normalized: Dict[str, List[str]]  # {"pf": [...], "pj": [...]}
     person: Optional[Person] = None
     organization: Optional[Organization] = None
+
+class IdsBatchRequest(BaseModel):
+    ids: List[int]
+
+class EntitiesByDocBatchRequest(BaseModel):
+    docs: List[str]
+    hint: Optional[Literal["PF", "PJ"]] = None
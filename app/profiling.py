@@ -0,0 +1,186 @@
+import hashlib
+import os
+import queue
+import random
+import re
+import threading
+import time
+from collections import deque
+import psycopg
+from psycopg import sql
+
+# consultas acima deste tempo (ms) vão para o buffer; 0 desliga
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "500"))
+# fração das lentas que ganham EXPLAIN (ANALYZE, BUFFERS) em background
+SLOW_QUERY_EXPLAIN_SAMPLE = float(os.getenv("SLOW_QUERY_EXPLAIN_SAMPLE", "0.1"))
+SLOW_QUERY_BUFFER = int(os.getenv("SLOW_QUERY_BUFFER", "200"))
+# o EXPLAIN ANALYZE executa a consulta de novo: limite próprio (ms)
+SLOW_QUERY_EXPLAIN_TIMEOUT_MS = int(os.getenv("SLOW_QUERY_EXPLAIN_TIMEOUT_MS", "30000"))
+# tamanho máximo do repr dos parâmetros guardado (listas de docs do batch são longas)
+PARAMS_MAX_CHARS = 500
+
+PROFILING_ENABLED = SLOW_QUERY_MS > 0
+
+_WS = re.compile(r"\s+")
+# sequências de dígitos que podem ser CPF/CNPJ (inteiros ou trechos) nos parâmetros guardados
+_DOC_DIGITS = re.compile(r"\d{5,}")
+
+# — Buffer circular + agregados por forma do SQL —————————————————————————
+_recent: deque = deque(maxlen=SLOW_QUERY_BUFFER)
+_shapes: dict[str, dict] = {}
+_lock = threading.Lock()
+_explain_queue: queue.Queue = queue.Queue(maxsize=32)
+
+def _shape(query) -> str:
+    if isinstance(query, bytes):
+        query = query.decode()
+    elif not isinstance(query, str):
+        query = repr(query)  # sql.Composed: sem conexão não dá para renderizar
+    # o SQL já é parametrizado: a forma é o texto com espaços normalizados
+    return _WS.sub(" ", query).strip()
+
+def _redact(params):
+    # só o que fica no buffer/admin; o EXPLAIN usa os parâmetros originais
+    if isinstance(params, str):
+        return _DOC_DIGITS.sub(lambda m: "*" * len(m.group()), params)
+    if isinstance(params, dict):
+        return {k: _redact(v) for k, v in params.items()}
+    if isinstance(params, (list, tuple)):
+        return type(params)(_redact(v) for v in params)
+    return params
+
+def _record(query, params, ms: float, dsn: str | None = None, pipeline: bool = False) -> None:
+    text = _shape(query)
+    shape_id = hashlib.md5(text.encode()).hexdigest()[:12]
+    entry = {
+        "at": time.time(),
+        "ms": round(ms, 3),
+        "shape_id": shape_id,
+        "sql": text,
+        "params": repr(_redact(params))[:PARAMS_MAX_CHARS] if params is not None else None,
+        "pipeline": pipeline,
+    }
+    with _lock:
+        _recent.append(entry)
+        agg = _shapes.get(shape_id)
+        if agg is None:
+            if len(_shapes) >= SLOW_QUERY_BUFFER:
+                # mantém as formas mais custosas
+                del _shapes[min(_shapes, key=lambda k: _shapes[k]["total_ms"])]
+            agg = _shapes[shape_id] = {"shape_id": shape_id, "sql": text, "count": 0, "total_ms": 0.0,
+                                       "max_ms": 0.0, "plan": None}
+        agg["count"] += 1
+        agg["total_ms"] += ms
+        agg["max_ms"] = max(agg["max_ms"], ms)
+    explainable = text.split(" ", 1)[0].upper() in ("SELECT", "WITH")
+    if explainable and random.random() < SLOW_QUERY_EXPLAIN_SAMPLE:
+        try:
+            _explain_queue.put_nowait((dsn, entry, query, params))
+        except queue.Full:
+            pass
+
+def _node_dsn(conn) -> str | None:
+    # gravado pelo configure do pool: o EXPLAIN roda no mesmo nó (réplica ou primário)
+    return getattr(conn, "_node_dsn", None)
+
+class ProfilingCursor(psycopg.Cursor):
+    """
+    cursor_factory das conexões do pool: mede cada execute e registra as
+    que passam de SLOW_QUERY_MS.
+    """
+
+    def execute(self, query, params=None, **kwargs):
+        t0 = time.perf_counter()
+        try:
+            return super().execute(query, params, **kwargs)
+        finally:
+            ms = (time.perf_counter() - t0) * 1000.0
+            if ms >= SLOW_QUERY_MS:
+                _record(query, params, ms, _node_dsn(self.connection))
+
+class AsyncProfilingCursor(psycopg.AsyncCursor):
+    async def execute(self, query, params=None, **kwargs):
+        t0 = time.perf_counter()
+        try:
+            return await super().execute(query, params, **kwargs)
+        finally:
+            ms = (time.perf_counter() - t0) * 1000.0
+            if ms >= SLOW_QUERY_MS:
+                _record(query, params, ms, _node_dsn(self.connection))
+
+def record_pipeline(conn, statements: list[tuple], ms: float) -> None:
+    """
+    Em pipeline mode o execute de cada cursor só enfileira (o cursor não mede
+    nada): o tempo é o do lote inteiro, do primeiro envio ao último resultado,
+    e cada statement do lote lento entra com ele.
+    """
+    if not PROFILING_ENABLED or ms < SLOW_QUERY_MS:
+        return
+    for query, params in statements:
+        _record(query, params, ms, _node_dsn(conn), pipeline=True)
+
+def snapshot(limit: int = 50) -> dict:
+    with _lock:
+        recent = list(_recent)[-limit:][::-1]
+        shapes = sorted(_shapes.values(), key=lambda a: a["total_ms"], reverse=True)[:limit]
+        shapes = [{**a, "total_ms": round(a["total_ms"], 3), "max_ms": round(a["max_ms"], 3)} for a in shapes]
+    return {
+        "enabled": PROFILING_ENABLED,
+        "threshold_ms": SLOW_QUERY_MS,
+        "explain_sample": SLOW_QUERY_EXPLAIN_SAMPLE,
+        "shapes": shapes,
+        "recent": recent,
+    }
+
+def reset() -> None:
+    with _lock:
+        _recent.clear()
+        _shapes.clear()
+
+# — EXPLAIN em background ——————————————————————————————————————————
+EXPLAIN_PREFIX = "EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) "
+
+def _explain(conn: psycopg.Connection, entry: dict, query, params) -> None:
+    if isinstance(query, sql.Composable):
+        stmt = sql.SQL(EXPLAIN_PREFIX) + query
+    else:
+        stmt = EXPLAIN_PREFIX + (query.decode() if isinstance(query, bytes) else query)
+    try:
+        # BEGIN/ROLLBACK: o EXPLAIN ANALYZE executa a consulta de fato
+        with conn.transaction(force_rollback=True):
+            plan = conn.execute(stmt, params).fetchone()["QUERY PLAN"]
+    except psycopg.Error as e:
+        plan = {"error": str(e).strip()}
+    entry["plan"] = plan
+    with _lock:
+        agg = _shapes.get(entry["shape_id"])
+        if agg is not None:
+            agg["plan"] = plan
+
+def _loop(default_dsn: str, connect_kwargs: dict) -> None:
+    options = f"-c statement_timeout={SLOW_QUERY_EXPLAIN_TIMEOUT_MS}"
+    # uma conexão por nó, aberta na primeira lenta vinda dele
+    conns: dict[str, psycopg.Connection] = {}
+    while True:
+        dsn, entry, query, params = _explain_queue.get()
+        dsn = dsn or default_dsn
+        try:
+            conn = conns.get(dsn)
+            if conn is None or conn.closed:
+                conn = conns[dsn] = psycopg.connect(dsn, autocommit=True, options=options, **connect_kwargs)
+            _explain(conn, entry, query, params)
+        except Exception:
+            # nó fora do ar: descarta o item; a conexão é refeita na próxima
+            conn = conns.pop(dsn, None)
+            if conn is not None:
+                conn.close()
+            time.sleep(5)
+
+def start_explainer(dsn: str, connect_kwargs: dict | None = None) -> threading.Thread | None:
+    if not PROFILING_ENABLED or SLOW_QUERY_EXPLAIN_SAMPLE <= 0:
+        return None
+    t = threading.Thread(
+        target=_loop, args=(dsn, connect_kwargs or {}), name="slow-query-explainer", daemon=True
+    )
+    t.start()
+    return t
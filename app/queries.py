@@ -1,5 +1,9 @@
-from typing import Any, Iterable
+import os
+import time
+from datetime import datetime, timezone
+from typing import Any, Iterable, Iterator, NamedTuple
 import psycopg
+from . import profiling, schema
 from .utils import only_digits
 
 # — Helpers ————————————————————————————————————————————————————————
@@ -16,6 +20,173 @@ def _apply_order_sql(order_by: str | None, allowed: Iterable[str], default_expr:
         return default_expr
     return f"{col} {direction or ''}".strip()
 
+def _like_pattern(s: str) -> str:
+    # "contém s" para LIKE/ILIKE, com os curingas do próprio texto escapados
+    return "%" + s.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+# — Busca textual (pg_trgm) ————————————————————————————————————————
+def _search_cond(q: str, text_cols: tuple[str, ...], digits_expr: str | None = None) -> tuple[str, dict]:
+    """
+    `col ILIKE '%q%'` nas colunas de texto e, se `q` tiver dígitos,
+    `digits_expr LIKE '%dígitos%'`. São as mesmas expressões dos índices
+    GIN (gin_trgm_ops) do bootstrap, então a busca não varre a tabela.
+    """
+    cond = [f"{c} ILIKE %(needle)s" for c in text_cols]
+    params = {"needle": _like_pattern(q)}
+    digits = only_digits(q)
+    if digits_expr and digits:
+        cond.append(f"{digits_expr} LIKE %(digits)s")
+        params["digits"] = _like_pattern(digits)
+    return " OR ".join(cond), params
+
+def _relevance_order(q: str, text_cols: tuple[str, ...], params: dict) -> str:
+    """
+    ORDER BY por relevância (word_similarity do pg_trgm); só com offset.
+    """
+    params["rank_q"] = q
+    ranks = [f"word_similarity(%(rank_q)s, {c})" for c in text_cols]
+    rank = ranks[0] if len(ranks) == 1 else f"greatest({', '.join(ranks)})"
+    return f"{rank} DESC NULLS LAST, id DESC"
+
+# — Keyset (cursor) ————————————————————————————————————————————————
+class OrderKey(NamedTuple):
+    """
+    Chave de ordenação de uma listagem; `id` sempre desempata no mesmo sentido.
+    """
+    col: str
+    desc: bool
+    nulls_first: bool
+
+    @property
+    def sql(self) -> str:
+        direction = "DESC" if self.desc else "ASC"
+        if self.col == "id":
+            return f"id {direction}"
+        nulls = "FIRST" if self.nulls_first else "LAST"
+        return f"{self.col} {direction} NULLS {nulls}, id {direction}"
+
+    @property
+    def token(self) -> str:
+        return f"{self.col}:{'desc' if self.desc else 'asc'}:{'nf' if self.nulls_first else 'nl'}"
+
+def _order_key(order_sql: str) -> OrderKey:
+    # interpreta a saída de _apply_order_sql (1º termo); default do PG:
+    # DESC => NULLS FIRST, ASC => NULLS LAST
+    parts = order_sql.split(",")[0].lower().split()
+    desc = "desc" in parts
+    nulls_first = desc
+    if "nulls" in parts:
+        nulls_first = parts[parts.index("nulls") + 1] == "first"
+    return OrderKey(parts[0], desc, nulls_first)
+
+def _keyset_cond(key: OrderKey, after: tuple[Any, int | None]) -> tuple[str, dict]:
+    """
+    Predicado "depois de (valor, id)" na ordem da chave. Sem OR com IS NULL
+    para o índice (col, id) continuar buscável: linhas com chave NULL formam
+    uma seção à parte, e (None, None) marca o início da 2ª seção.
+    """
+    last_val, last_id = after
+    op = "<" if key.desc else ">"
+    col = key.col
+    if col == "id":
+        return f"id {op} %(k_id)s", {"k_id": last_id}
+    if last_id is None:
+        return (f"{col} IS NOT NULL" if key.nulls_first else f"{col} IS NULL"), {}
+    if last_val is None:
+        return f"{col} IS NULL AND id {op} %(k_id)s", {"k_id": last_id}
+    return (
+        f"{col} {op}= %(k_val)s AND ({col} {op} %(k_val)s OR id {op} %(k_id)s)",
+        {"k_val": last_val, "k_id": last_id},
+    )
+
+def _where(cond: list[str], params: dict, key: OrderKey, after: tuple[Any, int] | None) -> str:
+    if after is not None:
+        frag, kp = _keyset_cond(key, after)
+        cond = [*cond, frag]
+        params.update(kp)
+    return " AND ".join(f"({c})" for c in cond) if cond else "TRUE"
+
+def cursor_after(rows: list[dict], key: OrderKey, limit: int,
+                 after: tuple[Any, int | None] | None = None) -> tuple[Any, int | None] | None:
+    """
+    Próximo cursor: (valor, id) da última linha quando a página veio cheia.
+    Página curta ainda na 1ª seção (não nulos em NULLS LAST, nulos em
+    NULLS FIRST) segue para a 2ª; caso contrário é o fim da listagem.
+    """
+    if rows and len(rows) >= limit:
+        last = rows[-1]
+        return last.get(key.col), last["id"]
+    if after is None or key.col == "id" or after[1] is None:
+        return None
+    in_first_section = (after[0] is not None) != key.nulls_first
+    return (None, None) if in_first_section else None
+
+# — Índice de documentos (doc_index, opcional) ————————————————————————
+# mantido por doc_index.py; com DOC_INDEX=1, buscas por documento são
+# igualdade exata em (doc_digits, entity_type) em vez de only_digits por linha
+DOC_INDEX_ENABLED = os.getenv("DOC_INDEX", "0").lower() in ("1", "true", "yes")
+DOC_LENGTHS = (11, 14)
+
+def _doc_index_ready() -> bool:
+    # tabela sobrando de um DOC_INDEX=1 antigo não tem refresh: não serve de índice
+    return DOC_INDEX_ENABLED and schema.has_table("doc_index")
+
+def _title_doc_cond(digits: str, name: str, params: dict, exact: bool = False) -> str:
+    """
+    Documento no título do deal. Padrão: LIKE por substring (índice pg_trgm),
+    que acha deals ainda não indexados e dígitos dentro de números maiores.
+    Com exact=True, CPF/CNPJ completo sai do doc_index (igualdade exata, só o
+    que já foi indexado).
+    """
+    if exact and len(digits) in DOC_LENGTHS and _doc_index_ready():
+        params[name] = digits
+        return f"id IN (SELECT entity_id FROM doc_index WHERE doc_digits = %({name})s AND entity_type = 'deal')"
+    params[name] = _like_pattern(digits)
+    return f"only_digits(coalesce(title,'')) LIKE %({name})s"
+
+# Execução: as funções públicas montam (sql, params) e delegam aqui.
+# O aqueries.py reaproveita os mesmos SQL/builders com cursores async.
+
+# leituras quentes de forma fixa vão preparadas no servidor desde a 1ª execução
+# (DB_PREPARE=0 desliga, ex.: PgBouncer em modo transação)
+PREPARE_HOT = os.getenv("DB_PREPARE", "1").lower() in ("1", "true", "yes")
+HOT: bool | None = True if PREPARE_HOT else None
+# pipeline mode exige libpq >= 14
+PIPELINE_SUPPORTED = psycopg.Pipeline.is_supported()
+
+def _fetchone(conn: psycopg.Connection, sql: str, params: Any = None, prepare: bool | None = None) -> dict | None:
+    with conn.cursor() as cur:
+        cur.execute(sql, params, prepare=prepare)
+        return cur.fetchone()
+
+def _fetchone_each(conn: psycopg.Connection, statements: list[tuple[str, Any]], *,
+                   prepare: bool | None = None, pipeline: bool = PIPELINE_SUPPORTED) -> list[dict | None]:
+    """
+    Vários SELECTs de uma linha; em pipeline mode saem todos numa única
+    ida e volta à rede (os resultados ficam nos cursores após o sync).
+    """
+    if not pipeline or len(statements) < 2:
+        return [_fetchone(conn, sql, params, prepare) for sql, params in statements]
+    cursors = []
+    t0 = time.perf_counter()
+    try:
+        with conn.pipeline():
+            for sql, params in statements:
+                cur = conn.cursor()
+                cursors.append(cur)
+                cur.execute(sql, params, prepare=prepare)
+        rows = [cur.fetchone() for cur in cursors]
+        profiling.record_pipeline(conn, statements, (time.perf_counter() - t0) * 1000.0)
+        return rows
+    finally:
+        for cur in cursors:
+            cur.close()
+
+def _fetchall(conn: psycopg.Connection, sql: str, params: Any = None) -> list[dict]:
+    with conn.cursor() as cur:
+        cur.execute(sql, params)
+        return cur.fetchall()
+
 # — Pessoas ——————————————————————————————————————————————————————
 SQL_PERSON_BY_DOC = """
 SELECT id, name, owner_id, update_time, cpf_text
@@ -25,306 +196,783 @@ ORDER BY update_time DESC NULLS LAST
 LIMIT 1
 """
 
+SQL_PERSON_BY_ID = """
+SELECT id, name, owner_id, update_time, cpf_text
+FROM pessoas
+WHERE id = %s
+"""
+
+# lote: uma linha por documento (a mais recente), via = ANY(array)
+SQL_PERSONS_BY_DOCS = """
+SELECT DISTINCT ON (doc_digits) doc_digits, id, name, owner_id, update_time, cpf_text
+FROM (
+    SELECT only_digits(coalesce(cpf_text,'')) AS doc_digits, id, name, owner_id, update_time, cpf_text
+    FROM pessoas
+    WHERE only_digits(coalesce(cpf_text,'')) = ANY(%s)
+) s
+ORDER BY doc_digits, update_time DESC NULLS LAST
+"""
+
+# via doc_index; a igualdade refeita na pessoa descarta entrada defasada
+SQL_PERSON_BY_DOC_INDEXED = """
+SELECT p.id, p.name, p.owner_id, p.update_time, p.cpf_text
+FROM doc_index di
+JOIN pessoas p ON p.id = di.entity_id
+WHERE di.doc_digits = %s AND di.entity_type = 'person'
+  AND only_digits(coalesce(p.cpf_text,'')) = di.doc_digits
+ORDER BY p.update_time DESC NULLS LAST
+LIMIT 1
+"""
+
+SQL_PERSONS_BY_DOCS_INDEXED = """
+SELECT DISTINCT ON (di.doc_digits) di.doc_digits, p.id, p.name, p.owner_id, p.update_time, p.cpf_text
+FROM doc_index di
+JOIN pessoas p ON p.id = di.entity_id
+WHERE di.doc_digits = ANY(%s) AND di.entity_type = 'person'
+  AND only_digits(coalesce(p.cpf_text,'')) = di.doc_digits
+ORDER BY di.doc_digits, p.update_time DESC NULLS LAST
+"""
+
+def _person_by_doc_sql(indexed: bool | None = None) -> str:
+    indexed = _doc_index_ready() if indexed is None else indexed
+    return SQL_PERSON_BY_DOC_INDEXED if indexed else SQL_PERSON_BY_DOC
+
+def _persons_by_docs_sql(indexed: bool | None = None) -> str:
+    indexed = _doc_index_ready() if indexed is None else indexed
+    return SQL_PERSONS_BY_DOCS_INDEXED if indexed else SQL_PERSONS_BY_DOCS
+
 def person_by_document(conn: psycopg.Connection, doc: str) -> dict | None:
-    doc = only_digits(doc)
-    with conn.cursor() as cur:
-        cur.execute(SQL_PERSON_BY_DOC, (doc,))
-        return cur.fetchone()
+    d = only_digits(doc)
+    row = _fetchone(conn, _person_by_doc_sql(), (d,), HOT)
+    if row is None and _doc_index_ready():
+        # o refresh do doc_index ainda não viu a pessoa: confere na tabela
+        row = _fetchone(conn, _person_by_doc_sql(indexed=False), (d,), HOT)
+    return row
 
 def person_by_id(conn: psycopg.Connection, person_id: int) -> dict | None:
-    with conn.cursor() as cur:
-        cur.execute("""
-            SELECT id, name, owner_id, update_time, cpf_text
-            FROM pessoas
-            WHERE id = %s
-        """, (person_id,))
-        return cur.fetchone()
+    return _fetchone(conn, SQL_PERSON_BY_ID, (person_id,), HOT)
 
-def persons_list(conn: psycopg.Connection, *, q: str | None, limit: int, offset: int) -> list[dict]:
-    with conn.cursor() as cur:
-        if q:
-            cur.execute("""
-                SELECT id, name, owner_id, update_time, cpf_text
-                FROM pessoas
-                WHERE name ILIKE %(needle)s
-                   OR only_digits(coalesce(cpf_text,'')) LIKE '%%' || %(doc)s || '%%'
-                ORDER BY update_time DESC NULLS LAST, id DESC
-                LIMIT %(limit)s OFFSET %(offset)s
-            """, {"needle": f"%{q}%", "doc": only_digits(q), "limit": limit, "offset": offset})
-        else:
-            cur.execute("""
-                SELECT id, name, owner_id, update_time, cpf_text
-                FROM pessoas
-                ORDER BY update_time DESC NULLS LAST, id DESC
-                LIMIT %s OFFSET %s
-            """, (limit, offset))
-        return cur.fetchall()
+PERSONS_ORDER = OrderKey("update_time", desc=True, nulls_first=False)
+
+def _persons_list_sql(*, q: str | None, limit: int, offset: int, after: tuple | None = None,
+                      by_relevance: bool = False) -> tuple[str, Any]:
+    cond = []
+    params: dict[str, Any] = {"limit": limit, "offset": offset}
+    order = PERSONS_ORDER.sql
+    if q:
+        frag, sp = _search_cond(q, ("name",), "only_digits(coalesce(cpf_text,''))")
+        cond.append(frag)
+        params.update(sp)
+        if by_relevance:
+            order = _relevance_order(q, ("name",), params)
+    where = _where(cond, params, PERSONS_ORDER, after)
+    return f"""
+        SELECT id, name, owner_id, update_time, cpf_text
+        FROM pessoas
+        WHERE {where}
+        ORDER BY {order}
+        LIMIT %(limit)s OFFSET %(offset)s
+    """, params
+
+def persons_list(conn: psycopg.Connection, *, q: str | None, limit: int, offset: int, after: tuple | None = None,
+                 by_relevance: bool = False) -> list[dict]:
+    return _fetchall(conn, *_persons_list_sql(q=q, limit=limit, offset=offset, after=after, by_relevance=by_relevance))
 
 # — Organizações ——————————————————————————————————————————————————
+# a coluna de documento varia por instância (cpf_cnpj_text vs cnpj_text);
+# sai sempre como cnpj_text, que é o campo do modelo Organization
+ORG_DOC_COLUMNS = ("cpf_cnpj_text", "cnpj_text")
+
 SQL_ORG_BY_DOC = """
-SELECT id, name, owner_id, update_time, cpf_cnpj_text
+SELECT id, name, owner_id, update_time, {doc_col} AS cnpj_text
 FROM organizacoes
-WHERE only_digits(coalesce(cpf_cnpj_text,'')) = %s
+WHERE only_digits(coalesce({doc_col},'')) = %s
 ORDER BY update_time DESC NULLS LAST
 LIMIT 1
 """
 
+SQL_ORG_BY_ID = """
+SELECT id, name, owner_id, update_time, {doc_expr}
+FROM organizacoes
+WHERE id = %s
+"""
+
+SQL_ORGS_BY_DOCS = """
+SELECT DISTINCT ON (doc_digits) doc_digits, id, name, owner_id, update_time, cnpj_text
+FROM (
+    SELECT only_digits(coalesce({doc_col},'')) AS doc_digits,
+           id, name, owner_id, update_time, {doc_col} AS cnpj_text
+    FROM organizacoes
+    WHERE only_digits(coalesce({doc_col},'')) = ANY(%s)
+) s
+ORDER BY doc_digits, update_time DESC NULLS LAST
+"""
+
+SQL_ORG_BY_DOC_INDEXED = """
+SELECT o.id, o.name, o.owner_id, o.update_time, o.{doc_col} AS cnpj_text
+FROM doc_index di
+JOIN organizacoes o ON o.id = di.entity_id
+WHERE di.doc_digits = %s AND di.entity_type = 'org'
+  AND only_digits(coalesce(o.{doc_col},'')) = di.doc_digits
+ORDER BY o.update_time DESC NULLS LAST
+LIMIT 1
+"""
+
+SQL_ORGS_BY_DOCS_INDEXED = """
+SELECT DISTINCT ON (di.doc_digits) di.doc_digits, o.id, o.name, o.owner_id, o.update_time, o.{doc_col} AS cnpj_text
+FROM doc_index di
+JOIN organizacoes o ON o.id = di.entity_id
+WHERE di.doc_digits = ANY(%s) AND di.entity_type = 'org'
+  AND only_digits(coalesce(o.{doc_col},'')) = di.doc_digits
+ORDER BY di.doc_digits, o.update_time DESC NULLS LAST
+"""
+
+def org_doc_column() -> str | None:
+    return schema.first_column("organizacoes", *ORG_DOC_COLUMNS)
+
+def _org_by_doc_sql(indexed: bool | None = None) -> str | None:
+    col = org_doc_column()
+    if not col:
+        return None
+    indexed = _doc_index_ready() if indexed is None else indexed
+    return (SQL_ORG_BY_DOC_INDEXED if indexed else SQL_ORG_BY_DOC).format(doc_col=col)
+
+def _org_by_id_sql() -> str:
+    col = org_doc_column()
+    return SQL_ORG_BY_ID.format(doc_expr=f"{col} AS cnpj_text" if col else "NULL::text AS cnpj_text")
+
+def _orgs_by_docs_sql(indexed: bool | None = None) -> str | None:
+    col = org_doc_column()
+    if not col:
+        return None
+    indexed = _doc_index_ready() if indexed is None else indexed
+    return (SQL_ORGS_BY_DOCS_INDEXED if indexed else SQL_ORGS_BY_DOCS).format(doc_col=col)
+
 def organization_by_document(conn: psycopg.Connection, doc: str) -> dict | None:
-    doc = only_digits(doc)
-    with conn.cursor() as cur:
-        cur.execute(SQL_ORG_BY_DOC, (doc,))
-        return cur.fetchone()
+    sql = _org_by_doc_sql()
+    if sql is None:
+        return None
+    d = only_digits(doc)
+    row = _fetchone(conn, sql, (d,), HOT)
+    if row is None and _doc_index_ready():
+        row = _fetchone(conn, _org_by_doc_sql(indexed=False), (d,), HOT)
+    return row
 
 def organization_by_id(conn: psycopg.Connection, org_id: int) -> dict | None:
-    with conn.cursor() as cur:
-        cur.execute("""
-            SELECT id, name, owner_id, update_time, cnpj_text
-            FROM organizacoes
-            WHERE id = %s
-        """, (org_id,))
-        return cur.fetchone()
+    return _fetchone(conn, _org_by_id_sql(), (org_id,), HOT)
 
-# — Usuários ——————————————————————————————————————————————————————
-def users_list(conn: psycopg.Connection, *, active_only: bool, limit: int, offset: int) -> list[dict]:
-    sql = """
-    SELECT id, name, email, is_admin, active_flag, last_login, created, modified, timezone_name
-    FROM usuarios
-    WHERE (%(active)s IS FALSE) OR (active_flag IS TRUE)
-    ORDER BY name NULLS LAST
-    LIMIT %(limit)s OFFSET %(offset)s
+# — Entities (PF/PJ) ————————————————————————————————————————————————
+def _entity_lookups(variants: dict[str, list[str]], *, persons: bool, orgs: bool,
+                    indexed: bool | None = None) -> list[tuple[str, str, tuple]]:
+    # (tipo, sql, params) de cada variante, na ordem de prioridade
+    out = []
+    if persons:
+        out += [("pf", _person_by_doc_sql(indexed), (only_digits(v),)) for v in variants["pf"]]
+    org_sql = _org_by_doc_sql(indexed)
+    if orgs and org_sql:
+        out += [("pj", org_sql, (only_digits(v),)) for v in variants["pj"]]
+    return out
+
+def _fallback_lookups(variants: dict[str, list[str]], person_row: dict | None, org_row: dict | None, *,
+                      persons: bool, orgs: bool) -> list[tuple[str, str, tuple]]:
+    # doc_index sem a linha (refresh atrasado): o lado que não casou vai pelo only_digits
+    if not _doc_index_ready():
+        return []
+    return _entity_lookups(variants, persons=persons and person_row is None, orgs=orgs and org_row is None,
+                           indexed=False)
+
+def _first_matches(lookups: list[tuple[str, str, tuple]], rows: list[dict | None]) -> tuple[dict | None, dict | None]:
+    person_row = next((r for (kind, _, _), r in zip(lookups, rows) if kind == "pf" and r), None)
+    org_row = next((r for (kind, _, _), r in zip(lookups, rows) if kind == "pj" and r), None)
+    return person_row, org_row
+
+def entities_by_document(
+    conn: psycopg.Connection, variants: dict[str, list[str]], *, persons: bool, orgs: bool
+) -> tuple[dict | None, dict | None]:
     """
-    with conn.cursor() as cur:
-        cur.execute(sql, {"active": active_only, "limit": limit, "offset": offset})
-        return cur.fetchall()
+    Tenta as variantes PF/PJ em ordem (igualdade exata via only_digits) e
+    devolve (pessoa, organização). Todas as buscas vão juntas em pipeline
+    mode; vale a primeira variante (em ordem) que casar.
+    """
+    lookups = _entity_lookups(variants, persons=persons, orgs=orgs)
+    rows = _fetchone_each(conn, [(sql, params) for _, sql, params in lookups], prepare=HOT)
+    person_row, org_row = _first_matches(lookups, rows)
+    retry = _fallback_lookups(variants, person_row, org_row, persons=persons, orgs=orgs)
+    if retry:
+        rows = _fetchone_each(conn, [(sql, params) for _, sql, params in retry], prepare=HOT)
+        p, o = _first_matches(retry, rows)
+        person_row, org_row = person_row or p, org_row or o
+    return person_row, org_row
+
+def _index_by_doc(rows: list[dict]) -> dict[str, dict]:
+    return {r.pop("doc_digits"): r for r in rows}
+
+def _missing_docs(docs: list[str], idx: dict[str, dict]) -> list[str]:
+    # variantes que o doc_index não resolveu; vazias quando ele não está em uso
+    return [d for d in docs if d not in idx] if _doc_index_ready() else []
+
+def _collect_variants(variants_list: list[dict[str, list[str]]], kind: str) -> list[str]:
+    return sorted({v for variants in variants_list for v in variants[kind]})
+
+def _pick_entities(
+    variants_list: list[dict[str, list[str]]], persons_idx: dict[str, dict], orgs_idx: dict[str, dict]
+) -> list[tuple[dict | None, dict | None]]:
+    # mesma prioridade do unitário: primeira variante (em ordem) que casar
+    out = []
+    for variants in variants_list:
+        person_row = next((persons_idx[v] for v in variants["pf"] if v in persons_idx), None)
+        org_row = next((orgs_idx[v] for v in variants["pj"] if v in orgs_idx), None)
+        out.append((person_row, org_row))
+    return out
+
+def entities_by_documents(
+    conn: psycopg.Connection, variants_list: list[dict[str, list[str]]], *, persons: bool, orgs: bool
+) -> list[tuple[dict | None, dict | None]]:
+    """
+    Lote do entities_by_document: junta todas as variantes e resolve com
+    uma consulta por tabela; devolve (pessoa, organização) por entrada.
+    """
+    persons_idx: dict[str, dict] = {}
+    orgs_idx: dict[str, dict] = {}
+    pf = _collect_variants(variants_list, "pf")
+    pj = _collect_variants(variants_list, "pj")
+    if persons and pf:
+        persons_idx = _index_by_doc(_fetchall(conn, _persons_by_docs_sql(), (pf,)))
+        if missing := _missing_docs(pf, persons_idx):
+            persons_idx.update(_index_by_doc(_fetchall(conn, _persons_by_docs_sql(indexed=False), (missing,))))
+    org_sql = _orgs_by_docs_sql()
+    if orgs and pj and org_sql:
+        orgs_idx = _index_by_doc(_fetchall(conn, org_sql, (pj,)))
+        if missing := _missing_docs(pj, orgs_idx):
+            orgs_idx.update(_index_by_doc(_fetchall(conn, _orgs_by_docs_sql(indexed=False), (missing,))))
+    return _pick_entities(variants_list, persons_idx, orgs_idx)
+
+# — Usuários ——————————————————————————————————————————————————————
+USERS_ORDER = OrderKey("name", desc=False, nulls_first=False)
+
+SQL_USERS_LIST = """
+SELECT id, name, email, is_admin, active_flag, last_login, created, modified, timezone_name
+FROM usuarios
+WHERE {where}
+ORDER BY {order}
+LIMIT %(limit)s OFFSET %(offset)s
+"""
+
+SQL_USER_BY_ID = """
+SELECT id, name, email, is_admin, active_flag, last_login, created, modified, timezone_name
+FROM usuarios
+WHERE id = %s
+"""
+
+def _users_list_sql(*, active_only: bool, limit: int, offset: int, after: tuple | None = None) -> tuple[str, Any]:
+    params: dict[str, Any] = {"active": active_only, "limit": limit, "offset": offset}
+    where = _where(["(%(active)s IS FALSE) OR (active_flag IS TRUE)"], params, USERS_ORDER, after)
+    return SQL_USERS_LIST.format(where=where, order=USERS_ORDER.sql), params
+
+def _users_search_sql(*, q: str, limit: int, offset: int, after: tuple | None = None,
+                      by_relevance: bool = False) -> tuple[str, Any]:
+    frag, params = _search_cond(q, ("name", "email"))
+    params.update({"limit": limit, "offset": offset})
+    order = _relevance_order(q, ("name", "email"), params) if by_relevance else USERS_ORDER.sql
+    where = _where([frag], params, USERS_ORDER, after)
+    return SQL_USERS_LIST.format(where=where, order=order), params
+
+def users_list(conn: psycopg.Connection, *, active_only: bool, limit: int, offset: int, after: tuple | None = None) -> list[dict]:
+    return _fetchall(conn, *_users_list_sql(active_only=active_only, limit=limit, offset=offset, after=after))
 
 def user_by_id(conn: psycopg.Connection, user_id: int) -> dict | None:
-    with conn.cursor() as cur:
-        cur.execute("""
-            SELECT id, name, email, is_admin, active_flag, last_login, created, modified, timezone_name
-            FROM usuarios
-            WHERE id = %s
-        """, (user_id,))
-        return cur.fetchone()
+    return _fetchone(conn, SQL_USER_BY_ID, (user_id,), HOT)
 
-def users_search(conn: psycopg.Connection, *, q: str, limit: int, offset: int) -> list[dict]:
-    with conn.cursor() as cur:
-        cur.execute("""
-            SELECT id, name, email, is_admin, active_flag, last_login, created, modified, timezone_name
-            FROM usuarios
-            WHERE name ILIKE %(needle)s OR email ILIKE %(needle)s
-            ORDER BY name NULLS LAST
-            LIMIT %(limit)s OFFSET %(offset)s
-        """, {"needle": f"%{q}%", "limit": limit, "offset": offset})
-        return cur.fetchall()
+def users_search(conn: psycopg.Connection, *, q: str, limit: int, offset: int, after: tuple | None = None,
+                 by_relevance: bool = False) -> list[dict]:
+    return _fetchall(conn, *_users_search_sql(q=q, limit=limit, offset=offset, after=after, by_relevance=by_relevance))
 
 # — Pipelines / Stages ————————————————————————————————————————————
+SQL_PIPELINES_BASE_NOVA = """
+SELECT id, name, is_deleted
+FROM pipelines
+WHERE lower(name) LIKE 'base nova%%'
+   OR lower(name) LIKE 'base-nova%%'
+   OR lower(name) LIKE 'basenova%%'
+ORDER BY name
+"""
+
+SQL_PIPELINES_LIST = "SELECT id, name, is_deleted FROM pipelines ORDER BY name"
+
+SQL_PIPELINE_BY_ID = "SELECT id, name, is_deleted FROM pipelines WHERE id = %s"
+
+SQL_STAGES_BY_PIPELINE = """
+SELECT id, name, pipeline_id, order_nr
+FROM etapas_funil
+WHERE pipeline_id = %s AND (is_deleted IS NOT TRUE)
+ORDER BY order_nr
+"""
+
 def pipelines_like_base_nova(conn: psycopg.Connection) -> list[dict]:
-    sql = """
-    SELECT id, name, is_deleted
-    FROM pipelines
-    WHERE lower(name) LIKE 'base nova%%'
-       OR lower(name) LIKE 'base-nova%%'
-       OR lower(name) LIKE 'basenova%%'
-    ORDER BY name
-    """
-    with conn.cursor() as cur:
-        cur.execute(sql)
-        return cur.fetchall()
+    return _fetchall(conn, SQL_PIPELINES_BASE_NOVA)
 
 def pipelines_list(conn: psycopg.Connection) -> list[dict]:
-    sql = "SELECT id, name, is_deleted FROM pipelines ORDER BY name"
-    with conn.cursor() as cur:
-        cur.execute(sql)
-        return cur.fetchall()
+    return _fetchall(conn, SQL_PIPELINES_LIST)
 
 def pipeline_by_id(conn: psycopg.Connection, pipeline_id: int) -> dict | None:
-    with conn.cursor() as cur:
-        cur.execute("SELECT id, name, is_deleted FROM pipelines WHERE id = %s", (pipeline_id,))
-        return cur.fetchone()
+    return _fetchone(conn, SQL_PIPELINE_BY_ID, (pipeline_id,))
 
 def stages_by_pipeline(conn: psycopg.Connection, pipeline_id: int) -> list[dict]:
-    sql = """
-    SELECT id, name, pipeline_id, order_nr
-    FROM etapas_funil
-    WHERE pipeline_id = %s AND (is_deleted IS NOT TRUE)
-    ORDER BY order_nr
-    """
-    with conn.cursor() as cur:
-        cur.execute(sql, (pipeline_id,))
-        return cur.fetchall()
+    return _fetchall(conn, SQL_STAGES_BY_PIPELINE, (pipeline_id,))
 
 # — Deals ————————————————————————————————————————————————————————
-def deals_base_nova(conn: psycopg.Connection, *, doc: str | None, limit: int, offset: int) -> list[dict]:
-    has_view = True
-    try:
-        with conn.cursor() as cur:
-            cur.execute("SELECT 1 FROM v_deals_base_nova LIMIT 1")
-            cur.fetchone()
-    except Exception:
-        has_view = False
-
-    if has_view:
-        base_sql = """
-        SELECT id, title, status, value, currency,
-               pipeline_id, stage_id, person_id, org_id, update_time, add_time, user_id
-        FROM v_deals_base_nova
-        WHERE (%s IS NULL) OR only_digits(coalesce(title,'')) LIKE '%%' || %s || '%%'
-        ORDER BY update_time DESC NULLS LAST, id DESC
-        LIMIT %s OFFSET %s
-        """
-        with conn.cursor() as cur:
-            cur.execute(base_sql, (doc, doc, limit, offset))
-            return cur.fetchall()
-    else:
-        with conn.cursor() as cur:
-            cur.execute(
-                """
-                WITH base_nova AS (
-                  SELECT p.id as pipeline_id
-                  FROM pipelines p
-                  WHERE lower(p.name) LIKE 'base nova%%'
-                     OR lower(p.name) LIKE 'base-nova%%'
-                     OR lower(p.name) LIKE 'basenova%%'
-                )
-                SELECT d.id, d.title, d.status, d.value, d.currency,
-                       d.pipeline_id, d.stage_id, d.person_id, d.org_id, d.update_time, d.add_time, d.user_id
-                FROM negocios d
-                JOIN base_nova bn ON bn.pipeline_id = d.pipeline_id
-                WHERE (%(doc)s IS NULL) OR only_digits(coalesce(d.title,'')) LIKE '%%' || %(doc)s || '%%'
-                ORDER BY d.update_time DESC NULLS LAST, d.id DESC
-                LIMIT %(limit)s OFFSET %(offset)s
-                """,
-                {"doc": doc, "limit": limit, "offset": offset},
-            )
-            return cur.fetchall()
+DEALS_ORDER = OrderKey("update_time", desc=True, nulls_first=False)
+
+# ids dos pipelines Base Nova sem tabela mantida nem snapshot: LIKE inline
+SQL_DEALS_BASE_NOVA_CTE = """
+WITH base_nova AS (
+  SELECT p.id as pipeline_id
+  FROM pipelines p
+  WHERE lower(p.name) LIKE 'base nova%%'
+     OR lower(p.name) LIKE 'base-nova%%'
+     OR lower(p.name) LIKE 'basenova%%'
+)
+SELECT d.id, d.title, d.status, d.value, d.currency,
+       d.pipeline_id, d.stage_id, d.person_id, d.org_id, d.update_time, d.add_time, d.user_id
+FROM negocios d
+JOIN base_nova bn ON bn.pipeline_id = d.pipeline_id
+WHERE {where}
+ORDER BY {order}
+LIMIT %(limit)s OFFSET %(offset)s
+"""
+
+# top-N por pipeline no índice (pipeline_id, update_time DESC NULLS LAST, id DESC)
+# e merge das poucas listas: lê no máximo limit+offset linhas de cada pipeline
+_SQL_DEALS_BASE_NOVA_LATERAL = """
+SELECT d.*
+FROM {source}
+CROSS JOIN LATERAL (
+  SELECT id, title, status, value, currency,
+         pipeline_id, stage_id, person_id, org_id, update_time, add_time, user_id
+  FROM negocios
+  WHERE pipeline_id = bn.pipeline_id AND ({{where}})
+  ORDER BY {{order}}
+  LIMIT %(limit)s + %(offset)s
+) d
+ORDER BY {{order}}
+LIMIT %(limit)s OFFSET %(offset)s
+"""
+
+# ids já resolvidos (snapshot do refdata) ou da tabela mantida no banco (base_nova_pipelines)
+SQL_DEALS_BASE_NOVA_IDS = _SQL_DEALS_BASE_NOVA_LATERAL.format(source="unnest(%(pipeline_ids)s::bigint[]) AS bn(pipeline_id)")
+SQL_DEALS_BASE_NOVA_TABLE = _SQL_DEALS_BASE_NOVA_LATERAL.format(source="base_nova_pipelines bn")
+
+SQL_DEAL_BY_ID = """
+SELECT id, title, status, value, currency,
+       pipeline_id, stage_id, person_id, org_id, update_time, add_time, user_id
+FROM negocios
+WHERE id = %s
+"""
+
+SQL_DEALS_PAGE = """
+SELECT id, title, status, value, currency,
+       pipeline_id, stage_id, person_id, org_id, update_time, add_time, user_id
+FROM negocios
+WHERE {where}
+ORDER BY {order}
+LIMIT %(limit)s OFFSET %(offset)s
+"""
+
+def _deals_base_nova_sql(template: str, *, doc: str | None, limit: int, offset: int, after: tuple | None = None,
+                         doc_exact: bool = False) -> tuple[str, Any]:
+    cond = []
+    params: dict[str, Any] = {"limit": limit, "offset": offset}
+    digits = only_digits(doc) if doc else ""
+    if digits:
+        cond.append(_title_doc_cond(digits, "doc", params, doc_exact))
+    where = _where(cond, params, DEALS_ORDER, after)
+    return template.format(where=where, order=DEALS_ORDER.sql), params
+
+def _deals_base_nova_stmt(*, doc: str | None, limit: int, offset: int, after: tuple | None,
+                          pipeline_ids: list[int] | None, doc_exact: bool = False) -> tuple[str, Any]:
+    """
+    Fonte dos ids Base Nova, da mais barata para a mais cara: snapshot em
+    memória, tabela mantida (disponibilidade vem do registro, sem sondar a
+    cada chamada) ou LIKE em pipelines.
+    """
+    if pipeline_ids is not None:
+        sql, params = _deals_base_nova_sql(SQL_DEALS_BASE_NOVA_IDS, doc=doc, limit=limit, offset=offset, after=after,
+                                           doc_exact=doc_exact)
+        return sql, {**params, "pipeline_ids": pipeline_ids}
+    template = SQL_DEALS_BASE_NOVA_TABLE if schema.has_table("base_nova_pipelines") else SQL_DEALS_BASE_NOVA_CTE
+    return _deals_base_nova_sql(template, doc=doc, limit=limit, offset=offset, after=after, doc_exact=doc_exact)
+
+def deals_base_nova(conn: psycopg.Connection, *, doc: str | None, limit: int, offset: int, after: tuple | None = None,
+                    pipeline_ids: list[int] | None = None, doc_exact: bool = False) -> list[dict]:
+    return _fetchall(conn, *_deals_base_nova_stmt(doc=doc, limit=limit, offset=offset, after=after,
+                                                  pipeline_ids=pipeline_ids, doc_exact=doc_exact))
 
 def deal_by_id(conn: psycopg.Connection, deal_id: int) -> dict | None:
-    with conn.cursor() as cur:
-        cur.execute("""
-            SELECT id, title, status, value, currency,
-                   pipeline_id, stage_id, person_id, org_id, update_time, add_time, user_id
-            FROM negocios
-            WHERE id = %s
-        """, (deal_id,))
-        return cur.fetchone()
+    return _fetchone(conn, SQL_DEAL_BY_ID, (deal_id,), HOT)
 
-def deals_by_entity(conn: psycopg.Connection, *, person_id: int | None, org_id: int | None, limit: int, offset: int) -> list[dict]:
-    if person_id is None and org_id is None:
-        return []
+def _deals_by_entity_sql(*, person_id: int | None, org_id: int | None, limit: int, offset: int,
+                         after: tuple | None = None) -> tuple[str, Any]:
     cond = []
-    params: list[Any] = []
+    params: dict[str, Any] = {"limit": limit, "offset": offset}
     if person_id is not None:
-        cond.append("person_id = %s")
-        params.append(person_id)
+        cond.append("person_id = %(person_id)s")
+        params["person_id"] = person_id
     if org_id is not None:
-        cond.append("org_id = %s")
-        params.append(org_id)
-    where = " OR ".join(cond)
-    sql = f"""
-    SELECT id, title, status, value, currency,
-           pipeline_id, stage_id, person_id, org_id, update_time, add_time, user_id
-    FROM negocios
-    WHERE {where}
-    ORDER BY update_time DESC NULLS LAST, id DESC
-    LIMIT %s OFFSET %s
-    """
-    params.extend([limit, offset])
-    with conn.cursor() as cur:
-        cur.execute(sql, params)
-        return cur.fetchall()
+        cond.append("org_id = %(org_id)s")
+        params["org_id"] = org_id
+    where = _where([" OR ".join(cond)], params, DEALS_ORDER, after)
+    return SQL_DEALS_PAGE.format(where=where, order=DEALS_ORDER.sql), params
 
-def search_deals_by_title(conn: psycopg.Connection, *, q: str, limit: int, offset: int) -> list[dict]:
-    with conn.cursor() as cur:
-        cur.execute(
-            """
-            SELECT id, title, status, value, currency,
-                   pipeline_id, stage_id, person_id, org_id, update_time, add_time, user_id
-            FROM negocios
-            WHERE title ILIKE %(needle)s
-               OR only_digits(coalesce(title,'')) LIKE '%%' || %(doc)s || '%%'
-            ORDER BY update_time DESC NULLS LAST, id DESC
-            LIMIT %(limit)s OFFSET %(offset)s
-            """,
-            {"needle": f"%{q}%", "doc": only_digits(q), "limit": limit, "offset": offset},
-        )
-        return cur.fetchall()
+def deals_by_entity(conn: psycopg.Connection, *, person_id: int | None, org_id: int | None, limit: int, offset: int,
+                    after: tuple | None = None) -> list[dict]:
+    if person_id is None and org_id is None:
+        return []
+    return _fetchall(conn, *_deals_by_entity_sql(person_id=person_id, org_id=org_id, limit=limit, offset=offset, after=after))
+
+def _search_deals_by_title_sql(*, q: str, limit: int, offset: int, after: tuple | None = None,
+                               by_relevance: bool = False) -> tuple[str, Any]:
+    frag, params = _search_cond(q, ("title",), "only_digits(coalesce(title,''))")
+    params.update({"limit": limit, "offset": offset})
+    order = _relevance_order(q, ("title",), params) if by_relevance else DEALS_ORDER.sql
+    where = _where([frag], params, DEALS_ORDER, after)
+    return SQL_DEALS_PAGE.format(where=where, order=order), params
 
-def search_deals_advanced(
-    conn: psycopg.Connection,
+def search_deals_by_title(conn: psycopg.Connection, *, q: str, limit: int, offset: int, after: tuple | None = None,
+                          by_relevance: bool = False) -> list[dict]:
+    return _fetchall(conn, *_search_deals_by_title_sql(q=q, limit=limit, offset=offset, after=after, by_relevance=by_relevance))
+
+def _deals_filters(
     *,
-    pipeline_id: int | None,
-    stage_id: int | None,
-    status: str | None,
-    owner_id: int | None,
-    person_id: int | None,
-    org_id: int | None,
-    updated_from: str | None,
-    updated_to: str | None,
-    added_from: str | None,
-    added_to: str | None,
-    doc_like: str | None,
-    q: str | None,
-    order_by: str | None,
-    limit: int,
-    offset: int,
-) -> list[dict]:
+    pipeline_id: int | None = None,
+    stage_id: int | None = None,
+    status: str | None = None,
+    owner_id: int | None = None,
+    person_id: int | None = None,
+    org_id: int | None = None,
+    updated_from: str | None = None,
+    updated_to: str | None = None,
+    added_from: str | None = None,
+    added_to: str | None = None,
+    doc_like: str | None = None,
+    doc_exact: bool = False,
+    q: str | None = None,
+) -> tuple[list[str], dict[str, Any]]:
+    """
+    Filtros do search_deals_advanced como (condições, parâmetros nomeados);
+    reaproveitado por outras leituras de negocios com os mesmos filtros.
+    """
     cond = []
-    params: list[Any] = []
+    params: dict[str, Any] = {}
 
     if pipeline_id is not None:
-        cond.append("pipeline_id = %s")
-        params.append(pipeline_id)
+        cond.append("pipeline_id = %(pipeline_id)s")
+        params["pipeline_id"] = pipeline_id
     if stage_id is not None:
-        cond.append("stage_id = %s")
-        params.append(stage_id)
+        cond.append("stage_id = %(stage_id)s")
+        params["stage_id"] = stage_id
     if status:
-        cond.append("status = %s")
-        params.append(status)
+        cond.append("status = %(status)s")
+        params["status"] = status
     if owner_id is not None:
-        cond.append("user_id = %s")
-        params.append(owner_id)
+        cond.append("user_id = %(owner_id)s")
+        params["owner_id"] = owner_id
     if person_id is not None:
-        cond.append("person_id = %s")
-        params.append(person_id)
+        cond.append("person_id = %(person_id)s")
+        params["person_id"] = person_id
     if org_id is not None:
-        cond.append("org_id = %s")
-        params.append(org_id)
+        cond.append("org_id = %(org_id)s")
+        params["org_id"] = org_id
     if updated_from:
-        cond.append("update_time >= %s")
-        params.append(updated_from)
+        cond.append("update_time >= %(updated_from)s")
+        params["updated_from"] = updated_from
     if updated_to:
-        cond.append("update_time <= %s")
-        params.append(updated_to)
+        cond.append("update_time <= %(updated_to)s")
+        params["updated_to"] = updated_to
     if added_from:
-        cond.append("add_time >= %s")
-        params.append(added_from)
+        cond.append("add_time >= %(added_from)s")
+        params["added_from"] = added_from
     if added_to:
-        cond.append("add_time <= %s")
-        params.append(added_to)
-    if doc_like:
-        cond.append("only_digits(coalesce(title,'')) LIKE '%%' || %s || '%%'")
-        params.append(only_digits(doc_like))
+        cond.append("add_time <= %(added_to)s")
+        params["added_to"] = added_to
+    if doc_like and only_digits(doc_like):
+        cond.append(_title_doc_cond(only_digits(doc_like), "doc_like", params, doc_exact))
     if q:
-        cond.append("(title ILIKE %s)")
-        params.append(f"%{q}%")
-
-    where = " AND ".join(cond) if cond else "TRUE"
+        cond.append("title ILIKE %(q)s")
+        params["q"] = _like_pattern(q)
+    return cond, params
 
-    order_sql = _apply_order_sql(
+def deals_order_key(order_by: str | None) -> OrderKey:
+    return _order_key(_apply_order_sql(
         order_by,
         allowed=("update_time", "add_time", "id", "value"),
         default_expr="update_time DESC NULLS LAST, id DESC"
-    )
+    ))
 
-    sql = f"""
-    SELECT id, title, status, value, currency,
-           pipeline_id, stage_id, person_id, org_id, update_time, add_time, user_id
-    FROM negocios
-    WHERE {where}
-    ORDER BY {order_sql}
-    LIMIT %s OFFSET %s
+def _search_deals_advanced_sql(*, order_by: str | None, limit: int, offset: int,
+                               after: tuple | None = None, **filters: Any) -> tuple[str, Any]:
+    cond, params = _deals_filters(**filters)
+    params.update({"limit": limit, "offset": offset})
+    key = deals_order_key(order_by)
+    where = _where(cond, params, key, after)
+    return SQL_DEALS_PAGE.format(where=where, order=key.sql), params
+
+def search_deals_advanced(conn: psycopg.Connection, **filters: Any) -> list[dict]:
+    return _fetchall(conn, *_search_deals_advanced_sql(**filters))
+
+# — Agregados de deals ——————————————————————————————————————————————
+# dimensões aceitas em group_by (nome na resposta = coluna de negocios)
+DEAL_STATS_GROUPS = ("pipeline_id", "stage_id", "status", "user_id", "currency")
+DEAL_STATS_BUCKETS = ("day", "week", "month", "quarter", "year")
+DEAL_STATS_BUCKET_FIELDS = ("update_time", "add_time")
+
+SQL_DEAL_STATS = """
+SELECT {select}count(*) AS count, sum(value) AS value_sum, round(avg(value), 2) AS value_avg
+FROM negocios
+WHERE {where}
+{group}
+LIMIT %(limit)s
+"""
+
+def _deal_stats_sql(*, group_by: tuple[str, ...], bucket: str | None, bucket_field: str, limit: int,
+                    **filters: Any) -> tuple[str, Any]:
     """
-    params.extend([limit, offset])
-    with conn.cursor() as cur:
-        cur.execute(sql, params)
-        return cur.fetchall()
+    Contagem e soma/média de value por grupo, com os filtros do
+    search_deals_advanced; `bucket` trunca bucket_field (date_trunc) e vira
+    a primeira dimensão. Sem dimensões, uma linha com o total.
+    """
+    if any(g not in DEAL_STATS_GROUPS for g in group_by):
+        raise ValueError(f"group_by inválido: {group_by}")
+    exprs = list(group_by)
+    if bucket:
+        if bucket not in DEAL_STATS_BUCKETS or bucket_field not in DEAL_STATS_BUCKET_FIELDS:
+            raise ValueError(f"bucket inválido: {bucket} {bucket_field}")
+        exprs.insert(0, f"date_trunc('{bucket}', {bucket_field}) AS bucket")
+    cond, params = _deals_filters(**filters)
+    params["limit"] = limit
+    positions = ", ".join(str(i) for i in range(1, len(exprs) + 1))
+    return SQL_DEAL_STATS.format(
+        select="".join(f"{e}, " for e in exprs),
+        where=_where(cond, params, DEALS_ORDER, None),
+        group=f"GROUP BY {positions}\nORDER BY {positions}" if exprs else "",
+    ), params
+
+def deal_stats(conn: psycopg.Connection, **filters: Any) -> list[dict]:
+    return _fetchall(conn, *_deal_stats_sql(**filters))
+
+# — Preparo na criação da conexão (configure do pool) ——————————————————
+def hot_statements() -> list[tuple[str, tuple]]:
+    """
+    SQL de forma fixa das leituras mais quentes com parâmetros de exemplo
+    dos mesmos tipos (text / int8) e formato (CPF/CNPJ com 11/14 dígitos, id
+    que não existe); o configure do pool os prepara no servidor.
+    """
+    out: list[tuple[str, tuple]] = []
+    # com o doc_index, a busca direta também roda (fallback de quem ele não achou)
+    modes = (True, False) if _doc_index_ready() else (False,)
+    cpf, cnpj = "0" * DOC_LENGTHS[0], "0" * DOC_LENGTHS[1]
+    if schema.has_table("pessoas"):
+        out += [(_person_by_doc_sql(m), (cpf,)) for m in modes]
+        out.append((SQL_PERSON_BY_ID, (0,)))
+    if schema.has_table("organizacoes"):
+        out += [(sql, (cnpj,)) for sql in (_org_by_doc_sql(m) for m in modes) if sql]
+        out.append((_org_by_id_sql(), (0,)))
+    if schema.has_table("negocios"):
+        out.append((SQL_DEAL_BY_ID, (0,)))
+    if schema.has_table("usuarios"):
+        out.append((SQL_USER_BY_ID, (0,)))
+    return out
+
+# — Relacionados dos deals (include=) ——————————————————————————————————
+# include -> coluna do deal com o id do relacionado
+DEAL_RELATIONS = {
+    "person": "person_id",
+    "organization": "org_id",
+    "stage": "stage_id",
+    "owner": "user_id",
+}
+
+SQL_PERSONS_BY_IDS = """
+SELECT id, name, owner_id, update_time, cpf_text
+FROM pessoas
+WHERE id = ANY(%s)
+"""
+
+SQL_ORGS_BY_IDS = """
+SELECT id, name, owner_id, update_time, {doc_expr}
+FROM organizacoes
+WHERE id = ANY(%s)
+"""
+
+SQL_STAGES_BY_IDS = """
+SELECT id, name, pipeline_id, order_nr
+FROM etapas_funil
+WHERE id = ANY(%s)
+"""
+
+SQL_USERS_BY_IDS = """
+SELECT id, name, email, is_admin, active_flag, last_login, created, modified, timezone_name
+FROM usuarios
+WHERE id = ANY(%s)
+"""
+
+def related_ids(rows: list[dict], include: Iterable[str]) -> dict[str, list[int]]:
+    """
+    Ids distintos (não nulos) de cada relação pedida nas linhas de deals.
+    """
+    return {
+        rel: sorted({r[DEAL_RELATIONS[rel]] for r in rows if r.get(DEAL_RELATIONS[rel]) is not None})
+        for rel in include
+    }
+
+def _orgs_by_ids_sql() -> str:
+    col = org_doc_column()
+    return SQL_ORGS_BY_IDS.format(doc_expr=f"{col} AS cnpj_text" if col else "NULL::text AS cnpj_text")
+
+def _related_sql(rel: str) -> str | None:
+    if rel == "stage":
+        return SQL_STAGES_BY_IDS if schema.has_table("etapas_funil") else None
+    entity = {"person": "persons", "organization": "organizations", "owner": "users"}.get(rel)
+    if entity is None or not schema.has_table(BATCH_ENTITIES[entity]):
+        return None
+    return _by_ids_sql(entity)
+
+def related_by_ids(conn: psycopg.Connection, ids: dict[str, list[int]]) -> dict[str, dict[int, dict]]:
+    """
+    Uma consulta `id = ANY(...)` por relação; devolve {relação: {id: linha}}.
+    """
+    out: dict[str, dict[int, dict]] = {}
+    for rel, keys in ids.items():
+        sql = _related_sql(rel)
+        out[rel] = {r["id"]: r for r in _fetchall(conn, sql, (keys,))} if keys and sql else {}
+    return out
+
+def embed_related(rows: list[dict], related: dict[str, dict[int, dict]]) -> list[dict]:
+    # cópias: as linhas podem ter vindo do cache compartilhado
+    return [
+        {**r, **{rel: found.get(r.get(DEAL_RELATIONS[rel])) for rel, found in related.items()}}
+        for r in rows
+    ]
+
+# — Lote por ids (POST /v1/{entidade}/batch) ——————————————————————————
+# entidade da rota -> tabela
+BATCH_ENTITIES = {
+    "deals": "negocios",
+    "persons": "pessoas",
+    "organizations": "organizacoes",
+    "users": "usuarios",
+}
+
+SQL_DEALS_BY_IDS = """
+SELECT id, title, status, value, currency,
+       pipeline_id, stage_id, person_id, org_id, update_time, add_time, user_id
+FROM negocios
+WHERE id = ANY(%s)
+"""
+
+def _by_ids_sql(entity: str) -> str:
+    if entity == "deals":
+        return SQL_DEALS_BY_IDS
+    if entity == "persons":
+        return SQL_PERSONS_BY_IDS
+    if entity == "organizations":
+        return _orgs_by_ids_sql()
+    return SQL_USERS_BY_IDS
+
+def in_input_order(ids: list[int], rows: list[dict]) -> list[dict | None]:
+    # mesma ordem (e repetições) de `ids`; null onde o id não existe
+    found = {r["id"]: r for r in rows}
+    return [found.get(i) for i in ids]
+
+def rows_by_ids(conn: psycopg.Connection, entity: str, ids: list[int]) -> list[dict | None]:
+    """
+    Um `WHERE id = ANY(...)` com os ids distintos; resultado na ordem de entrada.
+    """
+    return in_input_order(ids, _fetchall(conn, _by_ids_sql(entity), (sorted(set(ids)),)))
+
+# — Feed de alterações (watermark update_time, id) ————————————————————
+# entidade da rota -> tabela
+CHANGES_ENTITIES = {
+    "deals": "negocios",
+    "persons": "pessoas",
+    "organizations": "organizacoes",
+}
+CHANGES_TOKEN = "changes"
+# watermark de consumidor em dia: a próxima chamada relê a janela de atraso
+
+# ordem crescente; o índice (update_time, id) atende o filtro e a ordem
+SQL_CHANGES = """
+SELECT {cols}
+FROM {table}
+WHERE (update_time, id) > (%(since)s, %(since_id)s)
+ORDER BY update_time, id
+LIMIT %(limit)s
+"""
+
+def _changes_sql(entity: str) -> str:
+    if entity == "deals":
+        cols = "id, title, status, value, currency, pipeline_id, stage_id, person_id, org_id, update_time, add_time, user_id"
+    elif entity == "persons":
+        cols = "id, name, owner_id, update_time, cpf_text"
+    else:
+        col = org_doc_column()
+        cols = f"id, name, owner_id, update_time, {f'{col} AS cnpj_text' if col else 'NULL::text AS cnpj_text'}"
+    return SQL_CHANGES.format(cols=cols, table=CHANGES_ENTITIES[entity])
+
+def changes_since(conn: psycopg.Connection, entity: str, *, since: Any, since_id: int, limit: int) -> list[dict]:
+    """
+    Linhas com (update_time, id) depois do watermark, em ordem; linhas com
+    update_time NULL não entram no feed.
+    """
+    return _fetchall(conn, _changes_sql(entity), {"since": since, "since_id": since_id, "limit": limit})
+
+def _utc(value: datetime) -> datetime:
+    # naive = UTC (comparação com o update_time das linhas)
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+def next_watermark(rows: list[dict], since: datetime, since_id: int, limit: int,
+                   settled: datetime) -> tuple[Any, int]:
+    """
+    Próximo (update_time, id). Página cheia: segue da última linha. Página
+    curta (consumidor em dia): segue da última linha (ou do recebido) só se
+    ela é anterior a `settled` (agora menos a janela de atraso); dentro da
+    janela, volta para `settled`, e a próxima chamada relê só o trecho em que
+    ainda podem chegar linhas replicadas com atraso.
+    """
+    if len(rows) >= limit:
+        return rows[-1]["update_time"], rows[-1]["id"]
+    value, last_id = (rows[-1]["update_time"], rows[-1]["id"]) if rows else (since, since_id)
+    if _utc(value) > _utc(settled):
+        return settled, 0
+    return value, last_id
+
+# — Export (cursor nomeado no servidor) ——————————————————————————————
+DEAL_EXPORT_COLUMNS = (
+    "id", "title", "status", "value", "currency",
+    "pipeline_id", "stage_id", "person_id", "org_id", "update_time", "add_time", "user_id",
+)
+
+SQL_DEALS_EXPORT = """
+SELECT id, title, status, value, currency,
+       pipeline_id, stage_id, person_id, org_id, update_time, add_time, user_id
+FROM negocios
+WHERE {where}
+ORDER BY {order}
+"""
+
+def _deals_export_sql(*, order_by: str | None, **filters: Any) -> tuple[str, Any]:
+    cond, params = _deals_filters(**filters)
+    key = deals_order_key(order_by)
+    return SQL_DEALS_EXPORT.format(where=_where(cond, params, key, None), order=key.sql), params
+
+def iter_deals_export(conn: psycopg.Connection, *, itersize: int, **filters: Any) -> Iterator[dict]:
+    """
+    Itera os deals filtrados via cursor nomeado (DECLARE/FETCH de `itersize`
+    em `itersize` linhas): memória constante e primeiro lote imediato.
+    """
+    sql, params = _deals_export_sql(**filters)
+    # cursor nomeado exige transação (a conexão do pool é autocommit)
+    with conn.transaction():
+        with conn.cursor(name="export_deals") as cur:
+            cur.itersize = itersize
+            cur.execute(sql, params)
+            yield from cur
@@ -0,0 +1,205 @@
+import os
+import threading
+import time
+import psycopg
+from . import schema
+from . import queries as Q
+
+REFDATA_ENABLED = os.getenv("REFDATA_ENABLED", "1").lower() in ("1", "true", "yes")
+REFDATA_REFRESH_SECONDS = int(os.getenv("REFDATA_REFRESH_SECONDS", "30"))
+
+# mesmos prefixos do SQL_PIPELINES_BASE_NOVA / base_nova_pipelines
+BASE_NOVA_PREFIXES = ("base nova", "base-nova", "basenova")
+
+# coluna de "última alteração" procurada em cada tabela para o fingerprint
+MODIFIED_COLUMNS = ("modified", "update_time", "updated_at")
+
+# — Snapshot em memória (pipelines, etapas, usuários) ———————————————————
+# relname -> índices da tabela; cada entrada é substituída por inteiro no
+# refresh (leitura sem lock)
+_data: dict[str, dict] = {}
+_fingerprints: dict[str, tuple] = {}
+_loaded_at: float | None = None
+_lock = threading.Lock()
+
+# inclui as apagadas (by_id serve o include=stage dos deals); by_pipeline não
+SQL_STAGES_ALL = """
+SELECT id, name, pipeline_id, order_nr, is_deleted
+FROM etapas_funil
+ORDER BY pipeline_id, order_nr
+"""
+
+SQL_USERS_ALL = f"""
+SELECT id, name, email, is_admin, active_flag, last_login, created, modified, timezone_name
+FROM usuarios
+ORDER BY {Q.USERS_ORDER.sql}
+"""
+
+def _fingerprint_sql(relname: str) -> str:
+    col = schema.first_column(relname, *MODIFIED_COLUMNS)
+    if col:
+        return f"SELECT count(*) AS n, max({col}) AS m FROM {relname}"
+    # sem coluna de alteração: hash das linhas (tabelas pequenas)
+    return f"SELECT count(*) AS n, md5(string_agg(t::text, ',' ORDER BY t.id)) AS m FROM {relname} t"
+
+def _fingerprint(cur: psycopg.Cursor, relname: str) -> tuple:
+    cur.execute(_fingerprint_sql(relname))
+    row = cur.fetchone()
+    return row["n"], row["m"]
+
+def _load_pipelines(cur: psycopg.Cursor) -> dict:
+    cur.execute(Q.SQL_PIPELINES_LIST)
+    rows = cur.fetchall()
+    base_nova = [r for r in rows if (r["name"] or "").lower().startswith(BASE_NOVA_PREFIXES)]
+    return {
+        "list": rows,
+        "by_id": {r["id"]: r for r in rows},
+        "base_nova": base_nova,
+        "base_nova_ids": sorted(r["id"] for r in base_nova),
+    }
+
+def _load_stages(cur: psycopg.Cursor) -> dict:
+    cur.execute(SQL_STAGES_ALL)
+    by_pipeline: dict[int, list[dict]] = {}
+    by_id: dict[int, dict] = {}
+    for r in cur.fetchall():
+        deleted = r.pop("is_deleted") is True
+        by_id[r["id"]] = r
+        if not deleted:
+            by_pipeline.setdefault(r["pipeline_id"], []).append(r)
+    return {"by_pipeline": by_pipeline, "by_id": by_id}
+
+def _load_users(cur: psycopg.Cursor) -> dict:
+    cur.execute(SQL_USERS_ALL)
+    rows = cur.fetchall()
+    return {
+        "list": rows,
+        "active": [r for r in rows if r["active_flag"] is True],
+        "by_id": {r["id"]: r for r in rows},
+    }
+
+_LOADERS = {
+    "pipelines": _load_pipelines,
+    "etapas_funil": _load_stages,
+    "usuarios": _load_users,
+}
+
+def refresh(conn: psycopg.Connection, *, force: bool = False) -> list[str]:
+    """
+    Recarrega as tabelas cujo fingerprint (count + max(modified)) mudou;
+    devolve os nomes recarregados.
+    """
+    global _loaded_at
+    reloaded = []
+    with conn.cursor() as cur:
+        for relname, load in _LOADERS.items():
+            if not schema.has_table(relname):
+                _data.pop(relname, None)
+                continue
+            fp = _fingerprint(cur, relname)
+            if not force and relname in _data and _fingerprints.get(relname) == fp:
+                continue
+            data = load(cur)
+            with _lock:
+                _data[relname] = data
+                _fingerprints[relname] = fp
+            reloaded.append(relname)
+    _loaded_at = time.time()
+    return reloaded
+
+def ready(relname: str) -> bool:
+    """
+    True quando a tabela está no snapshot (rotas podem responder sem DB).
+    """
+    return REFDATA_ENABLED and relname in _data
+
+# — Leituras (mesma forma/ordem das funções de queries.py) ——————————————
+def pipelines_list() -> list[dict]:
+    return _data["pipelines"]["list"]
+
+def pipelines_like_base_nova() -> list[dict]:
+    return _data["pipelines"]["base_nova"]
+
+def base_nova_ids() -> list[int] | None:
+    return _data["pipelines"]["base_nova_ids"] if ready("pipelines") else None
+
+def pipeline_by_id(pipeline_id: int) -> dict | None:
+    return _data["pipelines"]["by_id"].get(pipeline_id)
+
+def stages_by_pipeline(pipeline_id: int) -> list[dict]:
+    return _data["etapas_funil"]["by_pipeline"].get(pipeline_id, [])
+
+def stages_by_ids(stage_ids: list[int]) -> dict[int, dict]:
+    by_id = _data["etapas_funil"]["by_id"]
+    return {i: by_id[i] for i in stage_ids if i in by_id}
+
+def user_by_id(user_id: int) -> dict | None:
+    return _data["usuarios"]["by_id"].get(user_id)
+
+def users_in_order(user_ids: list[int]) -> list[dict | None]:
+    by_id = _data["usuarios"]["by_id"]
+    return [by_id.get(i) for i in user_ids]
+
+def users_by_ids(user_ids: list[int]) -> dict[int, dict]:
+    by_id = _data["usuarios"]["by_id"]
+    return {i: by_id[i] for i in user_ids if i in by_id}
+
+def users_list(*, active_only: bool, limit: int, offset: int, after: tuple | None = None) -> list[dict] | None:
+    """
+    Página de usuários na ordem de USERS_ORDER (a do próprio SQL de carga),
+    com as mesmas seções do _keyset_cond: depois de um nome não nulo só vêm
+    nomes não nulos; (None, None) inicia a seção de nomes NULL. Se o id do
+    cursor sumiu do snapshot devolve None e a rota cai para o DB.
+    """
+    rows = _data["usuarios"]["active" if active_only else "list"]
+    if after is None:
+        return rows[offset:offset + limit]
+    last_val, last_id = after
+    if last_id is None:
+        return [r for r in rows if r["name"] is None][:limit]
+    pos = next((i for i, r in enumerate(rows) if r["id"] == last_id), None)
+    if pos is None:
+        return None
+    page = rows[pos + 1:]
+    if last_val is not None:
+        page = [r for r in page if r["name"] is not None]
+    return page[:limit]
+
+def version(relname: str) -> tuple:
+    # fingerprint (count + max(modified)) da carga atual: base do ETag das rotas
+    return _fingerprints[relname]
+
+def snapshot() -> dict:
+    pipelines = _data.get("pipelines")
+    stages = _data.get("etapas_funil")
+    users = _data.get("usuarios")
+    return {
+        "enabled": REFDATA_ENABLED,
+        "loaded_at": _loaded_at,
+        "fingerprints": {k: [str(x) for x in v] for k, v in _fingerprints.items()},
+        "pipelines": len(pipelines["list"]) if pipelines else None,
+        "base_nova_ids": pipelines["base_nova_ids"] if pipelines else None,
+        "stages": len(stages["by_id"]) if stages else None,
+        "users": len(users["list"]) if users else None,
+    }
+
+# — Refresh em background ——————————————————————————————————————————
+def _loop(dsn: str, connect_kwargs: dict) -> None:
+    while True:
+        try:
+            with psycopg.connect(dsn, autocommit=True, **connect_kwargs) as conn:
+                while True:
+                    time.sleep(REFDATA_REFRESH_SECONDS)
+                    refresh(conn)
+        except Exception:
+            # conexão caiu: mantém o snapshot atual e tenta de novo
+            time.sleep(5)
+
+def start_refresher(dsn: str, connect_kwargs: dict | None = None) -> threading.Thread | None:
+    if not REFDATA_ENABLED or REFDATA_REFRESH_SECONDS <= 0:
+        return None
+    t = threading.Thread(
+        target=_loop, args=(dsn, connect_kwargs or {}), name="refdata-refresher", daemon=True
+    )
+    t.start()
+    return t
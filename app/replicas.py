@@ -0,0 +1,148 @@
+import os
+import random
+import threading
+import time
+import psycopg
+
+# DSNs das réplicas de leitura (separadas por vírgula); o primário é o DB_DSN
+DB_REPLICA_DSNS = [d.strip() for d in os.getenv("DB_REPLICA_DSNS", "").split(",") if d.strip()]
+DB_HEALTH_SECONDS = float(os.getenv("DB_HEALTH_SECONDS", "5"))
+# falhas seguidas (requests ou health check) até tirar o nó da seleção
+DB_EJECT_FAILURES = int(os.getenv("DB_EJECT_FAILURES", "3"))
+# tempo mínimo fora; volta no primeiro health check bem-sucedido depois disso
+DB_EJECT_SECONDS = float(os.getenv("DB_EJECT_SECONDS", "30"))
+# atraso máximo de réplica aceito pelas rotas sensíveis a frescor; 0 desliga
+DB_MAX_LAG_SECONDS = float(os.getenv("DB_MAX_LAG_SECONDS", "5"))
+# peso da última medição na média móvel de latência
+LATENCY_EWMA_ALPHA = 0.3
+
+# réplica sem replay pendente tem atraso 0 (primário ocioso não gera WAL novo)
+SQL_NODE_HEALTH = """
+SELECT CASE
+         WHEN NOT pg_is_in_recovery() THEN 0
+         WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+         ELSE extract(epoch FROM now() - pg_last_xact_replay_timestamp())
+       END::float8 AS lag_s
+"""
+
+class Node:
+    """
+    Um nó Postgres (primário ou réplica) com seus pools e estado de saúde.
+    Os pools são criados sob demanda pelo db.py.
+    """
+
+    def __init__(self, name: str, dsn: str, *, primary: bool):
+        self.name = name
+        self.dsn = dsn
+        self.primary = primary
+        self.pool = None
+        self.apool = None
+        self.latency_ms: float | None = None
+        # réplica só recebe rota com limite de atraso depois do 1º health check
+        self.lag_s: float | None = 0.0 if primary else None
+        self.failures = 0
+        self.ejected_at: float | None = None
+        self.ejections = 0
+        self.selected = 0
+
+    @property
+    def available(self) -> bool:
+        return self.ejected_at is None
+
+    def fresh(self, max_lag: float | None) -> bool:
+        if not max_lag or self.primary:
+            return True
+        return self.lag_s is not None and self.lag_s <= max_lag
+
+    def record_success(self, latency_ms: float | None = None, lag_s: float | None = None) -> None:
+        self.failures = 0
+        if latency_ms is not None:
+            if self.latency_ms is None:
+                self.latency_ms = latency_ms
+            else:
+                self.latency_ms += LATENCY_EWMA_ALPHA * (latency_ms - self.latency_ms)
+        if lag_s is not None or not self.primary:
+            self.lag_s = lag_s
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.available and self.failures >= DB_EJECT_FAILURES:
+            self.ejected_at = time.monotonic()
+            self.ejections += 1
+
+    def check(self, conn: psycopg.Connection) -> None:
+        """
+        Health check: mede ida e volta e atraso de replay; readmite o nó
+        ejetado depois de DB_EJECT_SECONDS fora.
+        """
+        t0 = time.perf_counter()
+        lag = conn.execute(SQL_NODE_HEALTH).fetchone()["lag_s"]
+        self.record_success((time.perf_counter() - t0) * 1000.0, lag)
+        if self.ejected_at is not None and time.monotonic() - self.ejected_at >= DB_EJECT_SECONDS:
+            self.ejected_at = None
+
+    def stats(self) -> dict:
+        return {
+            "name": self.name,
+            "primary": self.primary,
+            "available": self.available,
+            "latency_ms": round(self.latency_ms, 3) if self.latency_ms is not None else None,
+            "lag_s": self.lag_s,
+            "failures": self.failures,
+            "ejections": self.ejections,
+            "selected": self.selected,
+        }
+
+class NodeSet:
+    """
+    Primário + réplicas. A escolha sorteia dois nós elegíveis (disponíveis e
+    dentro do atraso pedido) e fica com o de menor latência média.
+    """
+
+    def __init__(self, primary_dsn: str, replica_dsns: list[str]):
+        self.primary = Node("primary", primary_dsn, primary=True)
+        self.nodes = [self.primary] + [
+            Node(f"replica-{i}", dsn, primary=False) for i, dsn in enumerate(replica_dsns, 1)
+        ]
+
+    def pick(self, max_lag: float | None = None, exclude: Node | None = None) -> Node:
+        if len(self.nodes) == 1:
+            node = self.primary
+        else:
+            eligible = [n for n in self.nodes if n is not exclude and n.available and n.fresh(max_lag)]
+            if not eligible:
+                # tudo ejetado/atrasado: o primário ainda é a melhor aposta
+                eligible = [self.primary]
+            elif len(eligible) > 2:
+                eligible = random.sample(eligible, 2)
+            node = min(eligible, key=lambda n: n.latency_ms if n.latency_ms is not None else 0.0)
+        node.selected += 1
+        return node
+
+    def stats(self) -> dict:
+        return {"max_lag_s": DB_MAX_LAG_SECONDS or None, "nodes": [n.stats() for n in self.nodes]}
+
+# — Health check em background ————————————————————————————————————————
+def _watch(node: Node, connect_kwargs: dict) -> None:
+    while True:
+        try:
+            with psycopg.connect(node.dsn, autocommit=True, **connect_kwargs) as conn:
+                while True:
+                    node.check(conn)
+                    time.sleep(DB_HEALTH_SECONDS)
+        except Exception:
+            # nó fora do ar: conta a falha e tenta reconectar no próximo ciclo
+            node.record_failure()
+            time.sleep(DB_HEALTH_SECONDS)
+
+def start_health_checks(nodes: NodeSet, connect_kwargs: dict | None = None) -> list[threading.Thread]:
+    if len(nodes.nodes) == 1 or DB_HEALTH_SECONDS <= 0:
+        return []
+    threads = []
+    for node in nodes.nodes:
+        t = threading.Thread(
+            target=_watch, args=(node, connect_kwargs or {}), name=f"health-{node.name}", daemon=True
+        )
+        t.start()
+        threads.append(t)
+    return threads
@@ -0,0 +1,131 @@
+import hashlib
+import json
+import os
+import time
+from contextvars import ContextVar
+from decimal import Decimal
+from typing import Any
+from fastapi import Request, Response
+from fastapi.responses import JSONResponse
+from .metrics import serialization
+from .utils import json_default
+
+try:
+    import orjson
+except ImportError:  # fallback: json da stdlib (mais lento, mesmo formato)
+    orjson = None
+
+# 1 = listas/linhas saem direto do SQL para JSON, sem validar com pydantic
+FAST_JSON = os.getenv("FAST_JSON", "0").lower() in ("1", "true", "yes")
+
+def _orjson_default(o: Any) -> Any:
+    if isinstance(o, Decimal):
+        return float(o)
+    raise TypeError(f"{type(o).__name__} is not JSON serializable")
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, default=_orjson_default)
+    return json.dumps(content, default=json_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+# início da serialização no caminho padrão: reply() marca, o render fecha
+_serialize_t0: ContextVar[float | None] = ContextVar("serialize_t0", default=None)
+
+class FastJSONResponse(Response):
+    """
+    JSON direto das linhas do SQL (datetime/Decimal tratados no encoder).
+    """
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        t0 = time.perf_counter()
+        body = dumps(content)
+        serialization.observe(time.perf_counter() - t0, "fast")
+        return body
+
+class TimedJSONResponse(JSONResponse):
+    """
+    Resposta padrão do app. Depois de um reply() sem FAST_JSON, mede de
+    reply() até os bytes (validação pelo response_model, jsonable_encoder e
+    json), o trecho que o FAST_JSON substitui.
+    """
+
+    def render(self, content: Any) -> bytes:
+        body = super().render(content)
+        t0 = _serialize_t0.get()
+        if t0 is not None:
+            _serialize_t0.set(None)
+            serialization.observe(time.perf_counter() - t0, "default")
+        return body
+
+def reply(content: Any, response: Response | None) -> Any:
+    """
+    Com FAST_JSON, devolve FastJSONResponse (FastAPI não revalida pelo
+    response_model) levando os headers já definidos na rota; senão, o conteúdo,
+    e o TimedJSONResponse mede a serialização que o FastAPI faz em seguida.
+    """
+    if not FAST_JSON:
+        _serialize_t0.set(time.perf_counter())
+        return content
+    out = FastJSONResponse(content)
+    if response is not None:
+        for k, v in response.headers.items():
+            if k != "content-length":
+                out.headers[k] = v
+    return out
+
+# — ETag / GET condicional ——————————————————————————————————————————
+# colunas que mudam a cada alteração da linha (a primeira presente vale)
+VERSION_COLUMNS = ("update_time", "modified")
+
+def row_fingerprint(row: dict | None) -> tuple | None:
+    """
+    (id, update_time) da linha e dos relacionados embutidos; linha sem coluna
+    de versão (etapas, pipelines) entra inteira (são pequenas).
+    """
+    if row is None:
+        return None
+    version = next((row[c] for c in VERSION_COLUMNS if c in row), None)
+    if version is None:
+        return tuple(sorted((k, row_fingerprint(v) if isinstance(v, dict) else v) for k, v in row.items()))
+    nested = tuple(row_fingerprint(v) for v in row.values() if isinstance(v, dict))
+    return (row.get("id"), version) + nested
+
+def etag_of(*parts: Any) -> str:
+    h = hashlib.blake2b(digest_size=12)
+    for part in parts:
+        h.update(repr(part).encode())
+        h.update(b"\x1f")
+    return f'"{h.hexdigest()}"'
+
+def rows_etag(*key: Any, rows: list[dict] | dict | None) -> str:
+    if isinstance(rows, list):
+        return etag_of(*key, [row_fingerprint(r) for r in rows])
+    return etag_of(*key, row_fingerprint(rows))
+
+def weak_etag(etag: str) -> str:
+    """
+    Forma fraca do ETag: vale para respostas comprimidas (e seus 304), cujos
+    bytes mudam com o Content-Encoding.
+    """
+    return etag if etag.startswith("W/") else "W/" + etag
+
+def _opaque(etag: str) -> str:
+    return etag.strip().removeprefix("W/")
+
+def not_modified(request: Request, response: Response, etag: str) -> Response | None:
+    """
+    Grava o ETag na resposta; se o If-None-Match do cliente já o tem,
+    devolve o 304 (sem corpo, sem serializar) com os mesmos headers.
+    Comparação fraca (ignora W/), como o If-None-Match pede: o cliente pode
+    mandar a forma fraca que recebeu de uma resposta comprimida.
+    """
+    response.headers["ETag"] = etag
+    inm = request.headers.get("if-none-match")
+    if not inm:
+        return None
+    tags = {_opaque(t) for t in inm.split(",")}
+    if _opaque(etag) not in tags and "*" not in tags:
+        return None
+    headers = {k: v for k, v in response.headers.items() if k not in ("content-length", "content-type")}
+    return Response(status_code=304, headers=headers)
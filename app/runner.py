@@ -0,0 +1,208 @@
+import time
+from typing import Any, Callable
+import psycopg
+from psycopg_pool import PoolClosed, PoolTimeout, TooManyRequests
+from starlette.concurrency import run_in_threadpool
+from .cache import CACHE_ENABLED, MISS, freeze, response_cache
+from .db import (
+    DB_ASYNC, aset_statement_timeout, node_pool, node_async_pool, nodes, pool_events, set_statement_timeout,
+)
+from .metrics import count_rows, db_latency, db_rows, pool_wait
+from .replicas import Node
+from .singleflight import SINGLEFLIGHT_ENABLED, query_flights
+from . import aqueries as AQ
+
+def _observe(fn: Callable[..., Any], t0: float, result: Any) -> Any:
+    db_latency.observe(time.perf_counter() - t0, fn.__name__)
+    db_rows.inc(count_rows(result), fn.__name__)
+    return result
+
+def _run_sync(node: Node, fn: Callable[..., Any], args: tuple, kwargs: dict, timeout_ms: int | None) -> Any:
+    t0 = time.perf_counter()
+    with node_pool(node).connection() as conn:
+        t1 = time.perf_counter()
+        pool_wait.observe(t1 - t0, node.name)
+        set_statement_timeout(conn, timeout_ms)
+        return _observe(fn, t1, fn(conn, *args, **kwargs))
+
+async def _execute_on(node: Node, fn: Callable[..., Any], args: tuple, kwargs: dict,
+                      timeout_ms: int | None) -> Any:
+    if DB_ASYNC:
+        afn = getattr(AQ, fn.__name__)
+        t0 = time.perf_counter()
+        async with node_async_pool(node).connection() as conn:
+            t1 = time.perf_counter()
+            pool_wait.observe(t1 - t0, node.name)
+            await aset_statement_timeout(conn, timeout_ms)
+            return _observe(fn, t1, await afn(conn, *args, **kwargs))
+    return await run_in_threadpool(_run_sync, node, fn, args, kwargs, timeout_ms)
+
+_EVENTS = (
+    (psycopg.errors.QueryCanceled, "statement_timeouts"),
+    (TooManyRequests, "pool_rejected"),
+    (PoolTimeout, "pool_timeouts"),
+    # pool async ainda não aberto (boot em background) ou já fechado (shutdown)
+    (PoolClosed, "pool_closed"),
+)
+
+def _node_failed(e: psycopg.Error, node: Node) -> bool:
+    # timeout de statement e fila do pool cheia não dizem nada sobre a saúde do nó;
+    # numa réplica, PoolTimeout é o sintoma de nó fora do ar (o pool não consegue
+    # conectar), então conta contra ela em vez de esperar o health check ejetá-la
+    for exc_type, event in _EVENTS:
+        if isinstance(e, exc_type):
+            pool_events[event] += 1
+            return exc_type is PoolTimeout and not node.primary
+    return isinstance(e, psycopg.OperationalError)
+
+async def _execute(fn: Callable[..., Any], args: tuple, kwargs: dict, max_lag: float | None = None,
+                   timeout_ms: int | None = None) -> Any:
+    """
+    Escolhe o nó (primário/réplica) e executa; falha de conexão (ou, numa
+    réplica, espera esgotada no pool) conta contra o nó e a leitura é repetida
+    uma vez em outro nó.
+    """
+    node = nodes.pick(max_lag)
+    try:
+        return await _execute_on(node, fn, args, kwargs, timeout_ms)
+    except psycopg.Error as e:
+        if not _node_failed(e, node):
+            raise
+        node.record_failure()
+        retry = nodes.pick(max_lag, exclude=node)
+        if retry is node:
+            raise
+    return await _execute_on(retry, fn, args, kwargs, timeout_ms)
+
+def cache_key(fn: Callable[..., Any], args: tuple, kwargs: dict) -> tuple:
+    # os handlers já passam argumentos normalizados (only_digits, variantes PF/PJ)
+    return (fn.__name__, freeze(args), freeze(kwargs))
+
+async def run(fn: Callable[..., Any], *args: Any, cache_ttl: int | None = None, max_lag: float | None = None,
+              timeout_ms: int | None = None, **kwargs: Any) -> Any:
+    """
+    Executa uma função de queries.py no modo configurado:
+      - sync (padrão): pool sync numa thread do Starlette
+      - async (DB_ASYNC=1): gêmea homônima de aqueries.py no AsyncConnectionPool
+    Com `cache_ttl`, o resultado fica no cache em processo pelo mesmo TTL da rota.
+    Chamadas idênticas simultâneas compartilham uma única consulta (single-flight).
+    Com réplicas configuradas, `max_lag` restringe a leitura a nós com atraso
+    de replicação de até `max_lag` segundos (o primário sempre serve).
+    `timeout_ms` é o statement_timeout da rota (padrão DB_STATEMENT_TIMEOUT_MS);
+    fila do pool cheia/espera esgotada sobem como PoolTimeout/TooManyRequests.
+    """
+    use_cache = bool(cache_ttl and CACHE_ENABLED)
+    if not (use_cache or SINGLEFLIGHT_ENABLED):
+        return await _execute(fn, args, kwargs, max_lag, timeout_ms)
+    key = cache_key(fn, args, kwargs)
+    if use_cache:
+        cached = response_cache.get(key)
+        if cached is not MISS:
+            return cached
+
+    async def load() -> Any:
+        result = await _execute(fn, args, kwargs, max_lag, timeout_ms)
+        if use_cache:
+            response_cache.set(key, result, cache_ttl)
+        return result
+
+    if SINGLEFLIGHT_ENABLED:
+        return await query_flights.do(key, load)
+    return await load()
+
+_END = object()
+
+class _Stream:
+    """
+    Iterador de uma função geradora de queries.py já aberto: segura a
+    conexão do pool até close() (chamado no fim ou pela rota, como
+    background da resposta, também se o cliente desconectar antes).
+    """
+
+    def __init__(self, pool, conn, it, first):
+        self._pool, self._conn, self._it, self._first = pool, conn, it, first
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        item, self._first = self._first, _END
+        if item is _END:
+            item = next(self._it, _END)
+        if item is _END:
+            self.close()
+            raise StopIteration
+        return item
+
+    def close(self) -> None:
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            try:
+                self._it.close()
+            finally:
+                self._pool.putconn(conn)
+
+class _AsyncStream:
+    def __init__(self, pool, conn, it, first):
+        self._pool, self._conn, self._it, self._first = pool, conn, it, first
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        item, self._first = self._first, _END
+        if item is _END:
+            item = await anext(self._it, _END)
+        if item is _END:
+            await self.close()
+            raise StopAsyncIteration
+        return item
+
+    async def close(self) -> None:
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            try:
+                await self._it.aclose()
+            finally:
+                await self._pool.putconn(conn)
+
+def _open_sync(node: Node, fn: Callable[..., Any], args: tuple, kwargs: dict, timeout_ms: int | None) -> _Stream:
+    pool = node_pool(node)
+    t0 = time.perf_counter()
+    conn = pool.getconn()
+    pool_wait.observe(time.perf_counter() - t0, node.name)
+    try:
+        set_statement_timeout(conn, timeout_ms)
+        it = fn(conn, *args, **kwargs)
+        return _Stream(pool, conn, it, next(it, _END))
+    except BaseException:
+        pool.putconn(conn)
+        raise
+
+async def stream(fn: Callable[..., Any], *args: Any, timeout_ms: int | None = None,
+                 **kwargs: Any) -> _Stream | _AsyncStream:
+    """
+    Para funções geradoras de queries.py: pega a conexão e busca o primeiro
+    lote antes de a rota responder (pool cheio/timeout viram 503, não um 200
+    cortado) e devolve um iterador (sync ou async, DB_ASYNC=1) que segura a
+    conexão até close(). `timeout_ms` vale para cada FETCH do cursor.
+    """
+    node = nodes.pick()
+    try:
+        if not DB_ASYNC:
+            return await run_in_threadpool(_open_sync, node, fn, args, kwargs, timeout_ms)
+        pool = node_async_pool(node)
+        t0 = time.perf_counter()
+        conn = await pool.getconn()
+        pool_wait.observe(time.perf_counter() - t0, node.name)
+        try:
+            await aset_statement_timeout(conn, timeout_ms)
+            it = getattr(AQ, fn.__name__)(conn, *args, **kwargs)
+            return _AsyncStream(pool, conn, it, await anext(it, _END))
+        except BaseException:
+            await pool.putconn(conn)
+            raise
+    except psycopg.Error as e:
+        if _node_failed(e, node):
+            node.record_failure()
+        raise
@@ -0,0 +1,109 @@
+import os
+import threading
+import time
+import psycopg
+
+SCHEMA_REFRESH_SECONDS = int(os.getenv("SCHEMA_REFRESH_SECONDS", "300"))
+SCHEMA_NOTIFY_CHANNEL = os.getenv("SCHEMA_NOTIFY_CHANNEL", "pipeboard_ddl")
+
+# — Registro de capacidades (tabelas/colunas) ——————————————————————
+# relname -> colunas; substituído por inteiro a cada refresh (leitura sem lock)
+_relations: dict[str, frozenset[str]] = {}
+_extensions: frozenset[str] = frozenset()
+_loaded_at: float | None = None
+_lock = threading.Lock()
+
+SQL_SCHEMA_CAPABILITIES = """
+SELECT c.relname, a.attname
+FROM pg_catalog.pg_class c
+JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+LEFT JOIN pg_catalog.pg_attribute a
+       ON a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
+WHERE c.relkind IN ('r','v','m','p')
+  AND n.nspname = current_schema()
+"""
+
+SQL_SCHEMA_EXTENSIONS = "SELECT extname FROM pg_catalog.pg_extension"
+
+def refresh(conn: psycopg.Connection) -> None:
+    """
+    Recarrega tabelas/views e colunas do schema corrente numa única consulta
+    (mais a lista de extensões instaladas).
+    """
+    global _relations, _extensions, _loaded_at
+    with conn.cursor() as cur:
+        cur.execute(SQL_SCHEMA_CAPABILITIES)
+        rows = cur.fetchall()
+        cur.execute(SQL_SCHEMA_EXTENSIONS)
+        extensions = frozenset(r["extname"] for r in cur.fetchall())
+    found: dict[str, set[str]] = {}
+    for row in rows:
+        cols = found.setdefault(row["relname"], set())
+        if row["attname"]:
+            cols.add(row["attname"])
+    with _lock:
+        _relations = {k: frozenset(v) for k, v in found.items()}
+        _extensions = extensions
+        _loaded_at = time.time()
+
+def is_loaded() -> bool:
+    return _loaded_at is not None
+
+def has_table(relname: str) -> bool:
+    return relname in _relations
+
+def has_column(relname: str, column: str) -> bool:
+    return column in _relations.get(relname, ())
+
+def has_extension(name: str) -> bool:
+    return name in _extensions
+
+def first_column(relname: str, *candidates: str) -> str | None:
+    """
+    Primeira coluna existente entre as candidatas (ex.: cpf_cnpj_text vs cnpj_text).
+    """
+    cols = _relations.get(relname, ())
+    for c in candidates:
+        if c in cols:
+            return c
+    return None
+
+def snapshot() -> dict:
+    return {
+        "loaded_at": _loaded_at,
+        "tables": sorted(_relations),
+        "extensions": sorted(_extensions),
+    }
+
+# — Refresh em background (intervalo e/ou LISTEN de eventos DDL) ————————
+def _watch(dsn: str, connect_kwargs: dict) -> None:
+    interval = SCHEMA_REFRESH_SECONDS if SCHEMA_REFRESH_SECONDS > 0 else None
+    while True:
+        try:
+            with psycopg.connect(dsn, autocommit=True, **connect_kwargs) as conn:
+                if SCHEMA_NOTIFY_CHANNEL:
+                    conn.execute(f'LISTEN "{SCHEMA_NOTIFY_CHANNEL}"')
+                deadline = time.monotonic() + interval if interval else None
+                while True:
+                    timeout = max(0.0, deadline - time.monotonic()) if deadline else None
+                    notified = False
+                    if SCHEMA_NOTIFY_CHANNEL:
+                        for _ in conn.notifies(timeout=timeout, stop_after=1):
+                            notified = True
+                    else:
+                        time.sleep(timeout)
+                    if notified or (deadline and time.monotonic() >= deadline):
+                        refresh(conn)
+                        deadline = time.monotonic() + interval if interval else None
+        except Exception:
+            # conexão caiu: tenta de novo sem derrubar a API
+            time.sleep(5)
+
+def start_watcher(dsn: str, connect_kwargs: dict | None = None) -> threading.Thread | None:
+    if SCHEMA_REFRESH_SECONDS <= 0 and not SCHEMA_NOTIFY_CHANNEL:
+        return None
+    t = threading.Thread(
+        target=_watch, args=(dsn, connect_kwargs or {}), name="schema-watcher", daemon=True
+    )
+    t.start()
+    return t
@@ -0,0 +1,47 @@
+import asyncio
+import os
+from typing import Any, Awaitable, Callable, Hashable
+
+SINGLEFLIGHT_ENABLED = os.getenv("SINGLEFLIGHT_ENABLED", "1").lower() in ("1", "true", "yes")
+
+class SingleFlight:
+    """
+    Deduplica chamadas concorrentes idênticas: a primeira (líder) executa,
+    as demais aguardam a mesma task e recebem o mesmo resultado/erro.
+    """
+
+    def __init__(self):
+        self._inflight: dict[Hashable, asyncio.Task] = {}
+        self.leaders = 0
+        self.collapsed = 0
+
+    async def do(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._inflight.get(key)
+        if task is not None:
+            self.collapsed += 1
+        else:
+            self.leaders += 1
+            # task própria: se o cliente líder desconectar, os demais não são cancelados
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t, k=key: self._done(k, t))
+        return await asyncio.shield(task)
+
+    def _done(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            # evita "exception was never retrieved" quando todos desistiram
+            task.exception()
+
+    def stats(self) -> dict:
+        total = self.leaders + self.collapsed
+        return {
+            "enabled": SINGLEFLIGHT_ENABLED,
+            "in_flight": len(self._inflight),
+            "leaders": self.leaders,
+            "collapsed": self.collapsed,
+            "collapse_ratio": round(self.collapsed / total, 4) if total else 0.0,
+        }
+
+query_flights = SingleFlight()
@@ -1,5 +1,9 @@
+import base64
+import json
+from datetime import date, datetime
+from decimal import Decimal
 from fastapi import Response
-from typing import List, Dict
+from typing import Any, List, Dict
 
 def only_digits(s: str | None) -> str:
     return "".join(ch for ch in (s or "") if ch.isdigit())
@@ -14,6 +18,38 @@ def pagin_params(limit: int | None, offset: int | None, *, default: int = 100, m
     off = 0 if (offset is None or offset < 0) else offset
     return lim, off
 
+def json_default(o: Any) -> Any:
+    if isinstance(o, (datetime, date)):
+        return o.isoformat()
+    if isinstance(o, Decimal):
+        return float(o)
+    raise TypeError(f"{type(o).__name__} is not JSON serializable")
+
+# ===== Cursor opaco (keyset) ============================================
+def encode_cursor(order_token: str, after: tuple[Any, int | None]) -> str:
+    """
+    Codifica (valor da chave, id) da última linha + a ordenação que o gerou.
+    """
+    value, last_id = after
+    if isinstance(value, (datetime, date)):
+        value = value.isoformat()
+    elif isinstance(value, Decimal):
+        value = str(value)
+    raw = json.dumps({"o": order_token, "v": value, "i": last_id}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(token: str, order_token: str) -> tuple[Any, int | None]:
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        data = json.loads(raw)
+        value, last_id = data["v"], data["i"]
+        last_id = None if last_id is None else int(last_id)
+    except (ValueError, KeyError, TypeError):
+        raise ValueError("invalid cursor")
+    if data.get("o") != order_token:
+        raise ValueError("cursor does not match ordering")
+    return value, last_id
+
 # ===== Normalização única PF/PJ (fonte de verdade) =======================
 def normalize_document_by_type(document: str, person_type: str) -> List[str]:
     """
@@ -73,3 +109,28 @@ def build_pf_pj_variants(document: str) -> Dict[str, List[str]]:
         "pf": normalize_document_by_type(document, "PF"),
         "pj": normalize_document_by_type(document, "PJ"),
     }
+
+def decide_entity_match(doc: str, hint: str | None, person_row: dict | None, org_row: dict | None) -> str:
+    """
+    Regra de prioridade do match PF/PJ (usada no by-doc unitário e no batch).
+    """
+    if hint == "PF":
+        if person_row:
+            return "person"
+        if org_row:
+            return "organization"
+    elif hint == "PJ":
+        if org_row:
+            return "organization"
+        if person_row:
+            return "person"
+    else:
+        # sem hint: dá preferência a PF se CPF de 11 dígitos; senão PJ
+        doc_digits = only_digits(doc)
+        if len(doc_digits) <= 11 and person_row:
+            return "person"
+        if org_row:
+            return "organization"
+        if person_row:
+            return "person"
+    return "none"
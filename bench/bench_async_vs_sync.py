@@ -0,0 +1,58 @@
+"""
+Compara o modo sync (threadpool) e o modo async (DB_ASYNC=1) da API.
+
+Sobe um uvicorn por modo (mesmo DB_DSN do ambiente), aplica carga com
+50/200/1000 clientes concorrentes e imprime p50/p99 e requests/s.
+
+    DB_DSN=... API_TOKEN=... python bench/bench_async_vs_sync.py --person-id 1 --deal-id 1
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(__file__))
+from loadgen import run_load, start_api, wait_ready  # noqa: E402
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--concurrency", default="50,200,1000")
+    ap.add_argument("--duration", type=float, default=15.0)
+    ap.add_argument("--workers", type=int, default=1)
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--person-id", type=int, default=1)
+    ap.add_argument("--deal-id", type=int, default=1)
+    ap.add_argument("--doc", default="00011122233")
+    ap.add_argument("--json", action="store_true", help="saída em JSON")
+    args = ap.parse_args()
+
+    prefix = os.getenv("API_PREFIX", "/api")
+    token = os.getenv("API_TOKEN")
+    paths = [
+        f"{prefix}/v1/persons/{args.person_id}",
+        f"{prefix}/v1/deals/{args.deal_id}",
+        f"{prefix}/v1/entities/by-doc?doc={args.doc}",
+        f"{prefix}/v1/deals/by-entity?person_id={args.person_id}",
+    ]
+    base_url = f"http://127.0.0.1:{args.port}"
+    report: dict = {}
+    for mode in ("sync", "async"):
+        proc = start_api(args.port, args.workers, {"DB_ASYNC": "1" if mode == "async" else "0"})
+        try:
+            wait_ready(base_url, prefix)
+            for c in (int(x) for x in args.concurrency.split(",")):
+                res = asyncio.run(run_load(base_url, paths, concurrency=c, duration=args.duration, token=token))
+                report.setdefault(mode, {})[c] = res.summary()
+                if not args.json:
+                    s = res.summary()
+                    print(f"{mode:5s} c={c:<5d} rps={s['rps']:>9.1f} p50={s['p50_ms']:>8.2f}ms "
+                          f"p99={s['p99_ms']:>8.2f}ms errors={s['errors']}")
+        finally:
+            proc.terminate()
+            proc.wait(timeout=30)
+    if args.json:
+        print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Latência de deals/base-nova antes e depois da tabela base_nova_pipelines:
+antes = sonda da view + LIKE em pipelines a cada chamada; depois = top-N por
+pipeline (LATERAL) a partir da tabela mantida ou dos ids do snapshot em memória.
+Usa o SQL de queries.py direto numa conexão, sobre o schema do dataset.py.
+
+    DB_DSN=... python bench/dataset.py --deals 5000000
+    DB_DSN=... python bench/bench_base_nova.py --create-index
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import psycopg
+from psycopg.rows import dict_row
+from psycopg.types.numeric import Int8Dumper
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app import queries as Q, schema  # noqa: E402
+from app.db import ensure_base_nova, ensure_only_digits, ensure_pipeline_indexes  # noqa: E402
+from loadgen import Result  # noqa: E402
+
+SQL_PROBE = "SELECT 1 FROM v_deals_base_nova LIMIT 1"
+
+def _timed(fn, repeat: int) -> Result:
+    fn()
+    res = Result()
+    t_start = time.perf_counter()
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        res.latencies_ms.append((time.perf_counter() - t0) * 1000.0)
+    res.elapsed_s = time.perf_counter() - t_start
+    return res
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--schema", default="pipeboard_bench")
+    ap.add_argument("--limit", type=int, default=200)
+    ap.add_argument("--offset", type=int, default=1000, help="offset da página funda")
+    ap.add_argument("--repeat", type=int, default=200)
+    ap.add_argument("--create-index", action="store_true",
+                    help="cria idx_negocios_pipeline_recent antes de medir (CONCURRENTLY)")
+    ap.add_argument("--json", action="store_true", help="saída em JSON")
+    args = ap.parse_args()
+
+    dsn = os.getenv("DB_DSN", "postgresql://localhost/postgres")
+    out = []
+    with psycopg.connect(dsn, autocommit=True, row_factory=dict_row) as conn:
+        conn.adapters.register_dumper(int, Int8Dumper)
+        conn.execute(f"SET search_path = {args.schema}, public")
+        ensure_only_digits(conn)
+        ensure_base_nova(conn)
+        if args.create_index:
+            ensure_pipeline_indexes(conn)
+        conn.execute("ANALYZE base_nova_pipelines")
+        schema.refresh(conn)
+        if not schema.has_table("base_nova_pipelines"):
+            sys.exit("base_nova_pipelines não foi criada (privilégio de trigger em pipelines?)")
+        has_index = conn.execute("SELECT to_regclass('idx_negocios_pipeline_recent') IS NOT NULL AS ok").fetchone()["ok"]
+        ids = [r["pipeline_id"] for r in conn.execute("SELECT pipeline_id FROM base_nova_pipelines")]
+
+        first = Q._deals_base_nova_sql(Q.SQL_DEALS_BASE_NOVA_TABLE, doc=None, limit=args.limit, offset=0)
+        last = Q.cursor_after(Q._fetchall(conn, *first), Q.DEALS_ORDER, args.limit)
+        pages = [("1ª página", {"offset": 0}), (f"offset {args.offset}", {"offset": args.offset})]
+        if last is not None:
+            pages.append(("cursor", {"offset": 0, "after": last}))
+
+        def before(kw):
+            sql, params = Q._deals_base_nova_sql(Q.SQL_DEALS_BASE_NOVA_CTE, doc=None, limit=args.limit, **kw)
+
+            def run():
+                # como antes: sonda da view a cada chamada, depois a consulta
+                conn.execute(SQL_PROBE).fetchone()
+                Q._fetchall(conn, sql, params)
+            return run
+
+        def after(kw, pipeline_ids):
+            sql, params = Q._deals_base_nova_stmt(doc=None, limit=args.limit, after=kw.get("after"),
+                                                  offset=kw["offset"], pipeline_ids=pipeline_ids)
+            return lambda: Q._fetchall(conn, sql, params)
+
+        for page, kw in pages:
+            modes = [
+                ("antes (sonda + LIKE)", before(kw)),
+                ("tabela + LATERAL", after(kw, None)),
+                ("ids em memória + LATERAL", after(kw, ids)),
+            ]
+            for mode, fn in modes:
+                out.append({"page": page, "mode": mode, **_timed(fn, args.repeat).summary()})
+        deals = conn.execute("SELECT count(*) AS n FROM negocios").fetchone()["n"]
+
+    if args.json:
+        print(json.dumps({"deals": deals, "pipeline_index": has_index, "results": out}, indent=2))
+        return
+    print(f"negocios: {deals} linhas; idx_negocios_pipeline_recent: {'sim' if has_index else 'não'}")
+    print(f"{'página':14s} {'modo':26s} {'p50 ms':>8s} {'p95 ms':>8s} {'p99 ms':>8s}")
+    for r in out:
+        print(f"{r['page']:14s} {r['mode']:26s} {r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} {r['p99_ms']:>8.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Latência por request das leituras quentes com e sem statement preparado,
+e do entities/by-doc (até 4 buscas PF/PJ) em sequência vs pipeline mode.
+Usa o SQL de queries.py direto numa conexão (sem HTTP) para isolar o ganho.
+
+    DB_DSN=... python bench/bench_prepared.py --doc 00011122233 --deal-id 12345 --person-id 52
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import psycopg
+from psycopg.rows import dict_row
+from psycopg.types.numeric import Int8Dumper
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app import queries as Q, schema  # noqa: E402
+from app.utils import build_pf_pj_variants, only_digits  # noqa: E402
+from loadgen import Result  # noqa: E402
+
+def _timed(fn, repeat: int) -> Result:
+    fn()
+    res = Result()
+    t_start = time.perf_counter()
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        res.latencies_ms.append((time.perf_counter() - t0) * 1000.0)
+    res.elapsed_s = time.perf_counter() - t_start
+    return res
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--doc", default="00011122233")
+    ap.add_argument("--deal-id", type=int, default=1)
+    ap.add_argument("--person-id", type=int, default=1)
+    ap.add_argument("--repeat", type=int, default=2000)
+    ap.add_argument("--json", action="store_true", help="saída em JSON")
+    args = ap.parse_args()
+
+    dsn = os.getenv("DB_DSN", "postgresql://localhost/postgres")
+    out = []
+    with psycopg.connect(dsn, autocommit=True, row_factory=dict_row) as conn:
+        conn.adapters.register_dumper(int, Int8Dumper)
+        conn.prepare_threshold = None  # só prepara quando pedido
+        schema.refresh(conn)
+        doc = only_digits(args.doc)
+        single = [
+            ("person_by_doc", Q._person_by_doc_sql(), (doc,)),
+            ("person_by_id", Q.SQL_PERSON_BY_ID, (args.person_id,)),
+            ("deal_by_id", Q.SQL_DEAL_BY_ID, (args.deal_id,)),
+        ]
+        if Q._org_by_doc_sql():
+            single.append(("org_by_doc", Q._org_by_doc_sql(), (doc,)))
+        for name, sql, params in single:
+            for mode, prepare in (("plain", False), ("prepared", True)):
+                res = _timed(lambda: Q._fetchone(conn, sql, params, prepare), args.repeat)
+                out.append({"query": name, "mode": mode, **res.summary()})
+
+        variants = build_pf_pj_variants(args.doc)
+        lookups = Q._entity_lookups(variants, persons=schema.has_table("pessoas"),
+                                    orgs=Q.org_doc_column() is not None)
+        stmts = [(sql, params) for _, sql, params in lookups]
+        modes = [("sequential", False, False), ("sequential+prepared", False, True)]
+        if Q.PIPELINE_SUPPORTED:
+            modes.append(("pipeline+prepared", True, True))
+        for mode, pipeline, prepare in modes:
+            res = _timed(lambda: Q._fetchone_each(conn, stmts, prepare=prepare or None, pipeline=pipeline),
+                         args.repeat)
+            out.append({"query": f"entities_by_doc ({len(stmts)} buscas)", "mode": mode, **res.summary()})
+
+    if args.json:
+        print(json.dumps(out, indent=2))
+        return
+    print(f"{'consulta':28s} {'modo':22s} {'p50 ms':>8s} {'p99 ms':>8s} {'média ms':>9s}")
+    for r in out:
+        print(f"{r['query']:28s} {r['mode']:22s} {r['p50_ms']:>8.3f} {r['p99_ms']:>8.3f} {r['mean_ms']:>9.3f}")
+
+if __name__ == "__main__":
+    main()
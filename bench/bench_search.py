@@ -0,0 +1,136 @@
+"""
+Latência das buscas de deals por título (ILIKE/dígitos e sort=relevance)
+numa tabela sintética `negocios` (padrão: 1M linhas), antes e depois dos
+índices GIN pg_trgm do bootstrap. Usa o mesmo SQL de queries.py.
+
+Os dados ficam no schema `bench_search` (recriado com --rebuild; removido
+com --drop). Requer permissão para CREATE EXTENSION pg_trgm.
+
+    DB_DSN=... python bench/bench_search.py --rows 1000000 --repeat 20
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import psycopg
+from psycopg.rows import dict_row
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app import queries as Q  # noqa: E402
+from app.db import TRGM_INDEXES, ensure_only_digits  # noqa: E402
+from loadgen import Result  # noqa: E402
+
+SCHEMA = "bench_search"
+
+SQL_CREATE = """
+CREATE TABLE negocios AS
+SELECT g AS id,
+       (ARRAY['EXECUÇÃO','COBRANÇA','ACORDO','NOTIFICAÇÃO'])[1 + g %% 4]
+         || ' ' || lpad((g * 7919 %% 1000000000)::text, 9, '0') || lpad((g %% 100)::text, 2, '0')
+         || ' - ' || (ARRAY['Silva','Souza','Oliveira','Pereira','Lima','Costa','Almeida'])[1 + g %% 7]
+         || ' ' || md5(g::text) AS title,
+       (ARRAY['open','won','lost'])[1 + g %% 3] AS status,
+       (g %% 100000)::numeric / 100 AS value,
+       'BRL' AS currency,
+       1 + g %% 20 AS pipeline_id,
+       1 + g %% 120 AS stage_id,
+       g %% 500000 AS person_id,
+       NULLIF(g %% 7, 0) * (g %% 90000) AS org_id,
+       now() - (g %% 86400) * interval '1 minute' AS update_time,
+       now() - (g %% 3650) * interval '1 day' AS add_time,
+       1 + g %% 50 AS user_id
+FROM generate_series(1, %(rows)s) g
+"""
+
+def _plan_nodes(plan: dict) -> set[str]:
+    nodes = {plan["Node Type"]}
+    for child in plan.get("Plans", ()):
+        nodes |= _plan_nodes(child)
+    return nodes
+
+def _setup(conn: psycopg.Connection, rows: int, rebuild: bool) -> None:
+    ensure_only_digits(conn)
+    conn.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    if rebuild:
+        conn.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+    conn.execute(f"CREATE SCHEMA IF NOT EXISTS {SCHEMA}")
+    conn.execute(f"SET search_path = {SCHEMA}, public")
+    exists = conn.execute(
+        "SELECT 1 FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace "
+        "WHERE n.nspname = %s AND c.relname = 'negocios'", (SCHEMA,)
+    ).fetchone()
+    if not exists:
+        t0 = time.perf_counter()
+        conn.execute(SQL_CREATE, {"rows": rows})
+        conn.execute("CREATE INDEX ON negocios (update_time DESC NULLS LAST, id DESC)")
+        print(f"tabela gerada: {rows} linhas em {time.perf_counter() - t0:.1f}s")
+    conn.execute("ANALYZE negocios")
+
+def _set_trgm(conn: psycopg.Connection, enabled: bool) -> None:
+    for table, name, element in TRGM_INDEXES:
+        if table != "negocios":
+            continue
+        if enabled:
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON negocios USING gin ({element})")
+        else:
+            conn.execute(f"DROP INDEX IF EXISTS {name}")
+    conn.execute("ANALYZE negocios")
+
+def _measure(conn: psycopg.Connection, sql: str, params: dict, repeat: int) -> tuple[Result, set[str]]:
+    plan = conn.execute("EXPLAIN (FORMAT JSON) " + sql, params).fetchone()
+    nodes = _plan_nodes(plan["QUERY PLAN"][0]["Plan"])
+    conn.execute(sql, params).fetchall()  # aquece cache de páginas
+    res = Result()
+    t_start = time.perf_counter()
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        conn.execute(sql, params).fetchall()
+        res.latencies_ms.append((time.perf_counter() - t0) * 1000.0)
+    res.elapsed_s = time.perf_counter() - t_start
+    return res, nodes
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=1_000_000)
+    ap.add_argument("--repeat", type=int, default=20)
+    ap.add_argument("--limit", type=int, default=100)
+    ap.add_argument("--rebuild", action="store_true", help="recria a tabela sintética")
+    ap.add_argument("--drop", action="store_true", help="remove o schema ao final")
+    ap.add_argument("--json", action="store_true", help="saída em JSON")
+    args = ap.parse_args()
+
+    cases = [
+        ("texto", {"q": "oliveira 4f2a"}),
+        ("texto raro", {"q": "c0ffee"}),
+        ("dígitos", {"q": "123.456"}),
+        ("cpf completo", {"q": "000.007.919-01"}),
+        ("relevância", {"q": "acordo souza", "by_relevance": True}),
+    ]
+    dsn = os.getenv("DB_DSN", "postgresql://localhost/postgres")
+    out = []
+    with psycopg.connect(dsn, autocommit=True, row_factory=dict_row) as conn:
+        _setup(conn, args.rows, args.rebuild)
+        for phase, enabled in (("seq", False), ("trgm", True)):
+            t0 = time.perf_counter()
+            _set_trgm(conn, enabled)
+            if enabled:
+                print(f"índices trgm criados em {time.perf_counter() - t0:.1f}s")
+            for label, kw in cases:
+                sql, params = Q._search_deals_by_title_sql(limit=args.limit, offset=0, **kw)
+                res, nodes = _measure(conn, sql, params, args.repeat)
+                out.append({"phase": phase, "case": label, "plan": sorted(nodes), **res.summary()})
+        if args.drop:
+            conn.execute(f"DROP SCHEMA {SCHEMA} CASCADE")
+
+    if args.json:
+        print(json.dumps(out, indent=2))
+        return
+    print(f"{'fase':5s} {'caso':14s} {'p50 ms':>9s} {'p95 ms':>9s}  plano")
+    for r in out:
+        print(f"{r['phase']:5s} {r['case']:14s} {r['p50_ms']:>9.2f} {r['p95_ms']:>9.2f}  {','.join(r['plan'])}")
+
+if __name__ == "__main__":
+    main()
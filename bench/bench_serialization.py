@@ -0,0 +1,71 @@
+"""
+Microbenchmark de serialização por página: caminho padrão do FastAPI
+(validação pydantic pelo response_model + JSON) vs FAST_JSON (orjson direto
+das linhas do SQL). Não precisa de banco.
+
+    python bench/bench_serialization.py --rows 100,500 --repeat 200
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+from pydantic import TypeAdapter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.models import Deal, Person, User  # noqa: E402
+from app.responses import dumps  # noqa: E402
+
+NOW = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+def deal_row(i: int) -> dict:
+    return {
+        "id": i, "title": f"EXECUÇÃO 000.111.222-{i % 100:02d} - Cliente {i}", "status": "open",
+        "value": Decimal("1234.56") + i, "currency": "BRL", "pipeline_id": 3, "stage_id": 12,
+        "person_id": 1000 + i, "org_id": None, "update_time": NOW - timedelta(minutes=i),
+        "add_time": NOW - timedelta(days=i % 365), "user_id": 7,
+    }
+
+def person_row(i: int) -> dict:
+    return {"id": i, "name": f"Pessoa {i}", "owner_id": 7,
+            "update_time": NOW - timedelta(minutes=i), "cpf_text": f"000.111.222-{i % 100:02d}"}
+
+def user_row(i: int) -> dict:
+    return {"id": i, "name": f"Usuário {i}", "email": f"u{i}@example.com", "is_admin": False,
+            "active_flag": True, "last_login": NOW, "created": NOW, "modified": NOW,
+            "timezone_name": "America/Sao_Paulo"}
+
+def fastapi_path(adapter: TypeAdapter, rows: list[dict]) -> bytes:
+    # equivalente ao serialize_response do FastAPI + JSONResponse.render
+    validated = adapter.validate_python(rows)
+    content = adapter.dump_python(validated, mode="json")
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+def timeit(fn, repeat: int) -> float:
+    fn()
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - t0) / repeat * 1000.0
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", default="100,500")
+    ap.add_argument("--repeat", type=int, default=200)
+    args = ap.parse_args()
+
+    cases = [("Deal", Deal, deal_row), ("Person", Person, person_row), ("User", User, user_row)]
+    print(f"{'modelo':8s} {'linhas':>6s} {'pydantic ms':>12s} {'fast ms':>9s} {'ganho':>7s}")
+    for name, model, make in cases:
+        adapter = TypeAdapter(list[model])
+        for n in (int(x) for x in args.rows.split(",")):
+            rows = [make(i) for i in range(n)]
+            slow = timeit(lambda: fastapi_path(adapter, rows), args.repeat)
+            fast = timeit(lambda: dumps(rows), args.repeat)
+            print(f"{name:8s} {n:>6d} {slow:>12.3f} {fast:>9.3f} {slow / fast:>6.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,282 @@
+"""
+Gera um dataset sintético do Pipeboard (pessoas, organizacoes, negocios,
+pipelines, etapas_funil, usuarios) num schema próprio e um arquivo de
+tráfego (JSONL) com a mistura de requests usada pelo replay.py.
+
+Escala por número de deals (100k–10M); as demais tabelas são proporcionais.
+Os documentos são determinísticos por id, então o tráfego gerado sempre
+encontra as entidades (CPF/CNPJ no cadastro e no título dos deals).
+
+    DB_DSN=... python bench/dataset.py --deals 1000000 --traffic bench/traffic.jsonl
+
+A API precisa enxergar o schema: rode-a com
+    DB_DSN="postgresql://...?options=-csearch_path%3Dpipeboard_bench,public"
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+import psycopg
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.db import ensure_only_digits  # noqa: E402
+
+PIPELINES = 24
+BASE_NOVA_PIPELINES = 4
+STAGES_PER_PIPELINE = 6
+USERS = 200
+
+# CPF/CNPJ (só dígitos) a partir do id; mesmas fórmulas em SQL e em Python
+def cpf_sql(expr: str) -> str:
+    return f"lpad((({expr}) * 7919 % 1000000000)::text, 9, '0') || lpad((({expr}) % 100)::text, 2, '0')"
+
+def cnpj_sql(expr: str) -> str:
+    return f"lpad((({expr}) * 104729 % 1000000000000)::text, 12, '0') || lpad((({expr}) % 100)::text, 2, '0')"
+
+def cpf(person_id: int) -> str:
+    return f"{person_id * 7919 % 1_000_000_000:09d}{person_id % 100:02d}"
+
+def cnpj(org_id: int) -> str:
+    return f"{org_id * 104729 % 1_000_000_000_000:012d}{org_id % 100:02d}"
+
+def mask_cpf(d: str) -> str:
+    return f"{d[:3]}.{d[3:6]}.{d[6:9]}-{d[9:]}"
+
+def mask_cnpj(d: str) -> str:
+    return f"{d[:2]}.{d[2:5]}.{d[5:8]}/{d[8:12]}-{d[12:]}"
+
+SURNAMES = "ARRAY['Silva','Souza','Oliveira','Pereira','Lima','Costa','Almeida','Santos','Ferreira','Rodrigues']"
+
+def _ddl(persons: int, orgs: int, deals: int) -> list[tuple[str, str]]:
+    cpf_mask = "substr(c,1,3)||'.'||substr(c,4,3)||'.'||substr(c,7,3)||'-'||substr(c,10,2)"
+    return [
+        ("pipelines", f"""
+CREATE TABLE pipelines AS
+SELECT g AS id,
+       CASE WHEN g <= {BASE_NOVA_PIPELINES} THEN 'Base Nova ' || g ELSE 'Pipeline ' || g END AS name,
+       false AS is_deleted,
+       now() - g * interval '1 day' AS modified
+FROM generate_series(1, {PIPELINES}) g
+"""),
+        ("etapas_funil", f"""
+CREATE TABLE etapas_funil AS
+SELECT (p - 1) * {STAGES_PER_PIPELINE} + s AS id,
+       (ARRAY['Novo','Contato','Proposta','Negociação','Acordo','Encerrado'])[s] AS name,
+       p AS pipeline_id, s AS order_nr, false AS is_deleted
+FROM generate_series(1, {PIPELINES}) p, generate_series(1, {STAGES_PER_PIPELINE}) s
+"""),
+        ("usuarios", f"""
+CREATE TABLE usuarios AS
+SELECT g AS id,
+       'Usuário ' || ({SURNAMES})[1 + g % 10] || ' ' || g AS name,
+       'usuario' || g || '@example.com' AS email,
+       g <= 5 AS is_admin,
+       g % 10 <> 0 AS active_flag,
+       now() - (g % 30) * interval '1 day' AS last_login,
+       now() - interval '3 years' + g * interval '1 day' AS created,
+       now() - (g % 60) * interval '1 day' AS modified,
+       'America/Sao_Paulo' AS timezone_name
+FROM generate_series(1, {USERS}) g
+"""),
+        ("pessoas", f"""
+CREATE TABLE pessoas AS
+SELECT g AS id,
+       'Pessoa ' || ({SURNAMES})[1 + g % 10] || ' ' || md5(g::text) AS name,
+       1 + g % {USERS} AS owner_id,
+       now() - (g % 525600) * interval '1 minute' AS update_time,
+       CASE WHEN g % 2 = 0 THEN {cpf_mask} ELSE c END AS cpf_text
+FROM generate_series(1, {persons}) g, LATERAL (SELECT {cpf_sql('g')} AS c) d
+"""),
+        ("organizacoes", f"""
+CREATE TABLE organizacoes AS
+SELECT g AS id,
+       'Empresa ' || ({SURNAMES})[1 + g % 10] || ' ' || substr(md5(g::text), 1, 8) || ' Ltda' AS name,
+       1 + g % {USERS} AS owner_id,
+       now() - (g % 525600) * interval '1 minute' AS update_time,
+       {cnpj_sql('g')} AS cpf_cnpj_text
+FROM generate_series(1, {orgs}) g
+"""),
+        # ~10% dos deals de empresa; título com o CPF (mascarado) da pessoa, como no Pipedrive
+        ("negocios", f"""
+CREATE TABLE negocios AS
+SELECT g AS id,
+       (ARRAY['EXECUÇÃO','COBRANÇA','ACORDO','NOTIFICAÇÃO'])[1 + g % 4] || ' ' || {cpf_mask}
+         || ' - ' || ({SURNAMES})[1 + pid % 10] AS title,
+       (ARRAY['open','open','won','lost'])[1 + g % 4] AS status,
+       (g % 100000)::numeric / 100 AS value,
+       'BRL' AS currency,
+       pl AS pipeline_id,
+       (pl - 1) * {STAGES_PER_PIPELINE} + 1 + g % {STAGES_PER_PIPELINE} AS stage_id,
+       pid AS person_id,
+       CASE WHEN g % 10 = 0 THEN 1 + g % {orgs} END AS org_id,
+       now() - (g % 525600) * interval '1 minute' AS update_time,
+       now() - (g % 3650) * interval '1 day' AS add_time,
+       1 + g % {USERS} AS user_id
+FROM generate_series(1, {deals}) g,
+     LATERAL (SELECT 1 + (g * 31) % {persons} AS pid, 1 + g % {PIPELINES} AS pl) k,
+     LATERAL (SELECT {cpf_sql('pid')} AS c) d
+"""),
+    ]
+
+# índices equivalentes aos do banco de produção (PK + ordenação/filtros das rotas)
+SQL_INDEXES = """
+ALTER TABLE pipelines ADD PRIMARY KEY (id);
+ALTER TABLE etapas_funil ADD PRIMARY KEY (id);
+ALTER TABLE usuarios ADD PRIMARY KEY (id);
+ALTER TABLE pessoas ADD PRIMARY KEY (id);
+ALTER TABLE organizacoes ADD PRIMARY KEY (id);
+ALTER TABLE negocios ADD PRIMARY KEY (id);
+CREATE INDEX ON pessoas (only_digits(coalesce(cpf_text,'')));
+CREATE INDEX ON organizacoes (only_digits(coalesce(cpf_cnpj_text,'')));
+CREATE INDEX ON negocios (update_time DESC NULLS LAST, id DESC);
+CREATE INDEX ON negocios (person_id);
+CREATE INDEX ON negocios (org_id);
+CREATE INDEX ON negocios (pipeline_id);
+"""
+
+def build(conn: psycopg.Connection, schema: str, deals: int, rebuild: bool) -> None:
+    ensure_only_digits(conn)
+    if rebuild:
+        conn.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE")
+    conn.execute(f"CREATE SCHEMA IF NOT EXISTS {schema}")
+    conn.execute(f"SET search_path = {schema}, public")
+    if conn.execute("SELECT to_regclass('negocios') AS t").fetchone()[0] is not None:
+        print(f"schema {schema} já existe (use --rebuild para recriar)")
+        return
+    persons, orgs = max(1, deals // 2), max(1, deals // 10)
+    for table, sql in _ddl(persons, orgs, deals):
+        t0 = time.perf_counter()
+        conn.execute(sql)
+        print(f"{table:13s} gerada em {time.perf_counter() - t0:7.1f}s")
+    t0 = time.perf_counter()
+    conn.execute(SQL_INDEXES)
+    conn.execute("ANALYZE")
+    print(f"índices + ANALYZE em {time.perf_counter() - t0:.1f}s")
+
+def _counts(conn: psycopg.Connection) -> dict[str, int]:
+    return {
+        t: conn.execute(f"SELECT max(id) FROM {t}").fetchone()[0] or 0
+        for t in ("pessoas", "organizacoes", "negocios")
+    }
+
+# peso relativo de cada endpoint na mistura (leituras pontuais dominam, como em produção)
+MIX = (
+    ("GET /v1/persons/{id}", 12),
+    ("GET /v1/persons/by-doc", 10),
+    ("GET /v1/organizations/{id}", 4),
+    ("GET /v1/organizations/by-doc", 4),
+    ("GET /v1/entities/by-doc", 14),
+    ("POST /v1/entities/by-doc/batch", 1),
+    ("GET /v1/deals/{id}", 12),
+    ("GET /v1/deals/by-entity", 10),
+    ("GET /v1/deals/base-nova", 4),
+    ("GET /v1/search/deals", 5),
+    ("GET /v1/search/deals/advanced", 6),
+    ("GET /v1/persons", 2),
+    ("POST /v1/deals/batch", 1),
+    ("POST /v1/persons/batch", 1),
+    ("POST /v1/organizations/batch", 1),
+    ("POST /v1/users/batch", 1),
+    ("GET /v1/users", 2),
+    ("GET /v1/users/search", 2),
+    ("GET /v1/users/{id}", 2),
+    ("GET /v1/pipelines", 2),
+    ("GET /v1/pipelines/base-nova", 1),
+    ("GET /v1/pipelines/{id}", 1),
+    ("GET /v1/stages", 2),
+    ("GET /v1/export/deals", 1),
+    ("GET /v1/changes/deals", 2),
+    ("GET /v1/changes/persons", 1),
+    ("GET /v1/changes/organizations", 1),
+    ("GET /v1/stats/deals", 2),
+    ("GET /health", 1),
+)
+
+def _request(endpoint: str, rnd: random.Random, n: dict[str, int]) -> dict:
+    pid = rnd.randint(1, n["pessoas"])
+    oid = rnd.randint(1, n["organizacoes"])
+    did = rnd.randint(1, n["negocios"])
+    ids = lambda hi, k: rnd.sample(range(1, hi + 1), min(k, hi))  # noqa: E731
+    doc = mask_cpf(cpf(pid)) if rnd.random() < 0.5 else cpf(pid)
+    since = time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(time.time() - rnd.randint(60, 365 * 86400)))
+    method, _, tmpl = endpoint.partition(" ")
+    path, body = {
+        "/v1/persons/{id}": (f"/v1/persons/{pid}", None),
+        "/v1/persons/by-doc": (f"/v1/persons/by-doc?doc={doc}", None),
+        "/v1/organizations/{id}": (f"/v1/organizations/{oid}", None),
+        "/v1/organizations/by-doc": (f"/v1/organizations/by-doc?doc={mask_cnpj(cnpj(oid))}", None),
+        "/v1/entities/by-doc": (
+            f"/v1/entities/by-doc?doc={doc if rnd.random() < 0.7 else cnpj(oid)}", None),
+        "/v1/entities/by-doc/batch": ("/v1/entities/by-doc/batch", {
+            "docs": [cpf(i) for i in ids(n["pessoas"], 50)]}),
+        "/v1/deals/{id}": (f"/v1/deals/{did}" + ("?include=person,stage" if rnd.random() < 0.3 else ""), None),
+        "/v1/deals/by-entity": (
+            f"/v1/deals/by-entity?person_id={pid}" if rnd.random() < 0.8 else f"/v1/deals/by-entity?org_id={oid}",
+            None),
+        "/v1/deals/base-nova": (f"/v1/deals/base-nova?doc={cpf(pid)}" if rnd.random() < 0.5
+                                else "/v1/deals/base-nova?limit=100", None),
+        "/v1/search/deals": (f"/v1/search/deals?q={rnd.choice(['acordo', 'silva', cpf(pid)[:6]])}", None),
+        "/v1/search/deals/advanced": (
+            f"/v1/search/deals/advanced?pipeline_id={rnd.randint(1, PIPELINES)}"
+            f"&status={rnd.choice(['open', 'won', 'lost'])}"
+            + (f"&owner_id={rnd.randint(1, USERS)}" if rnd.random() < 0.5 else "")
+            + ("&updated_from=2024-01-01" if rnd.random() < 0.3 else "")
+            + (f"&doc_like={cpf(pid)[:8]}" if rnd.random() < 0.2 else ""),
+            None),
+        "/v1/persons": (f"/v1/persons?q={rnd.choice(['silva', 'souza', cpf(pid)[:7]])}", None),
+        "/v1/deals/batch": ("/v1/deals/batch", {"ids": ids(n["negocios"], 100)}),
+        "/v1/persons/batch": ("/v1/persons/batch", {"ids": ids(n["pessoas"], 100)}),
+        "/v1/organizations/batch": ("/v1/organizations/batch", {"ids": ids(n["organizacoes"], 100)}),
+        "/v1/users/batch": ("/v1/users/batch", {"ids": ids(USERS, 20)}),
+        "/v1/users": ("/v1/users", None),
+        "/v1/users/search": (f"/v1/users/search?q={rnd.choice(['silva', 'usuario1', 'example'])}", None),
+        "/v1/users/{id}": (f"/v1/users/{rnd.randint(1, USERS)}", None),
+        "/v1/pipelines": ("/v1/pipelines", None),
+        "/v1/pipelines/base-nova": ("/v1/pipelines/base-nova", None),
+        "/v1/pipelines/{id}": (f"/v1/pipelines/{rnd.randint(1, PIPELINES)}", None),
+        "/v1/stages": (f"/v1/stages?pipeline_id={rnd.randint(1, PIPELINES)}", None),
+        "/v1/export/deals": (f"/v1/export/deals?person_id={pid}", None),
+        # update_time dos dados sintéticos cobre o último ano (minuto a minuto)
+        "/v1/changes/deals": (f"/v1/changes/deals?since={since}&limit=500", None),
+        "/v1/changes/persons": (f"/v1/changes/persons?since={since}&limit=500", None),
+        "/v1/changes/organizations": (f"/v1/changes/organizations?since={since}&limit=500", None),
+        "/v1/stats/deals": (
+            f"/v1/stats/deals?group_by={rnd.choice(['pipeline_id', 'status', 'pipeline_id,stage_id', 'user_id'])}"
+            + (f"&bucket={rnd.choice(['week', 'month'])}" if rnd.random() < 0.5 else "")
+            + (f"&pipeline_id={rnd.randint(1, PIPELINES)}" if rnd.random() < 0.5 else ""),
+            None),
+        "/health": ("/health", None),
+    }[tmpl]
+    return {"endpoint": endpoint, "method": method, "path": path, "body": body}
+
+def write_traffic(conn: psycopg.Connection, path: str, size: int, seed: int) -> None:
+    n = _counts(conn)
+    rnd = random.Random(seed)
+    endpoints = [e for e, _ in MIX]
+    weights = [w for _, w in MIX]
+    with open(path, "w", encoding="utf-8") as f:
+        for endpoint in rnd.choices(endpoints, weights, k=size):
+            f.write(json.dumps(_request(endpoint, rnd, n), ensure_ascii=False) + "\n")
+    print(f"{size} requests gravados em {path}")
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--deals", type=int, default=100_000, help="escala: número de deals (100k–10M)")
+    ap.add_argument("--schema", default="pipeboard_bench")
+    ap.add_argument("--rebuild", action="store_true", help="recria o schema")
+    ap.add_argument("--traffic", help="grava o arquivo de tráfego JSONL neste caminho")
+    ap.add_argument("--traffic-size", type=int, default=20_000)
+    ap.add_argument("--seed", type=int, default=42)
+    args = ap.parse_args()
+
+    dsn = os.getenv("DB_DSN", "postgresql://localhost/postgres")
+    with psycopg.connect(dsn, autocommit=True) as conn:
+        build(conn, args.schema, args.deals, args.rebuild)
+        if args.traffic:
+            write_traffic(conn, args.traffic, args.traffic_size, args.seed)
+
+if __name__ == "__main__":
+    main()
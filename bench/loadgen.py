@@ -0,0 +1,152 @@
+"""
+Gerador de carga HTTP mínimo (httpx + asyncio) usado pelos benchmarks.
+
+Mantém N clientes concorrentes em laço fechado durante `duration` segundos
+e devolve latências (ms) e throughput.
+"""
+import asyncio
+import itertools
+import os
+import statistics
+import subprocess
+import sys
+import time
+from dataclasses import dataclass, field
+
+import httpx
+
+@dataclass
+class Result:
+    latencies_ms: list[float] = field(default_factory=list)
+    errors: int = 0
+    elapsed_s: float = 0.0
+    # status HTTP (ou "exc" para falha de conexão) -> quantidade, dos que contaram como erro
+    error_statuses: dict[str, int] = field(default_factory=dict)
+
+    def record(self, status: int | None, ms: float) -> None:
+        # sucesso só 2xx/304: 4xx (rota sombreada, validação) também é erro
+        if status is not None and (200 <= status < 300 or status == 304):
+            self.latencies_ms.append(ms)
+            return
+        self.errors += 1
+        key = "exc" if status is None else str(status)
+        self.error_statuses[key] = self.error_statuses.get(key, 0) + 1
+
+    @property
+    def rps(self) -> float:
+        return len(self.latencies_ms) / self.elapsed_s if self.elapsed_s else 0.0
+
+    def pct(self, p: float) -> float:
+        if not self.latencies_ms:
+            return 0.0
+        data = sorted(self.latencies_ms)
+        k = min(len(data) - 1, max(0, int(round(p / 100.0 * len(data))) - 1))
+        return data[k]
+
+    def summary(self) -> dict:
+        return {
+            "requests": len(self.latencies_ms),
+            "errors": self.errors,
+            "error_statuses": dict(sorted(self.error_statuses.items())),
+            "rps": round(self.rps, 1),
+            "p50_ms": round(self.pct(50), 2),
+            "p95_ms": round(self.pct(95), 2),
+            "p99_ms": round(self.pct(99), 2),
+            "mean_ms": round(statistics.fmean(self.latencies_ms), 2) if self.latencies_ms else 0.0,
+        }
+
+async def run_load(base_url: str, paths: list[str], *, concurrency: int, duration: float,
+                   token: str | None = None, warmup: float = 1.0) -> Result:
+    headers = {"Authorization": f"Bearer {token}"} if token else {}
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    res = Result()
+    cycle = itertools.cycle(paths)
+    async with httpx.AsyncClient(base_url=base_url, headers=headers, limits=limits, timeout=60) as client:
+        t_start = time.perf_counter()
+        measure_from = t_start + warmup
+        stop_at = measure_from + duration
+
+        async def worker():
+            while True:
+                now = time.perf_counter()
+                if now >= stop_at:
+                    return
+                t0 = time.perf_counter()
+                try:
+                    r = await client.get(next(cycle))
+                    status = r.status_code
+                except httpx.HTTPError:
+                    status = None
+                t1 = time.perf_counter()
+                if t0 >= measure_from:
+                    res.record(status, (t1 - t0) * 1000.0)
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        res.elapsed_s = max(0.0, time.perf_counter() - measure_from)
+    return res
+
+async def replay_load(base_url: str, requests: list[dict], *, concurrency: int, duration: float,
+                      token: str | None = None, warmup: float = 1.0, prefix: str = "") -> dict[str, Result]:
+    """
+    Como run_load, mas repete uma lista de requests ({endpoint, method, path,
+    body}) na ordem e devolve um Result por endpoint (mais "total").
+    """
+    headers = {"Authorization": f"Bearer {token}"} if token else {}
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    results: dict[str, Result] = {}
+    cycle = itertools.cycle(requests)
+    async with httpx.AsyncClient(base_url=base_url, headers=headers, limits=limits, timeout=60) as client:
+        t_start = time.perf_counter()
+        measure_from = t_start + warmup
+        stop_at = measure_from + duration
+
+        async def worker():
+            while True:
+                if time.perf_counter() >= stop_at:
+                    return
+                req = next(cycle)
+                t0 = time.perf_counter()
+                try:
+                    r = await client.request(req["method"], prefix + req["path"], json=req.get("body"))
+                    await r.aread()
+                    status = r.status_code
+                except httpx.HTTPError:
+                    status = None
+                t1 = time.perf_counter()
+                if t0 >= measure_from:
+                    results.setdefault(req["endpoint"], Result()).record(status, (t1 - t0) * 1000.0)
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = max(0.0, time.perf_counter() - measure_from)
+    total = Result(elapsed_s=elapsed)
+    for res in results.values():
+        res.elapsed_s = elapsed
+        total.latencies_ms.extend(res.latencies_ms)
+        total.errors += res.errors
+        for k, v in res.error_statuses.items():
+            total.error_statuses[k] = total.error_statuses.get(k, 0) + v
+    results["total"] = total
+    return results
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def start_api(port: int, workers: int, env: dict | None = None) -> subprocess.Popen:
+    """
+    Sobe um uvicorn com a API (variáveis do ambiente + `env`).
+    """
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        cwd=ROOT, env=dict(os.environ, **(env or {})),
+    )
+
+def wait_ready(base_url: str, prefix: str, timeout: float = 60.0) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"{base_url}{prefix}/ready", timeout=2).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"API não respondeu em {base_url}")
@@ -0,0 +1,138 @@
+"""
+Repete um arquivo de tráfego JSONL (gerado pelo dataset.py ou capturado) contra
+a API e reporta requests/s e p50/p95/p99 por endpoint. Com --workers/--pool-max
+sobe um uvicorn por combinação (matriz para dimensionar APP_WORKERS e
+DB_POOL_MAX); sem eles, usa a API já rodando em --base-url.
+
+Baselines ficam em bench/baselines/<nome>.json; --compare aponta regressões
+(p95 acima da tolerância ou requests/s abaixo) e sai com código 1.
+
+    API_TOKEN=... python bench/replay.py --traffic bench/traffic.jsonl --save-baseline main
+    API_TOKEN=... python bench/replay.py --traffic bench/traffic.jsonl --compare main
+    DB_DSN=... API_TOKEN=... python bench/replay.py --traffic bench/traffic.jsonl --workers 1,2,4 --pool-max 10,20
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(__file__))
+from loadgen import replay_load, start_api, wait_ready  # noqa: E402
+
+BASELINES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines")
+
+def load_traffic(path: str, limit: int | None) -> list[dict]:
+    with open(path, encoding="utf-8") as f:
+        reqs = [json.loads(line) for line in f if line.strip()]
+    for r in reqs:
+        r.setdefault("method", "GET")
+        r.setdefault("endpoint", f"{r['method']} {r['path'].split('?', 1)[0]}")
+    return reqs[:limit] if limit else reqs
+
+def _print(label: str, results: dict[str, dict]) -> None:
+    print(f"\n== {label}")
+    print(f"{'endpoint':38s} {'reqs':>7s} {'err':>5s} {'rps':>8s} {'p50 ms':>8s} {'p95 ms':>8s} {'p99 ms':>8s}")
+    for ep in sorted(results, key=lambda e: (e == "total", e)):
+        r = results[ep]
+        statuses = " ".join(f"{k}x{v}" for k, v in r.get("error_statuses", {}).items())
+        print(f"{ep:38s} {r['requests']:>7d} {r['errors']:>5d} {r['rps']:>8.1f} "
+              f"{r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} {r['p99_ms']:>8.2f}  {statuses}")
+
+def compare(current: dict[str, dict], baseline: dict[str, dict], tolerance: float) -> list[str]:
+    """
+    Endpoints cujo p95 piorou ou cujo requests/s caiu além da tolerância.
+    """
+    out = []
+    for ep, cur in sorted(current.items()):
+        base = baseline.get(ep)
+        if not base or not base["requests"]:
+            continue
+        if base["p95_ms"] and cur["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            out.append(f"{ep}: p95 {base['p95_ms']:.2f} -> {cur['p95_ms']:.2f} ms")
+        if base["rps"] and cur["rps"] < base["rps"] * (1 - tolerance):
+            out.append(f"{ep}: rps {base['rps']:.1f} -> {cur['rps']:.1f}")
+    return out
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--traffic", required=True, help="JSONL com {endpoint, method, path, body}")
+    ap.add_argument("--limit", type=int, help="usa só os N primeiros requests do arquivo")
+    ap.add_argument("--base-url", default="http://127.0.0.1:8000")
+    ap.add_argument("--concurrency", type=int, default=64)
+    ap.add_argument("--duration", type=float, default=30.0)
+    ap.add_argument("--warmup", type=float, default=3.0)
+    ap.add_argument("--workers", help="lista de APP_WORKERS (sobe a API localmente)")
+    ap.add_argument("--pool-max", help="lista de DB_POOL_MAX (sobe a API localmente)")
+    ap.add_argument("--port", type=int, default=8766)
+    ap.add_argument("--save-baseline", metavar="NOME")
+    ap.add_argument("--compare", metavar="NOME")
+    ap.add_argument("--tolerance", type=float, default=0.10, help="fração aceita de piora (padrão 10%%)")
+    ap.add_argument("--json", action="store_true", help="saída em JSON")
+    args = ap.parse_args()
+
+    prefix = os.getenv("API_PREFIX", "/api")
+    token = os.getenv("API_TOKEN")
+    requests = load_traffic(args.traffic, args.limit)
+
+    def measure(base_url: str) -> dict[str, dict]:
+        res = asyncio.run(replay_load(base_url, requests, concurrency=args.concurrency, duration=args.duration,
+                                      token=token, warmup=args.warmup, prefix=prefix))
+        return {ep: r.summary() for ep, r in res.items()}
+
+    runs: dict[str, dict] = {}
+    if args.workers or args.pool_max:
+        workers = [int(x) for x in (args.workers or os.getenv("APP_WORKERS", "1")).split(",")]
+        pools = [int(x) for x in (args.pool_max or os.getenv("DB_POOL_MAX", "10")).split(",")]
+        base_url = f"http://127.0.0.1:{args.port}"
+        for w, p in itertools.product(workers, pools):
+            proc = start_api(args.port, w, {"DB_POOL_MAX": str(p)})
+            try:
+                wait_ready(base_url, prefix)
+                runs[f"workers={w} pool_max={p}"] = measure(base_url)
+            finally:
+                proc.terminate()
+                proc.wait(timeout=30)
+    else:
+        runs[args.base_url] = measure(args.base_url)
+
+    report = {
+        "at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "traffic": os.path.basename(args.traffic),
+        "requests_in_file": len(requests),
+        "concurrency": args.concurrency,
+        "duration_s": args.duration,
+        "runs": runs,
+    }
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        for label, results in runs.items():
+            _print(label, results)
+
+    if args.save_baseline:
+        os.makedirs(BASELINES_DIR, exist_ok=True)
+        path = os.path.join(BASELINES_DIR, f"{args.save_baseline}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nbaseline gravada em {path}")
+
+    if args.compare:
+        with open(os.path.join(BASELINES_DIR, f"{args.compare}.json"), encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = []
+        for label, results in runs.items():
+            # mesma configuração na baseline; senão, a primeira rodada dela
+            base = baseline["runs"].get(label) or next(iter(baseline["runs"].values()))
+            regressions += [f"[{label}] {r}" for r in compare(results, base, args.tolerance)]
+        if regressions:
+            print(f"\nregressões vs {args.compare} (tolerância {args.tolerance:.0%}):")
+            for r in regressions:
+                print(f"  {r}")
+            sys.exit(1)
+        print(f"\nsem regressões vs {args.compare} (tolerância {args.tolerance:.0%})")
+
+if __name__ == "__main__":
+    main()
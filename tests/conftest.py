@@ -0,0 +1,22 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app import main, schema
+
+HEADERS = {"Authorization": "Bearer test"}
+
+@pytest.fixture
+def client(monkeypatch):
+    calls = []
+
+    async def fake_run(fn, *args, **kwargs):
+        calls.append(fn.__name__)
+        return []
+
+    monkeypatch.setenv("API_TOKEN", "test")
+    monkeypatch.setattr(main, "run", fake_run)
+    monkeypatch.setattr(schema, "has_table", lambda relname: True)
+    # sem `with`: o startup (bootstrap no banco) não roda
+    c = TestClient(main.app)
+    c.calls = calls
+    return c
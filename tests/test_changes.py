@@ -0,0 +1,62 @@
+from datetime import datetime, timedelta, timezone
+
+from app import queries as Q
+from app.utils import decode_cursor, encode_cursor
+
+from conftest import HEADERS
+
+T0 = datetime(2024, 1, 1, tzinfo=timezone.utc)
+SETTLED = T0.replace(minute=30)
+
+def _row(minute: int, id_: int) -> dict:
+    return {"id": id_, "update_time": T0.replace(minute=minute)}
+
+def test_full_page_continues_from_last_row():
+    rows = [_row(40, 1), _row(50, 2)]
+    assert Q.next_watermark(rows, T0, 0, limit=2, settled=SETTLED) == (rows[-1]["update_time"], 2)
+
+def test_short_page_before_window_continues_without_step_back():
+    assert Q.next_watermark([_row(10, 5)], T0, 0, limit=10, settled=SETTLED) == (T0.replace(minute=10), 5)
+    assert Q.next_watermark([], T0.replace(minute=20), 9, limit=10, settled=SETTLED) == (T0.replace(minute=20), 9)
+
+def test_short_page_inside_window_steps_back_to_settled():
+    assert Q.next_watermark([_row(40, 1)], T0, 0, limit=10, settled=SETTLED) == (SETTLED, 0)
+    assert Q.next_watermark([], T0.replace(minute=45), 3, limit=10, settled=SETTLED) == (SETTLED, 0)
+
+def test_naive_since_compares_with_aware_settled():
+    assert Q.next_watermark([], datetime(2024, 1, 1), 4, limit=10, settled=SETTLED)[1] == 4
+
+def _fake_run(monkeypatch, rows):
+    from app import main
+    seen = {}
+
+    async def fake_run(fn, *args, **kwargs):
+        seen.update(kwargs)
+        return rows
+
+    monkeypatch.setattr(main, "run", fake_run)
+    return seen
+
+def test_caught_up_long_ago_reads_from_cursor(client, monkeypatch):
+    seen = _fake_run(monkeypatch, [])
+    since = encode_cursor(Q.CHANGES_TOKEN, (T0.replace(minute=10), 7))
+    r = client.get("/api/v1/changes/deals", params={"since": since}, headers=HEADERS)
+    assert r.status_code == 200
+    assert (datetime.fromisoformat(seen["since"]), seen["since_id"]) == (T0.replace(minute=10), 7)
+    assert decode_cursor(r.headers["X-Next-Since"], Q.CHANGES_TOKEN) == (T0.replace(minute=10).isoformat(), 7)
+
+def test_recent_tail_returns_start_of_overlap_window(client, monkeypatch):
+    from app import main
+    recent = datetime.now(timezone.utc) - timedelta(seconds=5)
+    _fake_run(monkeypatch, [{"id": 3, "update_time": recent}])
+    r = client.get("/api/v1/changes/persons", params={"since": "2024-01-01"}, headers=HEADERS)
+    value, last_id = decode_cursor(r.headers["X-Next-Since"], Q.CHANGES_TOKEN)
+    assert last_id == 0
+    lag = datetime.now(timezone.utc) - datetime.fromisoformat(value)
+    assert timedelta(seconds=main.CHANGES_OVERLAP_SECONDS) <= lag < timedelta(seconds=main.CHANGES_OVERLAP_SECONDS + 60)
+
+def test_malformed_since_is_400(client):
+    bad = encode_cursor(Q.CHANGES_TOKEN, ("not-a-date", 1))
+    for since in (bad, "yesterday"):
+        r = client.get("/api/v1/changes/deals", params={"since": since}, headers=HEADERS)
+        assert r.status_code == 400
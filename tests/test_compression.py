@@ -0,0 +1,45 @@
+from fastapi import FastAPI, Request, Response
+from fastapi.testclient import TestClient
+
+from app.compression import CompressionMiddleware
+from app.responses import not_modified
+
+ETAG = '"abc"'
+
+def _client():
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware)
+
+    @app.get("/big")
+    def big(request: Request, response: Response):
+        if (r304 := not_modified(request, response, ETAG)):
+            return r304
+        return [{"n": i} for i in range(500)]
+
+    @app.get("/small")
+    def small(request: Request, response: Response):
+        if (r304 := not_modified(request, response, ETAG)):
+            return r304
+        return {"ok": True}
+
+    return TestClient(app)
+
+def test_compressed_response_gets_weak_etag():
+    c = _client()
+    gz = c.get("/big", headers={"Accept-Encoding": "gzip"})
+    assert gz.headers["content-encoding"] == "gzip"
+    assert gz.headers["etag"] == "W/" + ETAG
+    plain = c.get("/big", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers
+    assert plain.headers["etag"] == ETAG
+
+def test_304_repeats_the_validator_of_its_encoding():
+    c = _client()
+    for path in ("/big", "/small"):
+        gz = c.get(path, headers={"Accept-Encoding": "gzip"})
+        r = c.get(path, headers={"Accept-Encoding": "gzip", "If-None-Match": gz.headers["etag"]})
+        assert r.status_code == 304
+        assert r.headers["etag"] == gz.headers["etag"] == "W/" + ETAG
+    r = c.get("/big", headers={"Accept-Encoding": "identity", "If-None-Match": "W/" + ETAG})
+    assert r.status_code == 304
+    assert r.headers["etag"] == ETAG
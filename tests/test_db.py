@@ -0,0 +1,22 @@
+from app import db
+from app import queries as Q
+
+class FakeAdapters:
+    def register_dumper(self, cls, dumper):
+        pass
+
+class FakeConn:
+    def __init__(self):
+        self.adapters = FakeAdapters()
+        self.executed = []
+
+    def execute(self, sql, params=None, prepare=None):
+        self.executed.append((sql, params, prepare))
+
+def test_configure_prepares_hot_statements(monkeypatch):
+    hot = [(Q.SQL_PERSON_BY_ID, (0,)), (Q.SQL_DEAL_BY_ID, (0,))]
+    monkeypatch.setattr(Q, "PREPARE_HOT", True)
+    monkeypatch.setattr(Q, "hot_statements", lambda: hot)
+    conn = FakeConn()
+    db._configure(conn)
+    assert conn.executed == [(sql, params, True) for sql, params in hot]
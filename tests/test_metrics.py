@@ -0,0 +1,14 @@
+from app.metrics import count_rows
+
+def test_count_rows_single_row_and_lists():
+    assert count_rows(None) == 0
+    assert count_rows({"id": 1, "name": "x", "owner_id": None}) == 1
+    assert count_rows([{"id": 1}, {"id": 2}]) == 2
+    assert count_rows(({"id": 1}, None)) == 1
+
+def test_count_rows_empty_and_nested_maps():
+    assert count_rows({}) == 0
+    assert count_rows({"person": {}, "stage": {}}) == 0
+    related = {"person": {1: {"id": 1, "name": "a"}, 2: {"id": 2, "name": "b"}}, "stage": {}}
+    assert count_rows(related) == 2
+    assert count_rows({7: {"id": 7}, 8: None}) == 1
@@ -0,0 +1,39 @@
+import queue
+
+import pytest
+
+from app import profiling
+
+@pytest.fixture
+def explain_queue(monkeypatch):
+    q = queue.Queue()
+    monkeypatch.setattr(profiling, "_explain_queue", q)
+    monkeypatch.setattr(profiling, "SLOW_QUERY_EXPLAIN_SAMPLE", 1.0)
+    profiling.reset()
+    yield q
+    profiling.reset()
+
+class FakeConn:
+    _node_dsn = "postgresql://replica-1/db"
+
+def test_documents_redacted_but_explain_gets_raw_params(explain_queue):
+    profiling._record("SELECT 1 WHERE doc = ANY(%s)", (["12345678909"], 42), 900.0, "dsn")
+    entry = profiling.snapshot()["recent"][0]
+    assert "12345678909" not in entry["params"]
+    assert "42" in entry["params"]
+    dsn, _, _, params = explain_queue.get_nowait()
+    assert dsn == "dsn"
+    assert params == (["12345678909"], 42)
+
+def test_pipeline_batch_recorded_with_node(explain_queue, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILING_ENABLED", True)
+    statements = [("SELECT 1 WHERE a = %s", ("1",)), ("SELECT 2 WHERE b = %s", ("2",))]
+    profiling.record_pipeline(FakeConn(), statements, profiling.SLOW_QUERY_MS + 1)
+    recent = profiling.snapshot()["recent"]
+    assert len(recent) == 2 and all(e["pipeline"] for e in recent)
+    assert explain_queue.get_nowait()[0] == FakeConn._node_dsn
+
+def test_fast_pipeline_not_recorded(explain_queue, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILING_ENABLED", True)
+    profiling.record_pipeline(FakeConn(), [("SELECT 1", None)], 0.0)
+    assert profiling.snapshot()["recent"] == []
@@ -0,0 +1,52 @@
+from app import queries as Q
+
+def test_doc_like_keeps_title_substring_by_default(monkeypatch):
+    monkeypatch.setattr(Q, "_doc_index_ready", lambda: True)
+    cond, params = Q._deals_filters(doc_like="123.456.789-09")
+    assert cond == ["only_digits(coalesce(title,'')) LIKE %(doc_like)s"]
+    assert params["doc_like"] == "%12345678909%"
+
+def test_doc_exact_uses_doc_index(monkeypatch):
+    monkeypatch.setattr(Q, "_doc_index_ready", lambda: True)
+    cond, params = Q._deals_filters(doc_like="12345678909", doc_exact=True)
+    assert "doc_index" in cond[0]
+    assert params["doc_like"] == "12345678909"
+
+def test_doc_exact_falls_back_to_like_for_partial_digits(monkeypatch):
+    monkeypatch.setattr(Q, "_doc_index_ready", lambda: True)
+    cond, _ = Q._deals_filters(doc_like="1234567", doc_exact=True)
+    assert "LIKE" in cond[0]
+
+def test_doc_index_unused_when_disabled(monkeypatch):
+    monkeypatch.setattr(Q, "DOC_INDEX_ENABLED", False)
+    monkeypatch.setattr(Q.schema, "has_table", lambda relname: True)
+    assert not Q._doc_index_ready()
+    assert Q._person_by_doc_sql() == Q.SQL_PERSON_BY_DOC
+
+def test_person_by_document_falls_back_on_index_miss(monkeypatch):
+    monkeypatch.setattr(Q, "_doc_index_ready", lambda: True)
+    seen = []
+
+    def fake_fetchone(conn, sql, params=None, prepare=None):
+        seen.append(sql)
+        return None if sql == Q.SQL_PERSON_BY_DOC_INDEXED else {"id": 1}
+
+    monkeypatch.setattr(Q, "_fetchone", fake_fetchone)
+    assert Q.person_by_document(None, "123.456.789-09") == {"id": 1}
+    assert seen == [Q.SQL_PERSON_BY_DOC_INDEXED, Q.SQL_PERSON_BY_DOC]
+
+def test_entities_batch_falls_back_only_for_missing_docs(monkeypatch):
+    monkeypatch.setattr(Q, "_doc_index_ready", lambda: True)
+    calls = []
+
+    def fake_fetchall(conn, sql, params=None):
+        calls.append((sql, params[0]))
+        if sql == Q.SQL_PERSONS_BY_DOCS_INDEXED:
+            return [{"doc_digits": "11111111111", "id": 1}]
+        return [{"doc_digits": d, "id": 2} for d in params[0]]
+
+    monkeypatch.setattr(Q, "_fetchall", fake_fetchall)
+    variants = [{"pf": ["11111111111"], "pj": []}, {"pf": ["22222222222"], "pj": []}]
+    out = Q.entities_by_documents(None, variants, persons=True, orgs=False)
+    assert [p["id"] for p, _ in out] == [1, 2]
+    assert calls[1] == (Q.SQL_PERSONS_BY_DOCS, ["22222222222"])
@@ -0,0 +1,45 @@
+from psycopg_pool import PoolClosed
+
+from app import main, metrics, responses
+from conftest import HEADERS
+
+def test_deals_by_entity_not_shadowed_by_deal_id(client):
+    r = client.get("/api/v1/deals/by-entity", params={"person_id": 1}, headers=HEADERS)
+    assert r.status_code == 200
+    assert r.json() == []
+    assert client.calls == ["deals_by_entity"]
+
+def test_deals_by_entity_requires_entity(client):
+    r = client.get("/api/v1/deals/by-entity", headers=HEADERS)
+    assert r.status_code == 400
+
+def test_deals_base_nova_not_shadowed_by_deal_id(client):
+    r = client.get("/api/v1/deals/base-nova", headers=HEADERS)
+    assert r.status_code == 200
+    assert client.calls == ["deals_base_nova"]
+
+def test_deal_by_id_still_routed(client):
+    r = client.get("/api/v1/deals/42", headers=HEADERS)
+    assert r.status_code == 404
+    assert client.calls == ["deal_by_id"]
+
+def _serialization_count(mode):
+    s = metrics.serialization._series.get((mode,))
+    return sum(s[:-1]) if s else 0
+
+def test_default_encoder_path_records_serialization(client, monkeypatch):
+    monkeypatch.setattr(responses, "FAST_JSON", False)
+    before = _serialization_count("default")
+    r = client.get("/api/v1/deals/base-nova", headers=HEADERS)
+    assert r.status_code == 200
+    assert _serialization_count("default") == before + 1
+
+def test_closed_pool_answers_503_while_starting(client, monkeypatch):
+    async def closed_run(fn, *args, **kwargs):
+        raise PoolClosed("the pool 'pool-1' is not open yet")
+
+    monkeypatch.setattr(main, "run", closed_run)
+    r = client.get("/api/v1/deals/42", headers=HEADERS)
+    assert r.status_code == 503
+    assert r.json() == {"detail": "starting"}
+    assert "Retry-After" in r.headers
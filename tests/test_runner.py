@@ -0,0 +1,98 @@
+import asyncio
+
+import psycopg
+import pytest
+from psycopg_pool import PoolTimeout, TooManyRequests
+
+from app import runner
+
+class FakeConn:
+    _statement_timeout_ms = None
+
+    def execute(self, sql, params=None):
+        self.last = sql
+
+class FakePool:
+    def __init__(self):
+        self.out = 0
+
+    def getconn(self):
+        self.out += 1
+        return FakeConn()
+
+    def putconn(self, conn):
+        self.out -= 1
+
+@pytest.fixture
+def pool(monkeypatch):
+    p = FakePool()
+    monkeypatch.setattr(runner, "DB_ASYNC", False)
+    monkeypatch.setattr(runner, "node_pool", lambda node: p)
+    return p
+
+def test_stream_fetches_first_row_before_returning(pool):
+    fetched = []
+
+    def gen(conn):
+        for i in range(3):
+            fetched.append(i)
+            yield i
+
+    rows = asyncio.run(runner.stream(gen))
+    assert fetched == [0]
+    assert pool.out == 1
+    assert list(rows) == [0, 1, 2]
+    assert pool.out == 0
+
+def test_stream_error_on_first_fetch_returns_connection(pool):
+    def gen(conn):
+        raise psycopg.errors.QueryCanceled("canceling statement due to statement timeout")
+        yield
+
+    with pytest.raises(psycopg.errors.QueryCanceled):
+        asyncio.run(runner.stream(gen))
+    assert pool.out == 0
+
+def test_stream_close_before_end_returns_connection(pool):
+    def gen(conn):
+        yield from range(10)
+
+    rows = asyncio.run(runner.stream(gen))
+    next(rows)
+    rows.close()
+    rows.close()
+    assert pool.out == 0
+
+class FakeNodes:
+    def __init__(self, *nodes):
+        self.nodes = list(nodes)
+
+    def pick(self, max_lag=None, exclude=None):
+        return next(n for n in self.nodes if n is not exclude)
+
+def _nodes(monkeypatch, *nodes):
+    monkeypatch.setattr(runner, "nodes", FakeNodes(*nodes))
+
+def test_replica_pool_timeout_counts_against_node_and_retries(monkeypatch):
+    replica = runner.Node("replica-1", "", primary=False)
+    primary = runner.Node("primary", "", primary=True)
+    _nodes(monkeypatch, replica, primary)
+    seen = []
+
+    async def execute_on(node, fn, args, kwargs, timeout_ms):
+        seen.append(node.name)
+        if node is replica:
+            raise PoolTimeout("couldn't get a connection after 2.00 sec")
+        return "ok"
+
+    monkeypatch.setattr(runner, "_execute_on", execute_on)
+    assert asyncio.run(runner._execute(len, (), {})) == "ok"
+    assert seen == ["replica-1", "primary"]
+    assert replica.failures == 1
+
+def test_primary_pool_timeout_and_full_queue_are_not_node_failures(monkeypatch):
+    primary = runner.Node("primary", "", primary=True)
+    replica = runner.Node("replica-1", "", primary=False)
+    assert not runner._node_failed(PoolTimeout("timeout"), primary)
+    assert not runner._node_failed(TooManyRequests("queue full"), replica)
+    assert not runner._node_failed(psycopg.errors.QueryCanceled("timeout"), replica)